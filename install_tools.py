@@ -1,69 +1,58 @@
-import paramiko
+import argparse
+import json
 import sys
 import os
+import time
 
 # Import the Single Source of Truth (SSOT) from inventory.py
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 try:
-    from inventory import SERVERS
+    from inventory import select
 except ImportError:
     print("❌ Error: inventory.py not found.")
     sys.exit(1)
 
+from scripts.ssh_pool import SSHPool
+from scripts.iperf_mesh import SSHShell
+from scripts.tracing import enable_tracing, finish_tracing
+from scripts.provision import (Provisioner, print_provision_report, ROLE_PACKAGES, PROVISION_WORKERS,
+                               APT_INDEX_MAX_AGE)
 
-def install_iperf(name, ip, user, password, backup_paths=None):
-    """
-    Connects to a remote server and installs iperf3.
-    This ensures the server is ready for network performance testing.
-    """
-    print(f"🚀 Connecting to {name} ({ip})...")
 
-    try:
-        # Initialize SSH client
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-
-        # Connect using optimized settings for high-latency networks
-        ssh.connect(
-            ip,
-            username=user,
-            password=password,
-            timeout=15,
-            look_for_keys=False,
-            allow_agent=False
-        )
-
-        # Installation command:
-        # 1. Sets non-interactive mode (prevents the system from asking questions)
-        # 2. Updates package lists
-        # 3. Installs iperf3 with '-y' to auto-confirm
-        install_cmd = "export DEBIAN_FRONTEND=noninteractive && apt-get update && apt-get install -y iperf3"
-
-        print(f"   📦 Running update & install on {name}...")
-        stdin, stdout, stderr = ssh.exec_command(install_cmd)
-
-        # Wait for the command to finish and get the return code
-        exit_status = stdout.channel.recv_exit_status()
-
-        if exit_status == 0:
-            print(f"   ✅ SUCCESS: iperf3 is ready on {name}")
-        else:
-            print(f"   ❌ ERROR on {name}:")
-            print(stderr.read().decode())
-
-        ssh.close()
-
-    except Exception as e:
-        print(f"   🔥 CONNECTION FAILED to {name}: {e}")
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Install the packages every node needs (iperf3, curl, ...)")
+    parser.add_argument("--workers", type=int, default=PROVISION_WORKERS,
+                        help="How many nodes to provision at the same time")
+    parser.add_argument("--max-index-age", type=float, default=APT_INDEX_MAX_AGE / 3600, metavar="HOURS",
+                        help="Run 'apt-get update' only if the package index is older than this")
+    parser.add_argument("--roles", metavar="FILE",
+                        help='JSON file {"role": ["package", "package>=version"]} instead of the built-in list')
+    parser.add_argument("--select", default="", metavar="SELECTOR",
+                        help="Only nodes matching a selector, e.g. zone=RU or service=outline (see inventory.py)")
+    parser.add_argument("--trace", metavar="FILE", default=os.getenv("TRACE_FILE"),
+                        help="Time every phase (connect, auth, apt commands) and write a Chrome trace (env: TRACE_FILE)")
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    print(f"--- Starting Dependency Deployment on {len(SERVERS)} servers ---")
-
-    # Iterate through each server in the inventory
-    for server_info in SERVERS:
-        # Unpack the server data.
-        # Since inventory.py might have 5 fields, we take the first 4 for this function.
-        install_iperf(*server_info[:4])
-
-    print("--- Deployment Finished ---")
\ No newline at end of file
+    args = parse_args()
+    servers = select(args.select)
+    trace_file = enable_tracing(args.trace)
+    roles = ROLE_PACKAGES
+    if args.roles:
+        with open(args.roles, encoding="utf-8") as f:
+            roles = json.load(f)
+
+    print(f"--- Starting Dependency Deployment on {len(servers)} servers ---")
+    started = time.monotonic()
+    # One pooled SSH session per node for the check, install and re-check
+    with SSHPool() as pool:
+        pool.register_nodes(servers)
+        provisioner = Provisioner(SSHShell(pool), roles=roles, max_index_age=args.max_index_age * 3600,
+                                  workers=args.workers)
+        reports = provisioner.run(servers)
+
+    print_provision_report(reports, time.monotonic() - started)
+    finish_tracing(trace_file, {node.name: node.zone for node in servers})
+    print("--- Deployment Finished ---")
+    sys.exit(1 if any(r["status"] == "failed" for r in reports) else 0)
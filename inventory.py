@@ -1,4 +1,7 @@
 import os
+import re
+import json
+import fnmatch
 from dotenv import load_dotenv
 
 # Load configuration from the .env file.
@@ -15,18 +18,271 @@ def get_backup_paths(env_var):
         return []
     return [path.strip() for path in raw_paths.split(",")]
 
+# Nodes without NODE_X_PORTS / "ports" get their own SSH port plus the
+# listeners their declared services imply. Nothing else is assumed: a node
+# without a TLS listener on 443 must not fail the port test.
+SERVICE_DEFAULT_PORTS = {
+    "xray": "vless:443:tls",
+}
+
+def default_service_ports_spec(ssh_port=22, services=()):
+    """'ssh:<ssh_port>' plus the ports of the known services, e.g. 'ssh:2222,vless:443:tls'."""
+    items = [f"ssh:{int(ssh_port)}"]
+    items += [SERVICE_DEFAULT_PORTS[s.lower()] for s in services if s.lower() in SERVICE_DEFAULT_PORTS]
+    return ",".join(items)
+
+def default_service_ports(ssh_port=22, services=()):
+    return parse_service_ports(default_service_ports_spec(ssh_port, services))
+
+def get_service_ports(env_var, ssh_port=22, services=()):
+    """
+    Takes a comma-separated list of 'name:port[:tls[=sni]]' from .env.
+    Example: "ssh:22,reality:443:tls=www.microsoft.com,ss:8388"
+          -> [('ssh', 22, None), ('reality', 443, 'www.microsoft.com'), ('ss', 8388, None)]
+    The third item is None for plain TCP, '' for TLS without SNI, or the SNI to send.
+    Without the variable: the node's SSH port and the ports of its services.
+    """
+    return parse_service_ports(os.getenv(env_var) or default_service_ports_spec(ssh_port, services))
+
+def parse_service_ports(raw_ports):
+    if not isinstance(raw_ports, str):
+        # Already structured (inventory file): [["ssh", 22], ["reality", 443, "www.microsoft.com"]]
+        return [(p[0], int(p[1]), p[2] if len(p) > 2 else None) for p in raw_ports]
+    ports = []
+    for item in raw_ports.split(","):
+        parts = item.strip().split(":", 2)
+        if len(parts) < 2:
+            continue
+        tls = None
+        if len(parts) == 3 and parts[2].startswith("tls"):
+            tls = parts[2].partition("=")[2]
+        ports.append((parts[0], int(parts[1]), tls))
+    return ports
+
 # ==========================================
 # 🖥️ Server Nodes Inventory
 # ==========================================
-# We read server details from .env variables.
-# This list acts as a Single Source of Truth (SSOT) for all tests and scripts.
-_raw_servers = [
-    (os.getenv("NODE_1_NAME", "Node-1"), os.getenv("NODE_1_IP"), os.getenv("NODE_1_USER"), os.getenv("NODE_1_PASS"), get_backup_paths("NODE_1_BACKUP_PATHS")),
-    (os.getenv("NODE_2_NAME", "Node-2"), os.getenv("NODE_2_IP"), os.getenv("NODE_2_USER"), os.getenv("NODE_2_PASS"), get_backup_paths("NODE_2_BACKUP_PATHS")),
-    (os.getenv("NODE_3_NAME", "Node-3"), os.getenv("NODE_3_IP"), os.getenv("NODE_3_USER"), os.getenv("NODE_3_PASS"), get_backup_paths("NODE_3_BACKUP_PATHS")),
-    (os.getenv("NODE_4_NAME", "Node-4"), os.getenv("NODE_4_IP"), os.getenv("NODE_4_USER"), os.getenv("NODE_4_PASS"), get_backup_paths("NODE_4_BACKUP_PATHS")),
-    # (os.getenv("NODE_5_NAME", "Node-5"), os.getenv("NODE_5_IP"), os.getenv("NODE_5_USER"), os.getenv("NODE_5_PASS"), get_backup_paths("NODE_5_BACKUP_PATHS")),
-]
-
-# Filter out empty nodes (where IP is not provided in .env)
-SERVERS = [node for node in _raw_servers if node[1]]
\ No newline at end of file
+# This inventory acts as a Single Source of Truth (SSOT) for all tests and scripts.
+# Nodes come from one of two sources:
+#   * INVENTORY_FILE=path/to/inventory.json - a structured file for large fleets
+#     (see inventory.example.json; a relative path is relative to this folder)
+#   * NODE_X_* variables in .env - the original format, any number of nodes
+# Every node can carry a zone, tags and the VPN services it runs, and the
+# inventory keeps an index for each of them, so a selector such as
+# "zone=RU,service=outline" stays fast for thousands of nodes.
+
+
+class Node:
+    """
+    One server. Unpacks and slices like the old (Name, IP, User, Pass, Paths) tuple,
+    so 'name, ip, user, password, paths = node' and 'node[:4]' keep working.
+    """
+
+    __slots__ = ("name", "ip", "user", "password", "backup_paths", "zone", "tags", "services", "ports", "ssh_port")
+
+    def __init__(self, name, ip, user, password, backup_paths=(), zone=None, tags=(), services=(), ports=(),
+                 ssh_port=22):
+        self.name = name
+        self.ip = ip
+        self.user = user
+        self.password = password
+        self.backup_paths = list(backup_paths)
+        self.zone = zone
+        self.tags = tuple(tags)
+        self.services = tuple(services)
+        self.ports = ports
+        self.ssh_port = int(ssh_port)
+
+    def _fields(self):
+        return self.name, self.ip, self.user, self.password, self.backup_paths
+
+    def __iter__(self):
+        return iter(self._fields())
+
+    def __getitem__(self, index):
+        return self._fields()[index]
+
+    def __len__(self):
+        return 5
+
+    def __repr__(self):
+        # No password here: nodes end up in logs and test ids
+        return f"Node({self.name!r}, {self.ip!r}, zone={self.zone!r})"
+
+
+# Selector keys and the Node attribute behind each index
+SELECTOR_KEYS = {"zone": "zone", "tag": "tags", "service": "services"}
+
+
+class Inventory:
+    """
+    Nodes in file order plus indexes by name, zone, tag and service.
+    Index values are lower-cased, so 'zone=ru' and 'zone=RU' are the same.
+    """
+
+    def __init__(self, nodes):
+        self.nodes = list(nodes)
+        self.by_name = {}
+        self.indexes = {key: {} for key in SELECTOR_KEYS}
+        for position, node in enumerate(self.nodes):
+            if node.name in self.by_name:
+                raise ValueError(f"Duplicate node name in inventory: {node.name}")
+            self.by_name[node.name] = position
+            for key, attr in SELECTOR_KEYS.items():
+                values = getattr(node, attr)
+                for value in ([values] if isinstance(values, str) else values or ()):
+                    self.indexes[key].setdefault(value.lower(), []).append(position)
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def get(self, name):
+        position = self.by_name.get(name)
+        return None if position is None else self.nodes[position]
+
+    def values(self, key):
+        """Known values of an index, e.g. values('zone') -> ['nl', 'ru']."""
+        return sorted(self.indexes[key])
+
+    def select(self, selector=""):
+        """
+        Nodes matching a selector, in inventory order. Terms are separated by
+        commas and must all match; '|' means any of the values:
+          "zone=RU"                  all nodes in the RU zone
+          "zone=RU|NL,service=xray"  xray nodes in RU or NL
+          "tag!=staging"             everything except staging
+          "name=NL-*"                shell-style pattern on the node name
+        An empty selector returns every node.
+        """
+        positions = set(range(len(self.nodes)))
+        for term in filter(None, (t.strip() for t in (selector or "").split(","))):
+            key, op, raw = _split_term(term)
+            matched = self._match(key, [v.strip() for v in raw.split("|") if v.strip()])
+            positions = positions - matched if op == "!=" else positions & matched
+        return [self.nodes[p] for p in sorted(positions)]
+
+    def _match(self, key, values):
+        if key == "name":
+            matched = set()
+            for value in values:
+                if any(c in value for c in "*?["):
+                    matched.update(p for name, p in self.by_name.items() if fnmatch.fnmatchcase(name, value))
+                elif value in self.by_name:
+                    matched.add(self.by_name[value])
+            return matched
+        index = self.indexes[key]
+        return {p for value in values for p in index.get(value.lower(), ())}
+
+
+def _split_term(term):
+    match = re.fullmatch(r"\s*(\w+)\s*(!=|=)(.*)", term)
+    if not match or match.group(1) not in ("name", *SELECTOR_KEYS):
+        raise ValueError(f"Bad selector term '{term}': use name=, zone=, tag= or service= (or !=)")
+    return match.group(1), match.group(2), match.group(3)
+
+
+def _as_list(value):
+    """'a, b' or ['a', 'b'] -> ['a', 'b']"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [item.strip() for item in value if item.strip()]
+
+
+def load_inventory_file(path):
+    """
+    Reads nodes from a JSON file: {"defaults": {...}, "nodes": [{...}, ...]} or just [{...}, ...].
+    Node keys: name, ip, user, password (or password_env: variable that holds it),
+    backup_paths, zone, tags, services, ports, ssh_port. 'defaults' fills in missing keys.
+    Nodes without an IP are skipped, like empty NODE_X entries in .env.
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    defaults, entries = ({}, data) if isinstance(data, list) else (data.get("defaults", {}), data.get("nodes", []))
+
+    # Most nodes share a port layout: parse every distinct one only once
+    parsed_ports = {}
+    nodes = []
+    for number, entry in enumerate(entries, 1):
+        entry = {**defaults, **entry}
+        if not entry.get("name"):
+            raise ValueError(f"{path}: node #{number} has no name")
+        if not entry.get("ip"):
+            continue
+        password = entry.get("password")
+        if password is None and entry.get("password_env"):
+            password = os.getenv(entry["password_env"])
+        services = _as_list(entry.get("services"))
+        ssh_port = entry.get("ssh_port") or 22
+        raw_ports = entry.get("ports") or default_service_ports_spec(ssh_port, services)
+        key = raw_ports if isinstance(raw_ports, str) else json.dumps(raw_ports)
+        if key not in parsed_ports:
+            parsed_ports[key] = parse_service_ports(raw_ports)
+        nodes.append(Node(entry["name"], entry["ip"], entry.get("user", "root"), password,
+                          _as_list(entry.get("backup_paths")), entry.get("zone"),
+                          _as_list(entry.get("tags")), services, parsed_ports[key], ssh_port))
+    return nodes
+
+
+def load_env_nodes(environ=None):
+    """
+    Reads NODE_X_* variables (X = 1, 2, 3, ... with gaps allowed).
+    Optional per node: NODE_X_ZONE, NODE_X_TAGS and NODE_X_SERVICES (comma-separated),
+    NODE_X_SSH_PORT (22 by default).
+    """
+    environ = os.environ if environ is None else environ
+    numbers = sorted({int(m.group(1)) for m in map(re.compile(r"NODE_(\d+)_").match, environ) if m})
+    nodes = []
+    for i in numbers:
+        prefix = f"NODE_{i}_"
+        ip = environ.get(prefix + "IP")
+        # Filter out empty nodes (where IP is not provided in .env)
+        if not ip:
+            continue
+        services = _as_list(environ.get(prefix + "SERVICES"))
+        ssh_port = environ.get(prefix + "SSH_PORT") or 22
+        nodes.append(Node(environ.get(prefix + "NAME", f"Node-{i}"), ip,
+                          environ.get(prefix + "USER"), environ.get(prefix + "PASS"),
+                          _as_list(environ.get(prefix + "BACKUP_PATHS")),
+                          environ.get(prefix + "ZONE") or None,
+                          _as_list(environ.get(prefix + "TAGS")), services,
+                          parse_service_ports(environ.get(prefix + "PORTS")
+                                              or default_service_ports_spec(ssh_port, services)),
+                          ssh_port))
+    return nodes
+
+
+def load_inventory(path=None):
+    path = os.getenv("INVENTORY_FILE", "") if path is None else path
+    if path:
+        return Inventory(load_inventory_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), path)))
+    return Inventory(load_env_nodes())
+
+
+INVENTORY = load_inventory()
+
+# The nodes every test and script works on. INVENTORY_SELECT narrows it down
+# for a whole run, e.g. INVENTORY_SELECT="zone=RU" python scripts/monitor.py
+SERVERS = INVENTORY.select(os.getenv("INVENTORY_SELECT", ""))
+
+# Service ports to probe on each node (SSH, VLESS/Reality, Shadowsocks, panels).
+SERVICE_PORTS = {node.name: node.ports for node in INVENTORY}
+
+
+def select(selector):
+    """Nodes of SERVERS that match a selector (see Inventory.select)."""
+    chosen = {node.name for node in INVENTORY.select(selector)}
+    return [node for node in SERVERS if node.name in chosen]
+
+
+def restrict(selector):
+    """
+    Narrows SERVERS in place, so modules that already did 'from inventory import SERVERS'
+    see the subset too (used by the pytest --nodes option).
+    """
+    SERVERS[:] = select(selector)
+    return SERVERS
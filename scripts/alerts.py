@@ -0,0 +1,259 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+
+from scripts.monitor_daemon import worst_status
+from scripts.telegram_delivery import TelegramDelivery, TelegramError
+
+# ==========================================
+# 🚨 Telegram Alerts
+# ==========================================
+# The monitor hands every check result to an AlertSink, which only reacts
+# when the status of (node, check) CHANGES; a node failing for an hour is one
+# alert, not one per cycle. Changes go to the AlertDispatcher, which runs in
+# its own thread so the monitor never waits for Telegram:
+#   - changes arriving within COALESCE_SECONDS of the first one are sent as ONE
+#     digest (a zone outage = one message, not fifty),
+#   - a node that fails and recovers inside the window is not reported at all,
+#   - sends are spaced to Telegram's per-chat limits (1 message/s,
+#     20 messages/min in groups); what arrives meanwhile joins the next digest,
+#   - all messages go through one TelegramDelivery, i.e. one keep-alive HTTP
+#     session with its retries and 429 'retry_after' handling,
+#   - a digest that still fails after those retries goes back to the queue and
+#     is retried with the next batch; the AlertSink state file only records
+#     statuses the chat has actually been told about.
+
+COALESCE_SECONDS = 10.0
+# Telegram per-chat limits
+CHAT_PER_SECOND = 1
+CHAT_PER_MINUTE = 20
+# Bot API text limit is 4096 characters
+MAX_MESSAGE_LENGTH = 4000
+
+ICONS = {"fail": "🔴", "warn": "🟡", "ok": "🟢"}
+
+
+class ChatRateLimit:
+    """Sliding windows: at most 'per_second' sends in 1s and 'per_minute' in 60s."""
+
+    def __init__(self, per_second=CHAT_PER_SECOND, per_minute=CHAT_PER_MINUTE, clock=time.monotonic,
+                 sleep=time.sleep):
+        self.windows = [(1.0, per_second), (60.0, per_minute)]
+        self.sent = deque()
+        self.clock = clock
+        self.sleep = sleep
+
+    def delay(self):
+        """Seconds to wait before the next send is allowed."""
+        now = self.clock()
+        wait = 0.0
+        for span, limit in self.windows:
+            recent = [t for t in self.sent if now - t < span]
+            if limit and len(recent) >= limit:
+                wait = max(wait, recent[-limit] + span - now)
+        return wait
+
+    def acquire(self):
+        wait = self.delay()
+        if wait > 0:
+            self.sleep(wait)
+        self.sent.append(self.clock())
+        while len(self.sent) > max(limit for _, limit in self.windows):
+            self.sent.popleft()
+
+
+class Alert:
+    __slots__ = ("node", "kind", "status", "previous", "rows", "timestamp")
+
+    def __init__(self, node, kind, status, previous, rows, timestamp):
+        self.node = node
+        self.kind = kind
+        self.status = status
+        self.previous = previous
+        self.rows = rows
+        self.timestamp = timestamp
+
+    @property
+    def key(self):
+        return self.node, self.kind
+
+    def line(self):
+        head = f"{ICONS.get(self.status, '⚪')} {self.node} · {self.kind}"
+        if self.status == "ok":
+            return f"{head}: recovered"
+        bad = [f"{label} {value}" for label, value, status in self.rows if status != "ok"]
+        return f"{head}: {'; '.join(bad) or self.status}"
+
+
+def _digest_parts(alerts, max_length):
+    """[(text, alerts in that text)], problems first (fail, warn), then recoveries."""
+    order = {"fail": 0, "warn": 1, "ok": 2}
+    alerts = sorted(alerts, key=lambda a: (order.get(a.status, 3), a.node, a.kind))
+    problems = sum(1 for a in alerts if a.status != "ok")
+    title = f"🚨 Monitor: {problems} problem(s), {len(alerts) - problems} recovered"
+    parts, lines, members = [], [title], []
+    for alert in alerts:
+        line = alert.line()[:max_length - len(title) - 1]
+        if sum(len(l) + 1 for l in lines) + len(line) > max_length:
+            parts.append(("\n".join(lines), members))
+            lines, members = [title + " (cont.)"], []
+        lines.append(line)
+        members.append(alert)
+    parts.append(("\n".join(lines), members))
+    return parts
+
+
+def format_digest(alerts, max_length=MAX_MESSAGE_LENGTH):
+    """Problems first (fail, warn), then recoveries. Returns one or more message texts."""
+    return [text for text, _ in _digest_parts(alerts, max_length)]
+
+
+class AlertDispatcher:
+    """
+    Background sender. submit() never blocks; close() sends what is pending and
+    stops the thread. 'delivery' is a TelegramDelivery (or anything with send_message).
+    Callbacks in 'on_delivered' get the alerts of every digest that reached the chat.
+    """
+
+    def __init__(self, delivery, window=COALESCE_SECONDS, rate_limit=None, max_length=MAX_MESSAGE_LENGTH):
+        self.delivery = delivery
+        self.window = window
+        self.rate_limit = rate_limit or ChatRateLimit()
+        self.max_length = max_length
+        self.pending = {}        # (node, kind) -> latest Alert
+        self.reported = {}       # (node, kind) -> status the chat knows about
+        self.on_delivered = []
+        self.first_at = None
+        self.closing = False
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """Telegram bot from TG_BOT_TOKEN / TG_CHAT_ID, or None if they are not set."""
+        token, chat_id = os.getenv("TG_BOT_TOKEN"), os.getenv("TG_CHAT_ID")
+        if not token or not chat_id:
+            return None
+        return cls(TelegramDelivery(token, chat_id), **kwargs)
+
+    def submit(self, alert):
+        with self.cond:
+            # Until something is sent, the chat "knows" the status before the first change
+            self.reported.setdefault(alert.key, alert.previous)
+            self.pending[alert.key] = alert
+            if self.first_at is None:
+                self.first_at = time.monotonic()
+            self.cond.notify()
+
+    def close(self, timeout=30):
+        with self.cond:
+            self.closing = True
+            self.cond.notify()
+        self.thread.join(timeout)
+
+    def _take_batch(self):
+        """Waits for the first change, then for the rest of its window. None when closed and empty."""
+        with self.cond:
+            while not self.pending and not self.closing:
+                self.cond.wait()
+            while self.pending and not self.closing:
+                left = self.first_at + self.window - time.monotonic()
+                if left <= 0:
+                    break
+                self.cond.wait(left)
+            if not self.pending:
+                return None
+            batch, self.pending, self.first_at = self.pending, {}, None
+            # A change that was undone inside the window is not news
+            return [a for a in batch.values() if a.status != self.reported.get(a.key)]
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            if not batch:
+                continue
+            parts = _digest_parts(batch, self.max_length)
+            for i, (text, alerts) in enumerate(parts):
+                self.rate_limit.acquire()
+                try:
+                    self.delivery.send_message(text)
+                except TelegramError as e:
+                    # TelegramDelivery already retried: this and the unsent parts wait for the next batch
+                    self._requeue([a for _, rest in parts[i:] for a in rest], e)
+                    break
+                with self.cond:
+                    for alert in alerts:
+                        self.reported[alert.key] = alert.status
+                for callback in self.on_delivered:
+                    callback(alerts)
+
+    def _requeue(self, alerts, error):
+        with self.cond:
+            if self.closing:
+                # The sink state still holds the old statuses: the next run reports these again
+                print(f"⚠️ {len(alerts)} alert(s) not delivered: {error}")
+                return
+            print(f"⚠️ Alert digest not delivered, retrying with the next batch: {error}")
+            for alert in alerts:
+                # A newer change of the same check replaces the undelivered one
+                self.pending.setdefault(alert.key, alert)
+            if self.first_at is None:
+                self.first_at = time.monotonic()
+
+
+class AlertSink:
+    """
+    MonitorDaemon sink (also fed by the one-shot monitor): sends an Alert to the
+    dispatcher when the worst status of (node, check) changes. A node that is ok
+    on its first check is not announced. With 'state_path' the statuses the chat
+    knows about are kept in a JSON file (written once a digest is delivered), so
+    cron runs of monitor.py alert on changes only, and an alert that could not be
+    delivered is sent again by the next run.
+    """
+
+    def __init__(self, dispatcher, state_path=None):
+        self.dispatcher = dispatcher
+        self.state_path = state_path
+        self.last = {}           # (node, kind) -> latest status seen
+        self.known = {}          # (node, kind) -> status the chat was told (what the state file holds)
+        self.lock = threading.Lock()
+        if state_path:
+            try:
+                with open(state_path) as f:
+                    self.known = {tuple(k.split("\t", 1)): v for k, v in json.load(f).items()}
+            except (OSError, ValueError):
+                self.known = {}
+        self.last = dict(self.known)
+        dispatcher.on_delivered.append(self._delivered)
+
+    def handle(self, node, kind, result, rows, timestamp):
+        status = worst_status(rows)
+        with self.lock:
+            previous = self.last.get((node, kind))
+            if previous == status:
+                return
+            self.last[(node, kind)] = status
+            if previous is None and status == "ok":
+                self.known[(node, kind)] = status
+                self._save()
+                return
+        self.dispatcher.submit(Alert(node, kind, status, previous, rows, timestamp))
+
+    def _delivered(self, alerts):
+        with self.lock:
+            for alert in alerts:
+                self.known[alert.key] = alert.status
+            self._save()
+
+    def _save(self):
+        if not self.state_path:
+            return
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({f"{node}\t{kind}": status for (node, kind), status in self.known.items()}, f)
+        os.replace(tmp_path, self.state_path)
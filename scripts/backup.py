@@ -1,15 +1,24 @@
 import os
 import sys
 import datetime
-import requests
 import paramiko
 import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from scp import SCPClient
 from dotenv import load_dotenv
 
 # Добавляем корневую папку проекта в пути, чтобы увидеть inventory.py
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from inventory import SERVERS
+from inventory import select
+from scripts.incremental import ChunkStore, incremental_backup
+from scripts.telegram_delivery import TelegramDelivery, TelegramError
+from scripts.tracing import TracedSSHClient, span, enable_tracing, finish_tracing
+from scripts.catalog import BackupCatalog, DEFAULT_CATALOG, KEEP_DAILY, KEEP_WEEKLY, KEEP_MONTHLY
+from scripts.verify import verify_catalog
+from scripts.compression import CODECS, DEFAULT_CODEC, probe_node, choose_codec, benchmark_node, print_benchmark
 
 load_dotenv()
 
@@ -17,132 +26,504 @@ load_dotenv()
 TG_TOKEN = os.getenv("TG_BOT_TOKEN")
 TG_CHAT_ID = os.getenv("TG_CHAT_ID")
 
-RETENTION_DAYS = 7
+# Стриминг: tar пишет архив в stdout, мы читаем его прямо из SSH-канала.
+# Никаких временных файлов в /tmp на сервере, упаковка и скачивание идут одновременно.
+STREAM_BACKUPS = True
+# Размер куска при чтении из канала (байт)
+STREAM_CHUNK_SIZE = 256 * 1024
+
+# Параллельный запуск: сколько серверов бэкапим одновременно
+BACKUP_WORKERS = 2
+# Сколько секунд трафика лимитер может "выдать" разом (сглаживает всплески)
+RATE_BURST_SECONDS = 0.25
 
 # Папка для локального сохранения бэкапов
 BACKUP_DIR = os.path.join(os.path.dirname(__file__), "../backups")
 os.makedirs(BACKUP_DIR, exist_ok=True)
+# Хранилище инкрементальных бэкапов (объекты по sha256 + снапшоты)
+STORE_DIR = os.path.join(BACKUP_DIR, "store")
+# Каталог архивов (SQLite): какой архив чей, размер, sha256, доставлен ли
+CATALOG_PATH = DEFAULT_CATALOG or os.path.join(BACKUP_DIR, "catalog.db")
 
 
-def send_to_telegram(file_path, caption):
-    """Отправляет файл в Телеграм боту"""
-    url = f"https://api.telegram.org/bot{TG_TOKEN}/sendDocument"
+# Своя сессия на поток: keep-alive к api.telegram.org при параллельных бэкапах
+_tg = threading.local()
+_catalog = None
+_catalog_lock = threading.Lock()
 
-    try:
-        with open(file_path, "rb") as f:
-            files = {"document": f}
-            data = {"chat_id": TG_CHAT_ID, "disable_notification": "true", "caption": caption}
 
-            response = requests.post(url, files=files, data=data)
+def get_catalog():
+    """Один каталог на процесс. При первом создании в него заносятся уже лежащие архивы."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            is_new = not os.path.exists(CATALOG_PATH)
+            _catalog = BackupCatalog(CATALOG_PATH)
+            if is_new and os.path.isdir(BACKUP_DIR):
+                _catalog.import_directory(BACKUP_DIR)
+        return _catalog
 
-        if response.status_code == 200:
-            print(f"   ✅ Sent to Telegram!")
-        else:
-            print(f"   ❌ Telegram Error: {response.text}")
+
+def get_delivery():
+    if not hasattr(_tg, "delivery"):
+        _tg.delivery = TelegramDelivery(TG_TOKEN, TG_CHAT_ID)
+    return _tg.delivery
+
+
+def send_to_telegram(file_path, caption, node=None):
+    """
+    Отправляет файл в Телеграм боту.
+    Ретраи, retry_after, деление на части >50 МБ и докачка - в TelegramDelivery.
+    """
+    try:
+        with span("upload", node):
+            sent = get_delivery().deliver(file_path, caption)
+        print(f"   ✅ Sent to Telegram! ({sent} document(s))")
+        return True
+    except TelegramError as e:
+        print(f"   ❌ Telegram Error: {e}")
     except Exception as e:
         print(f"   ❌ Failed to send: {e}")
+    return False
+
+
+class RateLimiter:
+    """
+    Token bucket: ограничивает скорость до rate байт/с.
+    Один объект можно делить между потоками (глобальный лимит на все ноды).
+    Мы просто медленнее читаем из SSH-канала -> окно SSH заполняется ->
+    tar на сервере ждёт. Так бэкап не забивает канал, где сидят пользователи VPN.
+    """
+
+    def __init__(self, rate_bps, burst_seconds=RATE_BURST_SECONDS):
+        self.rate = float(rate_bps)
+        self.capacity = self.rate * burst_seconds
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_mbps(cls, mbps):
+        """None/0 -> без лимита. Мбит/с -> байт/с."""
+        return cls(mbps * 1_000_000 / 8) if mbps else None
+
+    def consume(self, amount):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Уходим "в долг" и спим ровно столько, сколько нужно чтобы его вернуть
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+# --exclude='*/prometheus': Игнорируем папку с метриками Outline (экономим место)
+TAR_PREFIX = "tar --exclude='*/prometheus' --exclude='*/pg_wal'"
+
+
+def build_tar_cmd(paths, target="-", codec=DEFAULT_CODEC):
+    """
+    Собирает команду TAR.
+    target="-" означает "писать архив в stdout" (режим стриминга).
+    codec: имя из scripts/compression.py (gzip = обычный -czf).
+    """
+    paths_str = " ".join(paths)
+    return f"{TAR_PREFIX} {CODECS[codec].tar_flags()} {target} {paths_str}"
+
+
+def resolve_codec(ssh, codec="auto", limiters=(), node=None):
+    """
+    'auto' -> кодек под конкретную ноду: утилиты, ядра и замеренная скорость канала
+    (не выше лимитов передачи). Если замер не удался - gzip.
+    """
+    if codec != "auto":
+        return CODECS[codec], None
+    try:
+        with span("exec", node, cmd="codec probe"):
+            profile = probe_node(ssh)
+    except Exception:
+        return CODECS[DEFAULT_CODEC], None
+    caps = [l.rate * 8 / 1_000_000 for l in limiters if l is not None]
+    return choose_codec(profile, min(caps) if caps else None), profile
+
+
+def stream_remote_archive(ssh, paths, local_path, chunk_size=STREAM_CHUNK_SIZE, limiters=(), codec=DEFAULT_CODEC):
+    """
+    Запускает tar на сервере и пишет его stdout сразу в локальный файл.
+    По пути считает sha256 и количество байт, поэтому файл не надо перечитывать.
+    Пишем во временный .part и переименовываем только после успешного tar,
+    чтобы оборванный архив никогда не выглядел как готовый бэкап.
+    limiters: RateLimiter-ы (свой для передачи и/или общий), None пропускаются.
+    Возвращает {"bytes": ..., "sha256": ...}, при ошибке бросает RuntimeError.
+    """
+    limiters = [l for l in limiters if l is not None]
+    stdin, stdout, stderr = ssh.exec_command(build_tar_cmd(paths, codec=codec))
+    channel = stdout.channel
+    digest = hashlib.sha256()
+    size = 0
+    part_path = local_path + ".part"
+
+    try:
+        with open(part_path, "wb") as f:
+            while True:
+                chunk = channel.recv(chunk_size)
+                if not chunk:
+                    break
+                f.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+                for limiter in limiters:
+                    limiter.consume(len(chunk))
+
+        exit_status = channel.recv_exit_status()
+        if exit_status != 0:
+            raise RuntimeError(f"Tar failed: {stderr.read().decode(errors='replace').strip()}")
+        if size == 0:
+            raise RuntimeError("Tar produced an empty stream")
+
+        os.replace(part_path, local_path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+    return {"bytes": size, "sha256": digest.hexdigest()}
+
+
+def download_via_tmp(ssh, paths, local_path, filename, codec=DEFAULT_CODEC):
+    """
+    Старый режим: архив во /tmp на сервере -> SCP -> удаление.
+    Оставлен как запасной вариант (STREAM_BACKUPS = False).
+    """
+    remote_path = f"/tmp/{filename}"
+
+    node = getattr(ssh, "trace_node", None)
+    print(f"   ⚙️ Archiving remote files...")
+    with span("exec", node, cmd="tar"):
+        stdin, stdout, stderr = ssh.exec_command(build_tar_cmd(paths, remote_path, codec))
+        exit_status = stdout.channel.recv_exit_status()
+
+    if exit_status != 0:
+        raise RuntimeError(f"Tar failed: {stderr.read().decode()}")
+
+    # Скачиваем файл (SCP)
+    print(f"   ⬇️ Downloading to {local_path}...")
+    with span("transfer", node), SCPClient(ssh.get_transport()) as scp:
+        scp.get(remote_path, local_path)
+
+    # Удаляем мусор на сервере
+    ssh.exec_command(f"rm {remote_path}")
+    return {"bytes": os.path.getsize(local_path), "sha256": None}
 
 
-def create_remote_backup(server_name, ip, user, password, paths):
+def create_remote_backup(server_name, ip, user, password, paths, limiters=(), port=22, codec="auto"):
     """
     1. Заходит по SSH.
-    2. Архивирует указанные пути в .tar.gz (исключая мусор prometheus).
-    3. Скачивает архив.
+    2. Архивирует указанные пути (исключая мусор prometheus): .tar.gz, .tar.zst или .tar,
+       смотря какой кодек выбран (codec="auto" - выбор под ноду).
+    3. Скачивает архив (по умолчанию стримом, без файла в /tmp на сервере).
+    Возвращает информацию об архиве, {"error": ...} если бэкап не получился,
+    или None если бэкапить нечего.
     """
     print(f"\n📦 Processing {server_name} ({ip})...")
 
     if not paths:
         print("   ⚠️ No backup paths defined in .env! Skipping.")
-        return
+        return None
 
-    ssh = paramiko.SSHClient()
+    ssh = TracedSSHClient()
+    ssh.trace_node = server_name
     ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
     try:
-        ssh.connect(ip, username=user, password=password, timeout=10)
+        ssh.connect(ip, port=port, username=user, password=password, timeout=10)
 
-        # 1. Формируем имя файла: backup_RU-MOW_2026-02-17.tar.gz
+        # 1. Кодек и имя файла: backup_RU-MOW_2026-02-17.tar.gz (или .tar.zst)
+        chosen, profile = resolve_codec(ssh, codec, limiters, node=server_name)
+        if profile:
+            link = f"{profile['link_mbps']:.0f} Mbit/s" if profile["link_mbps"] else "link unknown"
+            print(f"   🗜️ Codec: {chosen.name} ({profile['cores']} cores, {link})")
         date_str = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M")
-        filename = f"backup_{server_name}_{date_str}.tar.gz"
-        remote_path = f"/tmp/{filename}"
+        filename = f"backup_{server_name}_{date_str}{chosen.extension}"
         local_path = os.path.join(BACKUP_DIR, filename)
 
-        # 2. Собираем команду TAR
-        # --exclude='*/prometheus': Игнорируем папку с метриками Outline (экономим место)
-        paths_str = " ".join(paths)
-        tar_cmd = f"tar --exclude='*/prometheus' --exclude='*/pg_wal' -czf {remote_path} {paths_str}"
+        # 2. Упаковка + скачивание
+        if STREAM_BACKUPS:
+            print(f"   ⬇️ Streaming archive to {local_path}...")
+            with span("transfer", server_name):
+                info = stream_remote_archive(ssh, paths, local_path, limiters=limiters, codec=chosen.name)
+        else:
+            info = download_via_tmp(ssh, paths, local_path, filename, chosen.name)
+        info["path"] = local_path
+        info["codec"] = chosen.name
+        print(f"   💾 {info['bytes'] / 1024 / 1024:.2f} MB" + (f", sha256 {info['sha256'][:12]}…" if info["sha256"] else ""))
+        # sha256 принятых байт - эталон для scripts/verify.py; "verified" ставит только он
+        info["catalog_id"] = get_catalog().record(
+            server_name, local_path, paths=paths, size=info["bytes"], sha256=info["sha256"], codec=chosen.name)
+
+        # 3. Отправляем в Телеграм
+        caption = f"📦 Backup: {server_name}\n📅 Date: {date_str}\n💾 Files: {', '.join(paths)}"
+        if info["sha256"]:
+            caption += f"\n🔐 SHA256: {info['sha256']}"
+        info["delivered"] = send_to_telegram(local_path, caption, node=server_name)
+        get_catalog().update(info["catalog_id"], delivered=bool(info["delivered"]))
 
-        print(f"   ⚙️ Archiving remote files...")
-        stdin, stdout, stderr = ssh.exec_command(tar_cmd)
-        exit_status = stdout.channel.recv_exit_status()
+        # (Опционально) Удаляем локальный файл после отправки, чтобы не засорять комп
+        # os.remove(local_path)
+        return info
 
-        if exit_status != 0:
-            print(f"   ❌ Tar failed: {stderr.read().decode()}")
-            return
+    except Exception as e:
+        print(f"   🔥 Error: {e}")
+        return {"error": str(e)}
+    finally:
+        ssh.close()
 
-        # 3. Скачиваем файл (SCP)
-        print(f"   ⬇️ Downloading to {local_path}...")
-        with SCPClient(ssh.get_transport()) as scp:
-            scp.get(remote_path, local_path)
 
-        # 4. Удаляем мусор на сервере
-        ssh.exec_command(f"rm {remote_path}")
+def create_incremental_backup(server_name, ip, user, password, paths, limiters=(), port=22):
+    """
+    Инкрементальный режим: качает только изменившиеся файлы в локальное хранилище.
+    Полный .tar.gz можно собрать из любого снапшота командой --export.
+    В Телеграм ничего не отправляется: данные лежат в STORE_DIR.
+    """
+    print(f"\n♻️ Incremental backup of {server_name} ({ip})...")
 
-        # 5. Отправляем в Телеграм
-        caption = f"📦 Backup: {server_name}\n📅 Date: {date_str}\n💾 Files: {', '.join(paths)}"
-        send_to_telegram(local_path, caption)
+    if not paths:
+        print("   ⚠️ No backup paths defined in .env! Skipping.")
+        return None
 
-        # (Опционально) Удаляем локальный файл после отправки, чтобы не засорять комп
-        # os.remove(local_path)
+    ssh = TracedSSHClient()
+    ssh.trace_node = server_name
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
+    try:
+        ssh.connect(ip, port=port, username=user, password=password, timeout=10)
+        with span("transfer", server_name):
+            info = incremental_backup(ssh, server_name, paths, ChunkStore(STORE_DIR), limiters=limiters)
+        print(f"   💾 {info['files']} files, {info['changed']} changed, "
+              f"{info['downloaded']} downloaded ({info['bytes'] / 1024 / 1024:.2f} MB)")
+        for path, reason in info["missing"].items():
+            print(f"   ⚠️ Not backed up: {path} ({reason})")
+        return info
     except Exception as e:
         print(f"   🔥 Error: {e}")
+        return {"error": str(e)}
     finally:
         ssh.close()
 
 
-def cleanup_old_backups(days):
-    """Удаляет локальные файлы старше N дней"""
-    if days <= 0:
+def export_latest_snapshot(server_name):
+    """Собирает обычный .tar.gz из последнего снапшота ноды."""
+    store = ChunkStore(STORE_DIR)
+    snapshots = store.list_snapshots(server_name)
+    if not snapshots:
+        print(f"❌ No snapshots for {server_name}")
+        return None
+    stamp = os.path.basename(snapshots[-1])[:-len(".json")]
+    out_path = os.path.join(BACKUP_DIR, f"backup_{server_name}_{stamp}.tar.gz")
+    store.export(snapshots[-1], out_path)
+    get_catalog().record(server_name, out_path, codec=DEFAULT_CODEC)
+    print(f"📦 Exported {out_path}")
+    return out_path
+
+
+def verify_backups(nodes=None, force=False):
+    """
+    --verify: читает каждый архив из каталога одним потоком (без распаковки на диск),
+    параллельно на всех ядрах. Уже проверенные и не изменившиеся архивы пропускаются.
+    Возвращает количество битых архивов.
+    """
+    print("🔎 Verifying archives...")
+
+    def show(row, result):
+        name = os.path.basename(row["path"])
+        if result["ok"]:
+            print(f"   ✅ {name}: {result['members']} members, sha256 {result['sha256'][:12]}…")
+        else:
+            print(f"   ❌ {name}: {result['error']}")
+
+    checked = verify_catalog(get_catalog(), nodes=nodes, force=force, on_result=show)
+    broken = sum(1 for _, result in checked if not result["ok"])
+    if not checked:
+        print("   ✨ Nothing new to verify.")
+    else:
+        print(f"   {len(checked) - broken} ok, {broken} broken")
+    return broken
+
+
+def benchmark_nodes(servers):
+    """
+    --benchmark: сжимает реальные пути каждой ноды всеми доступными кодеками
+    (на самой ноде, по сети ничего не качается) и печатает размер и скорость.
+    """
+    for server in servers:
+        name, ip, user, password = server[0], server[1], server[2], server[3]
+        paths = server[4] if len(server) > 4 else []
+        if not paths:
+            print(f"\n⚠️ {name}: no backup paths, skipping")
+            continue
+        ssh = TracedSSHClient()
+        ssh.trace_node = name
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        try:
+            ssh.connect(ip, port=getattr(server, "ssh_port", 22), username=user, password=password, timeout=10)
+            profile, rows = benchmark_node(ssh, TAR_PREFIX, paths)
+            print_benchmark(name, profile, rows)
+        except Exception as e:
+            print(f"\n🔥 {name}: {e}")
+        finally:
+            ssh.close()
+
+
+def cleanup_old_backups(daily=KEEP_DAILY, weekly=KEEP_WEEKLY, monthly=KEEP_MONTHLY):
+    """
+    Ротация дед-отец-сын по каталогу (папку не сканируем): по каждой ноде
+    оставляем последний архив за N дней, недель и месяцев.
+    """
+    print(f"\n🧹 Retention: {daily} daily, {weekly} weekly, {monthly} monthly per node...")
+    try:
+        expired = get_catalog().apply_retention(daily, weekly, monthly)
+    except Exception as e:
+        print(f"   ⚠️ Could not apply retention: {e}")
         return
+    for row in expired:
+        print(f"   🗑️ Deleted old file: {os.path.basename(row['path'])}")
+    if not expired:
+        print("   ✨ Nothing to clean.")
+
+
+def print_latest(node):
+    """--latest: последний проверенный архив ноды (без сканирования папки)."""
+    row = get_catalog().latest(node)
+    if row is None:
+        print(f"❌ No verified backup for {node}")
+        return None
+    created = datetime.datetime.fromtimestamp(row["created_at"]).strftime("%Y-%m-%d %H:%M")
+    delivered = "sent to Telegram" if row["delivered"] else "local only"
+    print(f"📦 {node}: {row['path']}\n   {created}, {row['bytes'] / 1024 / 1024:.2f} MB, "
+          f"sha256 {row['sha256']}, {row['codec'] or 'gzip'}, {delivered}")
+    return row
+
+
+def backup_node(server, limit_mbps=None, global_limiter=None, incremental=False, codec="auto"):
+    """Бэкап одной ноды + замер времени. Никогда не бросает исключений."""
+    # Разбираем кортеж (Name, IP, User, Pass, Paths)
+    # Если вдруг путей нет в конфиге, ставим пустой список
+    name, ip, user, password = server[0], server[1], server[2], server[3]
+    paths = server[4] if len(server) > 4 else []
+
+    started = time.monotonic()
+    try:
+        # Инкрементальный режим качает файлы по отдельности, кодек там не нужен
+        run = create_incremental_backup if incremental else create_remote_backup
+        options = {} if incremental else {"codec": codec}
+        with span("node", name, task="backup"):
+            info = run(name, ip, user, password, paths,
+                       limiters=(RateLimiter.from_mbps(limit_mbps), global_limiter),
+                       port=getattr(server, "ssh_port", 22), **options)
+    except Exception as e:
+        info = {"error": str(e)}
+    report = {"name": name, "duration": time.monotonic() - started, "bytes": 0, "status": "skipped", "error": None}
+    if info is None:
+        return report
+    if "error" in info:
+        report.update(status="failed", error=info["error"])
+    else:
+        report.update(status="ok", bytes=info["bytes"])
+        if info.get("missing"):
+            report["error"] = f"{len(info['missing'])} file(s) not backed up"
+    return report
+
+
+def run_backups(servers, workers=BACKUP_WORKERS, limit_mbps=None, total_limit_mbps=None, incremental=False,
+                codec="auto"):
+    """
+    Бэкапит несколько нод одновременно.
+    limit_mbps - потолок для одной передачи, total_limit_mbps - на все сразу.
+    Ошибка на одной ноде не останавливает остальные.
+    """
+    global_limiter = RateLimiter.from_mbps(total_limit_mbps)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(backup_node, server, limit_mbps, global_limiter, incremental, codec)
+                   for server in servers]
+        return [future.result() for future in futures]
+
+
+def print_backup_report(reports):
+    print("\n📊 BACKUP REPORT")
+    icons = {"ok": "✅", "failed": "❌", "skipped": "⚠️"}
+    for r in reports:
+        mb = r["bytes"] / 1024 / 1024
+        mbps = (r["bytes"] * 8 / 1_000_000 / r["duration"]) if r["duration"] > 0 else 0.0
+        line = f"   {icons[r['status']]} {r['name']:<18} {r['duration']:7.1f}s {mb:9.2f} MB {mbps:8.2f} Mbps"
+        if r["error"]:
+            line += f"  ({r['error']})"
+        print(line)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Remote backups to Telegram")
+    parser.add_argument("--workers", type=int, default=BACKUP_WORKERS,
+                        help="How many nodes to back up at the same time")
+    parser.add_argument("--limit-mbps", type=float, default=None,
+                        help="Bandwidth cap for one transfer (Mbit/s)")
+    parser.add_argument("--total-limit-mbps", type=float, default=None,
+                        help="Bandwidth cap for all transfers together (Mbit/s)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Download only changed files into the local store (no Telegram upload)")
+    parser.add_argument("--export", metavar="NODE",
+                        help="Build a .tar.gz from the latest incremental snapshot of NODE and exit")
+    parser.add_argument("--latest", metavar="NODE",
+                        help="Print the latest verified archive of NODE from the catalog and exit")
+    parser.add_argument("--verify", action="store_true",
+                        help="Check that the archives in the catalog are complete and readable, then exit")
+    parser.add_argument("--reverify", action="store_true",
+                        help="With --verify: also re-read archives that were already verified and did not change")
+    parser.add_argument("--keep-daily", type=int, default=KEEP_DAILY, help="Daily archives kept per node")
+    parser.add_argument("--keep-weekly", type=int, default=KEEP_WEEKLY, help="Weekly archives kept per node")
+    parser.add_argument("--keep-monthly", type=int, default=KEEP_MONTHLY, help="Monthly archives kept per node")
+    parser.add_argument("--codec", choices=["auto", *CODECS], default="auto",
+                        help="Archive compression; auto picks per node from its tools, cores and link speed")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Compare the codecs (size, speed) on each node's backup paths and exit")
+    parser.add_argument("--select", default="", metavar="SELECTOR",
+                        help="Only nodes matching a selector, e.g. zone=RU or service=outline (see inventory.py)")
+    parser.add_argument("--trace", metavar="FILE", default=os.getenv("TRACE_FILE"),
+                        help="Time every phase (connect, tar, download, upload) and write a Chrome trace (env: TRACE_FILE)")
+    return parser.parse_args(argv)
 
-    print(f"\n🧹 Cleaning up local backups older than {days} days...")
-    now = time.time()
-    cutoff = days * 86400  # 86400 секунд в сутках
-
-    count = 0
-    if os.path.exists(BACKUP_DIR):
-        for filename in os.listdir(BACKUP_DIR):
-            file_path = os.path.join(BACKUP_DIR, filename)
-            # Проверяем, что это файл
-            if os.path.isfile(file_path):
-                file_age = now - os.path.getmtime(file_path)
-                if file_age > cutoff:
-                    try:
-                        os.remove(file_path)
-                        print(f"   🗑️ Deleted old file: {filename}")
-                        count += 1
-                    except Exception as e:
-                        print(f"   ⚠️ Could not delete {filename}: {e}")
-
-    if count == 0:
-        print("   ✨ Nothing to clean (all files are fresh).")
 
 if __name__ == "__main__":
+    args = parse_args()
+    if args.export:
+        exit(0 if export_latest_snapshot(args.export) else 1)
+    if args.latest:
+        exit(0 if print_latest(args.latest) else 1)
+    if args.verify:
+        nodes = {node.name for node in select(args.select)} if args.select else None
+        exit(1 if verify_backups(nodes, force=args.reverify) else 0)
+
+    if args.benchmark:
+        benchmark_nodes(select(args.select))
+        exit(0)
+
     print("🚀 Starting Backup Process...")
 
     # Проверка настроек
-    if not TG_TOKEN or not TG_CHAT_ID:
+    if not args.incremental and (not TG_TOKEN or not TG_CHAT_ID):
         print("❌ Error: TG_BOT_TOKEN or TG_CHAT_ID is missing in .env")
         exit(1)
 
     # Запуск по всем серверам из inventory.py
-    for server in SERVERS:
-        # Разбираем кортеж (Name, IP, User, Pass, Paths)
-        # Если вдруг путей нет в конфиге, ставим пустой список
-        name, ip, user, password = server[0], server[1], server[2], server[3]
-        paths = server[4] if len(server) > 4 else []
-
-        create_remote_backup(name, ip, user, password, paths)
-    cleanup_old_backups(RETENTION_DAYS)
-    print("\n✅ All Done! Check your Telegram.")
\ No newline at end of file
+    servers = select(args.select)
+    trace_file = enable_tracing(args.trace)
+    reports = run_backups(servers, workers=args.workers, limit_mbps=args.limit_mbps,
+                          total_limit_mbps=args.total_limit_mbps, incremental=args.incremental, codec=args.codec)
+    print_backup_report(reports)
+    finish_tracing(trace_file, {node.name: node.zone for node in servers})
+    cleanup_old_backups(args.keep_daily, args.keep_weekly, args.keep_monthly)
+    # Инкрементальный режим ничего не шлёт в Телеграм
+    if args.incremental:
+        print(f"\n✅ All Done! Snapshots are in {STORE_DIR} (--export NODE builds a .tar.gz).")
+    else:
+        print("\n✅ All Done! Check your Telegram.")
@@ -0,0 +1,233 @@
+import os
+import re
+import json
+import sqlite3
+import datetime
+import threading
+
+# ==========================================
+# 🗂️ Backup Catalog (SQLite)
+# ==========================================
+# One row per archive in BACKUP_DIR: node, creation time, backed-up paths,
+# size, sha256, codec, Telegram delivery and verification status.
+# - "Latest verified backup of node X" is one indexed lookup, however many
+#   archives there are.
+# - Retention is grandfather-father-son, decided from the catalog rows (no
+#   directory scan): per node keep the newest archive of each of the last
+#   KEEP_DAILY days, KEEP_WEEKLY ISO weeks and KEEP_MONTHLY months that have
+#   one (a verified archive wins over a newer unverified one in its bucket).
+#   The newest archive of a node is never deleted.
+# Deleted archives keep their row (deleted_at set) as history.
+# scripts/verify.py stores its results here too (checked_* columns).
+
+DEFAULT_CATALOG = os.getenv("BACKUP_CATALOG", "")
+KEEP_DAILY = 7
+KEEP_WEEKLY = 4
+KEEP_MONTHLY = 6
+
+# backup_<node>_<YYYY-MM-DD_HH-MM>.tar.gz / .tar.zst / .tar (see backup.py)
+ARCHIVE_NAME = re.compile(r"^backup_(?P<node>.+)_(?P<stamp>\d{4}-\d{2}-\d{2}_\d{2}-\d{2}(?:-\d{2})?)\.tar(?:\.gz|\.zst)?$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archives (
+    id INTEGER PRIMARY KEY,
+    node TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    paths TEXT NOT NULL DEFAULT '[]',
+    bytes INTEGER NOT NULL DEFAULT 0,
+    sha256 TEXT,
+    codec TEXT,
+    delivered INTEGER NOT NULL DEFAULT 0,
+    verified INTEGER,
+    deleted_at REAL
+);
+CREATE INDEX IF NOT EXISTS archives_node_time ON archives (node, created_at) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS archives_verified ON archives (node, created_at) WHERE deleted_at IS NULL AND verified = 1;
+"""
+# Columns added after the first release of the catalog (ALTER TABLE on open)
+_ADDED_COLUMNS = {
+    "checked_at": "REAL",
+    "checked_size": "INTEGER",
+    "checked_mtime": "REAL",
+    "members": "INTEGER",
+    "verify_error": "TEXT",
+}
+_COLUMNS = ("id", "node", "created_at", "path", "paths", "bytes", "sha256", "codec", "delivered", "verified",
+            "deleted_at", *_ADDED_COLUMNS)
+
+
+def _row(values):
+    if values is None:
+        return None
+    row = dict(zip(_COLUMNS, values))
+    row["paths"] = json.loads(row["paths"])
+    row["delivered"] = bool(row["delivered"])
+    row["verified"] = None if row["verified"] is None else bool(row["verified"])
+    return row
+
+
+def parse_archive_name(filename):
+    """'backup_NL-AMS_2026-02-17_03-00.tar.gz' -> ('NL-AMS', timestamp) or None."""
+    match = ARCHIVE_NAME.match(filename)
+    if not match:
+        return None
+    stamp = match.group("stamp")
+    fmt = "%Y-%m-%d_%H-%M-%S" if stamp.count("-") == 4 else "%Y-%m-%d_%H-%M"
+    return match.group("node"), datetime.datetime.strptime(stamp, fmt).timestamp()
+
+
+def gfs_keep(rows, daily=KEEP_DAILY, weekly=KEEP_WEEKLY, monthly=KEEP_MONTHLY):
+    """
+    rows: archives of ONE node, newest first. Returns the ids to keep.
+    Each rule takes the best archive of its N most recent buckets (day, ISO week, month).
+    """
+    if not rows:
+        return set()
+    keep = {rows[0]["id"]}
+    rules = (
+        (daily, lambda d: d.date()),
+        (weekly, lambda d: d.isocalendar()[:2]),
+        (monthly, lambda d: (d.year, d.month)),
+    )
+    for count, bucket_of in rules:
+        if count <= 0:
+            continue
+        buckets = {}
+        for row in rows:
+            key = bucket_of(datetime.datetime.fromtimestamp(row["created_at"]))
+            if key not in buckets:
+                if len(buckets) == count:
+                    break
+                buckets[key] = row
+            elif row["verified"] and not buckets[key]["verified"]:
+                buckets[key] = row
+        keep.update(row["id"] for row in buckets.values())
+    return keep
+
+
+class BackupCatalog:
+
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.RLock()
+        with self.lock, self.db:
+            self.db.executescript(_SCHEMA)
+            existing = {row[1] for row in self.db.execute("PRAGMA table_info(archives)")}
+            for column, kind in _ADDED_COLUMNS.items():
+                if column not in existing:
+                    self.db.execute(f"ALTER TABLE archives ADD COLUMN {column} {kind}")
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    # --- writing ---
+    def record(self, node, path, created_at=None, paths=(), size=None, sha256=None, codec=None,
+               delivered=False, verified=None):
+        """Adds (or replaces) the row of one archive. Returns its id."""
+        path = os.path.abspath(path)
+        if size is None:
+            size = os.path.getsize(path)
+        created_at = created_at if created_at is not None else os.path.getmtime(path)
+        with self.lock, self.db:
+            cursor = self.db.execute(
+                "INSERT OR REPLACE INTO archives (node, created_at, path, paths, bytes, sha256, codec, delivered,"
+                " verified) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (node, created_at, path, json.dumps(list(paths)), size, sha256, codec, int(bool(delivered)),
+                 None if verified is None else int(bool(verified))))
+            return cursor.lastrowid
+
+    def update(self, archive_id, **fields):
+        """update(id, delivered=True) / update(id, verified=False, sha256=...)"""
+        unknown = set(fields) - {"delivered", "verified", "sha256", "bytes"}
+        if unknown:
+            raise ValueError(f"Cannot update {', '.join(sorted(unknown))}")
+        values = [int(v) if isinstance(v, bool) else v for v in fields.values()]
+        with self.lock, self.db:
+            self.db.execute(f"UPDATE archives SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?",
+                            (*values, archive_id))
+
+    def record_verification(self, archive_id, result):
+        """Stores a verify_archive() result. A mismatching sha256 does not replace the recorded one."""
+        with self.lock, self.db:
+            self.db.execute(
+                "UPDATE archives SET verified = ?, checked_at = ?, checked_size = ?, checked_mtime = ?,"
+                " members = ?, verify_error = ?, sha256 = CASE WHEN ? THEN ? ELSE COALESCE(sha256, ?) END"
+                " WHERE id = ?",
+                (int(result["ok"]), datetime.datetime.now().timestamp(), result["size"], result["mtime"],
+                 result["members"], result["error"], int(result["ok"]), result["sha256"], result["sha256"],
+                 archive_id))
+
+    def import_directory(self, directory):
+        """Adds the archives of a directory that are not in the catalog yet (first run). Returns how many."""
+        known = {path for (path,) in self.db.execute("SELECT path FROM archives")}
+        added = 0
+        for filename in sorted(os.listdir(directory)):
+            parsed = parse_archive_name(filename)
+            path = os.path.abspath(os.path.join(directory, filename))
+            if parsed and path not in known and os.path.isfile(path):
+                node, created_at = parsed
+                self.record(node, path, created_at=created_at)
+                added += 1
+        return added
+
+    # --- queries ---
+    def get(self, archive_id):
+        with self.lock:
+            return _row(self.db.execute(f"SELECT {', '.join(_COLUMNS)} FROM archives WHERE id = ?",
+                                        (archive_id,)).fetchone())
+
+    def latest(self, node, verified=True):
+        """Newest archive of a node that still exists (and passed verification, unless verified=False)."""
+        where = "node = ? AND deleted_at IS NULL" + (" AND verified = 1" if verified else "")
+        with self.lock:
+            return _row(self.db.execute(f"SELECT {', '.join(_COLUMNS)} FROM archives WHERE {where}"
+                                        " ORDER BY created_at DESC LIMIT 1", (node,)).fetchone())
+
+    def archives(self, node=None, include_deleted=False):
+        """Archives, newest first."""
+        clauses, args = [], []
+        if node is not None:
+            clauses.append("node = ?")
+            args.append(node)
+        if not include_deleted:
+            clauses.append("deleted_at IS NULL")
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self.lock:
+            rows = self.db.execute(f"SELECT {', '.join(_COLUMNS)} FROM archives{where}"
+                                   " ORDER BY node, created_at DESC", args).fetchall()
+        return [_row(r) for r in rows]
+
+    def nodes(self):
+        with self.lock:
+            return [n for (n,) in self.db.execute("SELECT DISTINCT node FROM archives WHERE deleted_at IS NULL"
+                                                  " ORDER BY node")]
+
+    # --- retention ---
+    def expired(self, daily=KEEP_DAILY, weekly=KEEP_WEEKLY, monthly=KEEP_MONTHLY):
+        """Archives that the GFS policy no longer keeps, per node."""
+        doomed = []
+        for node in self.nodes():
+            rows = self.archives(node)
+            keep = gfs_keep(rows, daily, weekly, monthly)
+            doomed += [row for row in rows if row["id"] not in keep]
+        return doomed
+
+    def apply_retention(self, daily=KEEP_DAILY, weekly=KEEP_WEEKLY, monthly=KEEP_MONTHLY, dry_run=False):
+        """Deletes the expired archive files and marks their rows. Returns the expired rows."""
+        doomed = self.expired(daily, weekly, monthly)
+        if dry_run:
+            return doomed
+        now = datetime.datetime.now().timestamp()
+        for row in doomed:
+            try:
+                os.remove(row["path"])
+            except FileNotFoundError:
+                pass
+            with self.lock, self.db:
+                self.db.execute("UPDATE archives SET deleted_at = ? WHERE id = ?", (now, row["id"]))
+        return doomed
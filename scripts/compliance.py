@@ -0,0 +1,269 @@
+import os
+import sys
+import time
+import shlex
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+# ==========================================
+# 🛡️ Declarative Compliance: check & converge
+# ==========================================
+# The security policy is a list of rules (probe -> expected value -> fix).
+# A node is handled in at most three round trips, whatever the number of rules:
+#   1. ONE probe script prints the current value of every rule;
+#   2. ONE fix script runs the remediations of the failed rules, in policy order;
+#   3. ONE probe script re-checks only the rules that were fixed.
+# A compliant node costs a single round trip and is never touched.
+# With a facts cache (scripts/facts.py), rules about the OS, packages and
+# services are answered from it instead: the probe script then only carries
+# the other rules, and a fix invalidates exactly the facts it touched.
+
+FIX_TIMEOUT = 600
+COMPLIANCE_WORKERS = 8
+
+# Output markers of the batched scripts
+PROBE_MARK = "@@rule"
+FIX_MARK = "@@fix"
+
+
+class Rule:
+    """
+    One desired-state rule.
+      probe:     sh snippet printing the current value (only the first line counts)
+      expect:    values that mean 'compliant'
+      remediate: sh snippet that brings the node there (None = audit only)
+      touches:   {'packages': [...], 'services': [...]} a fix changes (facts cache invalidation)
+      waiver:    reason why a failure is an accepted exception (reported, not counted)
+      fact:      the same value from a facts cache, when one is given (see fact_value)
+    """
+
+    def __init__(self, rule_id, req, title, probe, expect, remediate=None, touches=None, waiver=None, fact=None):
+        self.id = rule_id
+        self.req = req
+        self.title = title
+        self.probe = probe
+        self.expect = tuple(expect)
+        self.remediate = remediate
+        self.touches = touches or {}
+        self.waiver = waiver
+        self.fact = fact
+
+    def passes(self, value):
+        return value in self.expect
+
+
+# Debian needs rsyslog (and an auth.log) for fail2ban to start
+_APT = "DEBIAN_FRONTEND=noninteractive apt-get -o DPkg::Lock::Timeout=120 -q"
+INSTALL_FAIL2BAN = (
+    '. /etc/os-release; pkgs=fail2ban; [ "$ID" = debian ] && pkgs="fail2ban rsyslog"; '
+    f"{_APT} install -y $pkgs || {{ {_APT} update && {_APT} install -y $pkgs; }} || exit 1; "
+    '[ "$ID" = debian ] && systemctl enable --now rsyslog; true'
+)
+START_FAIL2BAN = (
+    '. /etc/os-release; [ "$ID" = debian ] && touch /var/log/auth.log; '
+    "systemctl restart fail2ban || { journalctl -u fail2ban -n 15 --no-pager; exit 1; }"
+)
+
+SECURITY_POLICY = [
+    Rule("os_supported", "REQ-004", "OS Distribution Compliance",
+         '. /etc/os-release; echo "$ID"', ("ubuntu", "debian"), fact=("os",)),
+    Rule("ufw_active", "REQ-002", "Firewall (UFW) Status",
+         "ufw status | head -n 1", ("Status: active",)),
+    Rule("fail2ban_installed", "REQ-003", "Fail2Ban package",
+         "dpkg-query -W -f='${Status}' fail2ban", ("install ok installed", "hold ok installed"),
+         remediate=INSTALL_FAIL2BAN, touches={"packages": ["fail2ban", "rsyslog"], "services": ["rsyslog"]},
+         fact=("package", "fail2ban")),
+    Rule("fail2ban_enabled", "REQ-003", "Fail2Ban starts on boot",
+         "systemctl is-enabled fail2ban", ("enabled",),
+         remediate="systemctl enable fail2ban", touches={"services": ["fail2ban"]},
+         fact=("service_enabled", "fail2ban")),
+    Rule("fail2ban_running", "REQ-003", "Fail2Ban service running",
+         "systemctl is-active fail2ban", ("active",),
+         remediate=START_FAIL2BAN, touches={"services": ["fail2ban"]},
+         fact=("service_running", "fail2ban")),
+    Rule("root_login_disabled", "REQ-001", "SSH root login disabled",
+         "sshd -T 2>/dev/null | awk '$1 == \"permitrootlogin\" {print $2}'", ("no",),
+         waiver="Root login required for current CI/CD (Task OPS-001)"),
+]
+
+
+def fact_value(facts, fact):
+    """A rule's value from a NodeFacts, spelled like its probe prints it."""
+    kind = fact[0]
+    if kind == "os":
+        return facts.distribution
+    if kind == "package":
+        return "install ok installed" if facts.package(fact[1])["is_installed"] else "not-installed"
+    if kind == "service_enabled":
+        return "enabled" if facts.service(fact[1])["is_enabled"] else "disabled"
+    if kind == "service_running":
+        return "active" if facts.service(fact[1])["is_running"] else "inactive"
+    raise ValueError(f"Unknown fact: {fact!r}")
+
+
+def build_probe_script(rules):
+    """One line per rule: '@@rule <id> <value>'. Every probe runs in its own subshell."""
+    return "\n".join(f'v=$( ( {rule.probe} ) 2>/dev/null | head -n 1 ); echo "{PROBE_MARK} {rule.id} $v"'
+                     for rule in rules)
+
+
+def parse_probe(output):
+    values = {}
+    for line in output.splitlines():
+        if line.startswith(PROBE_MARK + " "):
+            _, rule_id, value = (line.rstrip("\n") + " ").split(" ", 2)
+            values[rule_id] = value.strip()
+    return values
+
+
+def build_fix_script(rules):
+    """Remediations in policy order; each one reports its output and exit code."""
+    return "\n".join(f'echo "{FIX_MARK} {rule.id} begin"; ( {rule.remediate} ) 2>&1; '
+                     f'echo "{FIX_MARK} {rule.id} rc $?"' for rule in rules)
+
+
+def parse_fix(output):
+    """{rule_id: (rc, output)}; a step without an rc line (script killed) gets rc None."""
+    steps, current, lines = {}, None, []
+    for line in output.splitlines():
+        fields = line.split()
+        if fields[:1] == [FIX_MARK] and len(fields) >= 3:
+            if fields[2] == "begin":
+                current, lines = fields[1], []
+                steps[current] = (None, "")
+            elif fields[2] == "rc" and len(fields) == 4:
+                steps[fields[1]] = (int(fields[3]), "\n".join(lines))
+                current = None
+        elif current is not None:
+            lines.append(line)
+    return steps
+
+
+class NodeCompliance:
+    """
+    Policy engine for one node. 'run' executes a shell command on the node and
+    returns an object with .rc and .stdout (a testinfra host.run fits).
+    With 'facts' (a NodeFacts), rules with a 'fact' are read from it and whatever
+    a fix touched is invalidated there. 'round_trips' counts the engine's own
+    scripts; facts lookups are counted by the facts cache.
+    """
+
+    def __init__(self, run, rules=SECURITY_POLICY, sudo=False, facts=None):
+        self.run = run
+        self.rules = list(rules)
+        self.sudo = sudo
+        self.facts = facts
+        self.round_trips = 0
+
+    def _exec(self, script):
+        self.round_trips += 1
+        cmd = f"sudo -n sh -c {shlex.quote(script)}" if self.sudo else f"sh -c {shlex.quote(script)}"
+        return self.run(cmd)
+
+    def probe(self, rules):
+        values = {}
+        if self.facts is not None:
+            values = {rule.id: fact_value(self.facts, rule.fact) for rule in rules if rule.fact}
+        scripted = [rule for rule in rules if rule.id not in values]
+        if scripted:
+            values.update(parse_probe(self._exec(build_probe_script(scripted)).stdout))
+        return values
+
+    def check(self):
+        """Read-only evaluation: {rule_id: result}."""
+        values = self.probe(self.rules)
+        return {rule.id: self._result(rule, values.get(rule.id, "")) for rule in self.rules}
+
+    def converge(self):
+        """Evaluate, fix what is fixable and failing, re-check the fixed rules: {rule_id: result}."""
+        results = self.check()
+        to_fix = [rule for rule in self.rules if not results[rule.id]["passed"] and rule.remediate]
+        if not to_fix:
+            return results
+
+        steps = parse_fix(self._exec(build_fix_script(to_fix)).stdout)
+        if self.facts is not None:
+            self.facts.invalidate(packages={p for r in to_fix for p in r.touches.get("packages", ())},
+                                  services={s for r in to_fix for s in r.touches.get("services", ())})
+        values = self.probe(to_fix)
+        for rule in to_fix:
+            rc, output = steps.get(rule.id, (None, ""))
+            result = self._result(rule, values.get(rule.id, ""), initial=results[rule.id]["value"])
+            result.update(remediated=True, output=output,
+                          error=None if rc == 0 else f"remediation failed (rc={rc})")
+            results[rule.id] = result
+        return results
+
+    @staticmethod
+    def _result(rule, value, initial=None):
+        return {"rule": rule.id, "req": rule.req, "title": rule.title, "passed": rule.passes(value),
+                "value": value, "expected": rule.expect, "initial": value if initial is None else initial,
+                "remediated": False, "output": "", "error": None, "waiver": rule.waiver}
+
+
+def failed_rules(results):
+    """Failed rules that count (waived exceptions are left out)."""
+    return [r for r in results.values() if not r["passed"] and not r["waiver"]]
+
+
+def audit_fleet(servers, shell, fix=False, workers=COMPLIANCE_WORKERS, rules=SECURITY_POLICY):
+    """
+    Checks (or converges) every node in parallel over 'shell' (.run(node, cmd, timeout)).
+    Returns [(name, results or None, round trips, seconds, error)] in inventory order.
+    """
+    def one(server):
+        name, user = server[0], server[2]
+
+        def run(cmd):
+            rc, out, err = shell.run(name, cmd, timeout=FIX_TIMEOUT)
+            return SimpleNamespace(rc=rc, stdout=out, stderr=err)
+
+        engine = NodeCompliance(run, rules, sudo=bool(user) and user != "root")
+        started = time.monotonic()
+        try:
+            results = engine.converge() if fix else engine.check()
+            return name, results, engine.round_trips, time.monotonic() - started, None
+        except Exception as e:
+            return name, None, engine.round_trips, time.monotonic() - started, str(e)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(pool.map(one, servers))
+
+
+def print_audit_report(rows):
+    print("\n🛡️ COMPLIANCE REPORT")
+    for name, results, round_trips, seconds, error in rows:
+        if error:
+            print(f"   ❌ {name:<18} {seconds:6.1f}s  ({error})")
+            continue
+        failed = failed_rules(results)
+        fixed = [r for r in results.values() if r["remediated"] and r["passed"]]
+        icon = "❌" if failed else ("🔧" if fixed else "✅")
+        line = f"   {icon} {name:<18} {seconds:6.1f}s {round_trips} round trip(s)"
+        if fixed:
+            line += f"  fixed: {', '.join(r['rule'] for r in fixed)}"
+        if failed:
+            line += f"  failed: {', '.join(r['rule'] + '=' + repr(r['value']) for r in failed)}"
+        print(line)
+
+
+if __name__ == "__main__":
+    import argparse
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from inventory import select
+    from scripts.ssh_pool import SSHPool
+    from scripts.iperf_mesh import SSHShell
+
+    parser = argparse.ArgumentParser(description="Security policy audit (and remediation) for the fleet")
+    parser.add_argument("--fix", action="store_true", help="Apply the remediations of failed rules")
+    parser.add_argument("--workers", type=int, default=COMPLIANCE_WORKERS, help="Nodes handled at the same time")
+    parser.add_argument("--select", default="", metavar="SELECTOR",
+                        help="Only nodes matching a selector, e.g. zone=RU or service=outline (see inventory.py)")
+    args = parser.parse_args()
+
+    servers = select(args.select)
+    with SSHPool() as pool:
+        pool.register_nodes(servers)
+        rows = audit_fleet(servers, SSHShell(pool), fix=args.fix, workers=args.workers)
+    print_audit_report(rows)
+    sys.exit(1 if any(error or failed_rules(results) for _, results, _, _, error in rows) else 0)
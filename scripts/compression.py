@@ -0,0 +1,181 @@
+import time
+import shlex
+
+# ==========================================
+# 🗜️ Archive Compression Backends
+# ==========================================
+# Single-threaded gzip makes the backup CPU-bound on a fast link: a 4-core
+# node compresses ~25 MB/s with gzip but ~100 MB/s with pigz and several
+# hundred with multi-threaded zstd. The codec is chosen per node from
+#   - the tools present on the node (zstd, pigz; gzip is always there),
+#   - its core count,
+#   - the link speed, measured with a short sample (and capped by --limit-mbps),
+# by estimating which codec finishes first: the archive is ready when both the
+# compressor and the transfer are done, so time ~ max(raw / speed, packed / link).
+# gzip is the fallback when the node cannot be probed; --codec NAME forces one.
+
+# Bytes sent back by the node to measure the link
+LINK_SAMPLE_BYTES = 1024 * 1024
+# Link speed assumed when it could not be measured (Mbit/s)
+DEFAULT_LINK_MBPS = 100.0
+PROBE_TIMEOUT = 30
+SAMPLE_MARK = b"@@sample\n"
+
+
+class Codec:
+    """
+    One way to compress the tar stream.
+      program: compressor for 'tar -I' (None = tar's own -z / no compression)
+      tool:    binary that must exist on the node (None = always available)
+      speed:   rough compression speed per core (MB/s of input), threads: uses all cores
+      ratio:   rough packed/raw size of config + database backups
+    """
+
+    def __init__(self, name, extension, program=None, tool=None, speed=25.0, threads=False, ratio=0.45):
+        self.name = name
+        self.extension = extension
+        self.program = program
+        self.tool = tool
+        self.speed = speed
+        self.threads = threads
+        self.ratio = ratio
+
+    def tar_flags(self):
+        if self.name == "gzip":
+            return "-czf"
+        if self.program is None:
+            return "-cf"
+        return f"-I {shlex.quote(self.program)} -cf"
+
+    def seconds_per_mb(self, cores, link_mbps):
+        """Estimated time to compress and send 1 MB of raw data."""
+        compress = 1.0 / (self.speed * (max(1, cores) if self.threads else 1))
+        transfer = self.ratio * 8 / max(link_mbps, 0.001)
+        return max(compress, transfer)
+
+
+# In order of preference when two estimates are equal
+CODECS = {
+    "zstd-mt": Codec("zstd-mt", ".tar.zst", "zstd -T0 -3 -q", tool="zstd", speed=150.0, threads=True, ratio=0.40),
+    "zstd": Codec("zstd", ".tar.zst", "zstd -3 -q", tool="zstd", speed=150.0, ratio=0.40),
+    "pigz": Codec("pigz", ".tar.gz", "pigz", tool="pigz", speed=25.0, threads=True, ratio=0.45),
+    "gzip": Codec("gzip", ".tar.gz", speed=25.0, ratio=0.45),
+    "none": Codec("none", ".tar", speed=400.0, ratio=1.0),
+}
+DEFAULT_CODEC = "gzip"
+
+
+def build_node_probe_cmd(sample_bytes=LINK_SAMPLE_BYTES):
+    """Tools and cores as text lines, then SAMPLE_MARK and 'sample_bytes' zeros to time the link."""
+    tools = " ".join(sorted({c.tool for c in CODECS.values() if c.tool}))
+    return (f"for t in {tools}; do command -v $t >/dev/null 2>&1 && echo \"tool $t\"; done; "
+            "echo \"cores $(nproc 2>/dev/null || echo 1)\"; "
+            f"printf '@@sample\\n'; head -c {int(sample_bytes)} /dev/zero")
+
+
+def parse_node_profile(text):
+    """'tool zstd' / 'cores 8' lines -> {'tools': {...}, 'cores': 8}"""
+    profile = {"tools": set(), "cores": 1}
+    for line in text.splitlines():
+        fields = line.split()
+        if fields[:1] == ["tool"] and len(fields) == 2:
+            profile["tools"].add(fields[1])
+        elif fields[:1] == ["cores"] and len(fields) == 2 and fields[1].isdigit():
+            profile["cores"] = max(1, int(fields[1]))
+    return profile
+
+
+def probe_node(ssh, sample_bytes=LINK_SAMPLE_BYTES, timeout=PROBE_TIMEOUT):
+    """
+    One exec: remote tools, cores and the link speed (Mbit/s, None if the sample
+    was too small to time). The sample is timed from its first to its last byte,
+    so the round trip before it does not count.
+    """
+    _, stdout, _ = ssh.exec_command(build_node_probe_cmd(sample_bytes), timeout=timeout)
+    channel = stdout.channel
+    head, sample, first_byte = b"", 0, None
+    while True:
+        chunk = channel.recv(64 * 1024)
+        if not chunk:
+            break
+        if first_byte is None:
+            head += chunk
+            if SAMPLE_MARK not in head:
+                continue
+            head, _, chunk = head.partition(SAMPLE_MARK)
+            first_byte = time.monotonic()
+        sample += len(chunk)
+    elapsed = time.monotonic() - first_byte if first_byte is not None else 0.0
+    channel.recv_exit_status()
+    profile = parse_node_profile(head.decode(errors="replace"))
+    profile["link_mbps"] = sample * 8 / elapsed / 1_000_000 if sample and elapsed > 0.001 else None
+    return profile
+
+
+def choose_codec(profile, cap_mbps=None):
+    """The available codec with the lowest estimated time per MB (see the header)."""
+    link = profile.get("link_mbps") or DEFAULT_LINK_MBPS
+    if cap_mbps:
+        link = min(link, cap_mbps)
+    available = [c for c in CODECS.values() if c.tool is None or c.tool in profile.get("tools", ())]
+    return min(available, key=lambda c: c.seconds_per_mb(profile.get("cores", 1), link))
+
+
+def build_benchmark_script(tar_prefix, paths, codecs):
+    """
+    Compresses the real backup paths with every codec on the node, output to
+    'wc -c' (nothing crosses the link): one 'codec <name> <bytes> <milliseconds>' line each.
+    tar_prefix: the tar command without flags and paths (same exclusions as the backup).
+    """
+    roots = " ".join(paths)
+    return "\n".join(f"s=$(date +%s%N); b=$({tar_prefix} {codec.tar_flags()} - {roots} 2>/dev/null | wc -c); "
+                     f"e=$(date +%s%N); echo \"codec {codec.name} $b $(( (e - s) / 1000000 ))\""
+                     for codec in codecs)
+
+
+def parse_benchmark(text):
+    """{codec: (bytes, seconds)}"""
+    results = {}
+    for line in text.splitlines():
+        fields = line.split()
+        if fields[:1] == ["codec"] and len(fields) == 4:
+            try:
+                results[fields[1]] = (int(fields[2]), int(fields[3]) / 1000)
+            except ValueError:
+                continue
+    return results
+
+
+def benchmark_node(ssh, tar_prefix, paths, timeout=None):
+    """
+    Runs every codec the node has on its backup paths. Returns (profile, rows) with
+    rows = [{'codec', 'bytes', 'seconds', 'ratio', 'mb_per_s', 'estimate'}], fastest first.
+    'none' gives the raw size; 'estimate' adds the measured link to the compression time.
+    """
+    profile = probe_node(ssh)
+    codecs = [c for c in CODECS.values() if c.tool is None or c.tool in profile["tools"]]
+    _, stdout, _ = ssh.exec_command(build_benchmark_script(tar_prefix, paths, codecs), timeout=timeout)
+    results = parse_benchmark(stdout.read().decode(errors="replace"))
+    stdout.channel.recv_exit_status()
+
+    raw = results.get("none", (0, 0.0))[0]
+    link = profile["link_mbps"] or DEFAULT_LINK_MBPS
+    rows = []
+    for name, (size, seconds) in results.items():
+        rows.append({"codec": name, "bytes": size, "seconds": seconds,
+                     "ratio": raw / size if size else 0.0,
+                     "mb_per_s": raw / 1_000_000 / seconds if seconds > 0 else 0.0,
+                     "estimate": max(seconds, size * 8 / 1_000_000 / link)})
+    rows.sort(key=lambda r: r["estimate"])
+    return profile, rows
+
+
+def print_benchmark(name, profile, rows):
+    link = f"{profile['link_mbps']:.0f} Mbit/s" if profile.get("link_mbps") else "unknown"
+    print(f"\n🗜️  {name}: {profile['cores']} core(s), link {link}, tools: {', '.join(sorted(profile['tools'])) or '-'}")
+    print(f"   {'codec':<8} {'size':>10} {'ratio':>6} {'compress':>10} {'MB/s':>8} {'+ link':>9}")
+    for r in rows:
+        print(f"   {r['codec']:<8} {r['bytes'] / 1024 / 1024:8.2f}MB {r['ratio']:5.2f}x {r['seconds']:9.2f}s "
+              f"{r['mb_per_s']:8.1f} {r['estimate']:8.2f}s")
+    if rows:
+        print(f"   → fastest end to end: {rows[0]['codec']} (auto would pick {choose_codec(profile).name})")
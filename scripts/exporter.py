@@ -0,0 +1,187 @@
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# ==========================================
+# 📊 OpenMetrics Exporter
+# ==========================================
+# Serves the fleet health as OpenMetrics text for Prometheus/VictoriaMetrics.
+# The daemon fills the exporter in the background (it is a MonitorDaemon sink),
+# a scrape only returns the last rendered page: it never touches the network,
+# so scrape latency does not grow with the number of nodes.
+# The monitor watches itself too: time and errors of every collection pass.
+
+EXPORTER_HOST = "127.0.0.1"
+EXPORTER_PORT = 9105
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PREFIX = "vpnqa"
+
+# name -> (type, help, unit)
+METRICS = {
+    "node_reachable": ("gauge", "Node answers reachability probes (1/0)", ""),
+    "node_rtt_seconds": ("gauge", "Average probe round-trip time", "seconds"),
+    "node_packet_loss_ratio": ("gauge", "Share of lost probes", "ratio"),
+    "node_jitter_seconds": ("gauge", "Mean difference of consecutive RTTs", "seconds"),
+    "port_up": ("gauge", "Service port accepts connections (1/0)", ""),
+    "port_connect_seconds": ("gauge", "TCP connect time of a service port", "seconds"),
+    "port_tls_handshake_seconds": ("gauge", "TLS handshake time of a service port", "seconds"),
+    "port_tls_ok": ("gauge", "TLS handshake succeeded (1/0), TLS ports only", ""),
+    "ssh_up": ("gauge", "Remote metrics could be collected over SSH (1/0)", ""),
+    "disk_used_ratio": ("gauge", "Used share of the root filesystem", "ratio"),
+    "memory_used_ratio": ("gauge", "Used share of RAM", "ratio"),
+    "load1": ("gauge", "1 minute load average", ""),
+    "containers_running": ("gauge", "Running Docker containers", ""),
+    "service_up": ("gauge", "Expected VPN service is running (1/0)", ""),
+    "check_timestamp_seconds": ("gauge", "Unix time of the last result of a check", "seconds"),
+    "collection_duration_seconds": ("gauge", "Duration of the last collection pass", "seconds"),
+    "collection": ("counter", "Collection passes (one prober pass or one SSH check)", ""),
+    "collection_errors": ("counter", "Failed collections (prober failure or SSH/probe error per node)", ""),
+}
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_sample(name, labels, value):
+    label_text = ",".join(f'{k}="{escape_label(v)}"' for k, v in labels.items())
+    return f"{name}{{{label_text}}} {value!r}" if label_text else f"{name} {value!r}"
+
+
+def node_samples(node, kind, result):
+    """(metric, labels, value) samples of one check result. Missing values are not exported."""
+    base = {"node": node}
+    samples = []
+
+    def add(metric, value, **labels):
+        if value is not None:
+            samples.append((metric, dict(base, **labels), float(value)))
+
+    if kind == "reachability":
+        add("node_reachable", 1 if result["received"] else 0)
+        add("node_packet_loss_ratio", result["loss"])
+        add("node_rtt_seconds", result["avg"] / 1000 if result["avg"] is not None else None)
+        add("node_jitter_seconds", result["jitter"] / 1000 if result["jitter"] is not None else None)
+    elif kind == "ports":
+        for r in result:
+            labels = {"service": r["name"], "port": r["port"]}
+            add("port_up", 1 if r["status"] == "open" else 0, **labels)
+            add("port_connect_seconds", r["connect_ms"] / 1000 if r["connect_ms"] is not None else None, **labels)
+            add("port_tls_handshake_seconds", r["tls_ms"] / 1000 if r["tls_ms"] is not None else None, **labels)
+            if r["status"] == "open" and (r["tls_ms"] is not None or r["tls_error"]):
+                add("port_tls_ok", 0 if r["tls_error"] else 1, **labels)
+    elif kind == "metrics":
+        add("ssh_up", 0 if "error" in result else 1)
+        if "error" not in result:
+            add("disk_used_ratio", result["disk_used"] / 100 if result.get("disk_used") is not None else None)
+            add("memory_used_ratio", result["mem_used"] / 100 if result.get("mem_used") is not None else None)
+            add("load1", result.get("load1"))
+            if result.get("containers") is not None:
+                add("containers_running", len(result["containers"]))
+            for label, is_up in result.get("services", []):
+                add("service_up", 1 if is_up else 0, service=label)
+    return samples
+
+
+class OpenMetricsExporter:
+    """
+    MonitorDaemon sink that keeps the latest samples of every node.
+    render() builds the page only when something changed since the last scrape.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}      # (node, kind) -> [(metric, labels, value)]
+        self.collections = {}  # kind -> {"runs", "errors", "duration"}
+        self._page = None
+
+    def handle(self, node, kind, result, rows, timestamp):
+        samples = node_samples(node, kind, result)
+        samples.append(("check_timestamp_seconds", {"node": node, "check": kind}, float(timestamp)))
+        with self.lock:
+            self.samples[(node, kind)] = samples
+            self._page = None
+
+    def handle_collection(self, kind, duration, errors):
+        with self.lock:
+            stats = self.collections.setdefault(kind, {"runs": 0, "errors": 0, "duration": 0.0})
+            stats["runs"] += 1
+            stats["errors"] += errors
+            stats["duration"] = duration
+            self._page = None
+
+    def render(self):
+        with self.lock:
+            if self._page is None:
+                self._page = self._render().encode()
+            return self._page
+
+    def _render(self):
+        by_metric = {name: [] for name in METRICS}
+        for key in sorted(self.samples):
+            for metric, labels, value in self.samples[key]:
+                by_metric[metric].append((labels, value))
+        for kind in sorted(self.collections):
+            stats = self.collections[kind]
+            labels = {"check": kind}
+            by_metric["collection_duration_seconds"].append((labels, float(stats["duration"])))
+            by_metric["collection"].append((labels, float(stats["runs"])))
+            by_metric["collection_errors"].append((labels, float(stats["errors"])))
+
+        lines = []
+        for metric, (metric_type, help_text, unit) in METRICS.items():
+            name = f"{PREFIX}_{metric}"
+            lines.append(f"# TYPE {name} {metric_type}")
+            if unit:
+                lines.append(f"# UNIT {name} {unit}")
+            lines.append(f"# HELP {name} {help_text}")
+            # OpenMetrics: counter samples carry the _total suffix
+            sample_name = f"{name}_total" if metric_type == "counter" else name
+            for labels, value in by_metric[metric]:
+                lines.append(format_sample(sample_name, labels, value))
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def _handler_for(exporter):
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = exporter.render()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_http_server(exporter, host=EXPORTER_HOST, port=EXPORTER_PORT):
+    """Serves /metrics in a background thread. Returns the server (server.server_address, shutdown())."""
+    server = ThreadingHTTPServer((host, port), _handler_for(exporter))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.5}, daemon=True).start()
+    return server
+
+
+def serve(daemon, exporter, host=EXPORTER_HOST, port=EXPORTER_PORT):
+    """Exporter mode of monitor.py: collection loop in the background, HTTP until Ctrl+C."""
+    server = start_http_server(exporter, host, port)
+    print(f"📊 OpenMetrics exporter on http://{server.server_address[0]}:{server.server_address[1]}/metrics")
+    collector = threading.Thread(target=daemon.run_forever, daemon=True)
+    collector.start()
+    try:
+        while collector.is_alive():
+            time.sleep(1)
+    finally:
+        daemon.stop()
+        collector.join()
+        server.shutdown()
+        server.server_close()
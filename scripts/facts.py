@@ -0,0 +1,169 @@
+import shlex
+import threading
+from collections import Counter
+
+# ==========================================
+# 🧠 Remote Facts Cache
+# ==========================================
+# OS release, package and service state of a node, gathered with ONE batched
+# shell command per node and then served from memory for the whole session.
+# Every lookup that needs SSH is a miss, every lookup from memory is a hit.
+# Actions that change the node (self-healing: apt install, systemctl restart)
+# must call invalidate() with exactly what they touched; the next lookup
+# refreshes those facts (and any other stale ones) in one round trip.
+
+# Gathered up front together with the first lookup of a node
+DEFAULT_PACKAGES = ("fail2ban", "rsyslog", "ufw", "iperf3", "curl", "openssh-server")
+DEFAULT_SERVICES = ("fail2ban", "rsyslog", "ufw", "ssh", "docker", "x-ui")
+
+
+def build_facts_cmd(os_release=True, packages=(), services=()):
+    """
+    One POSIX sh script, one line per fact:
+      os <ID> <VERSION_ID> <VERSION_CODENAME>
+      pkg <name> <dpkg status words...> <version>
+      svc <name> <is-active rc> <is-enabled rc>   (0 = running / enabled, like testinfra)
+    """
+    parts = []
+    if os_release:
+        parts.append('( . /etc/os-release 2>/dev/null; echo "os ${ID:-unknown} ${VERSION_ID:-unknown} ${VERSION_CODENAME:--}" )')
+    if packages:
+        names = " ".join(shlex.quote(p) for p in packages)
+        parts.append(f"for p in {names}; do "
+                     "echo \"pkg $p $(dpkg-query -W -f='${Status} ${Version}' \"$p\" 2>/dev/null)\"; done")
+    if services:
+        names = " ".join(shlex.quote(s) for s in services)
+        parts.append(f"for u in {names}; do "
+                     "systemctl is-active \"$u\" >/dev/null 2>&1; a=$?; "
+                     "systemctl is-enabled \"$u\" >/dev/null 2>&1; e=$?; "
+                     "echo \"svc $u $a $e\"; done")
+    return "; ".join(parts)
+
+
+def parse_facts(output):
+    """Returns (os_release or None, {package: fact}, {service: fact})."""
+    os_release, packages, services = None, {}, {}
+    for line in output.splitlines():
+        fields = line.split()
+        if not fields:
+            continue
+        if fields[0] == "os" and len(fields) >= 3:
+            os_release = {"distribution": fields[1].lower(), "release": fields[2],
+                          "codename": fields[3] if len(fields) > 3 and fields[3] != "-" else None}
+        elif fields[0] == "pkg" and len(fields) >= 2:
+            status = " ".join(fields[2:5])
+            # Same rule as testinfra: 'install ok installed' or 'hold ok installed'
+            installed = status in ("install ok installed", "hold ok installed")
+            packages[fields[1]] = {"is_installed": installed,
+                                   "version": fields[5] if installed and len(fields) > 5 else None}
+        elif fields[0] == "svc" and len(fields) == 4:
+            services[fields[1]] = {"is_running": fields[2] == "0", "is_enabled": fields[3] == "0"}
+    return os_release, packages, services
+
+
+class NodeFacts:
+    """
+    Facts of one node. 'run' executes a shell command on the node and returns
+    an object with .stdout (a testinfra host.run fits).
+    """
+
+    def __init__(self, name, run, stats, packages=DEFAULT_PACKAGES, services=DEFAULT_SERVICES):
+        self.name = name
+        self.run = run
+        self.stats = stats
+        self.default_packages = tuple(packages)
+        self.default_services = tuple(services)
+        self._os = None
+        self._packages = {}
+        self._services = {}
+        self._stale = {"packages": set(), "services": set()}
+        self._lock = threading.Lock()
+        self.gathers = 0
+
+    # --- lookups ---
+    @property
+    def os(self):
+        with self._lock:
+            if self._os is None:
+                self._refresh(os_release=True)
+            else:
+                self.stats["hits"] += 1
+            return self._os
+
+    @property
+    def distribution(self):
+        return self.os["distribution"]
+
+    @property
+    def release(self):
+        return self.os["release"]
+
+    def package(self, name):
+        """{'is_installed': bool, 'version': str or None}"""
+        return self._lookup("packages", self._packages, name)
+
+    def service(self, name):
+        """{'is_running': bool, 'is_enabled': bool}"""
+        return self._lookup("services", self._services, name)
+
+    def _lookup(self, kind, cache, name):
+        with self._lock:
+            if name in cache and name not in self._stale[kind]:
+                self.stats["hits"] += 1
+            else:
+                self._refresh(**{kind: {name}})
+            return cache[name]
+
+    # --- invalidation ---
+    def invalidate(self, packages=(), services=(), os_release=False):
+        """Marks facts as outdated after the node was changed (install, restart, upgrade)."""
+        with self._lock:
+            self._stale["packages"].update(packages)
+            self._stale["services"].update(services)
+            if os_release:
+                self._os = None
+
+    # --- gathering ---
+    def _refresh(self, os_release=False, packages=(), services=()):
+        """One round trip: the requested facts + everything stale (+ defaults on first contact)."""
+        self.stats["misses"] += 1
+        first = self.gathers == 0
+        packages = set(packages) | self._stale["packages"] | (set(self.default_packages) if first else set())
+        services = set(services) | self._stale["services"] | (set(self.default_services) if first else set())
+        os_release = os_release or first
+
+        output = self.run(build_facts_cmd(os_release, sorted(packages), sorted(services))).stdout
+        self.gathers += 1
+        os_fact, package_facts, service_facts = parse_facts(output)
+        if os_release:
+            self._os = os_fact or {"distribution": "unknown", "release": "unknown", "codename": None}
+        for name in packages:
+            self._packages[name] = package_facts.get(name, {"is_installed": False, "version": None})
+        for name in services:
+            self._services[name] = service_facts.get(name, {"is_running": False, "is_enabled": False})
+        self._stale["packages"] -= packages
+        self._stale["services"] -= services
+
+
+class FactsCache:
+    """Session-wide NodeFacts per node name, with hit/miss counters per node."""
+
+    def __init__(self, packages=DEFAULT_PACKAGES, services=DEFAULT_SERVICES):
+        self.packages = packages
+        self.services = services
+        self.stats = {}
+        self._nodes = {}
+        self._lock = threading.Lock()
+
+    def node(self, name, run):
+        with self._lock:
+            if name not in self._nodes:
+                self.stats[name] = Counter()
+                self._nodes[name] = NodeFacts(name, run, self.stats[name], self.packages, self.services)
+            return self._nodes[name]
+
+    def totals(self):
+        total = Counter()
+        for counter in self.stats.values():
+            total.update(counter)
+        return total
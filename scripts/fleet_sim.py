@@ -0,0 +1,518 @@
+import os
+import re
+import sys
+import json
+import logging
+import time
+import random
+import shutil
+import socket
+import selectors
+import tempfile
+import threading
+import subprocess
+
+import paramiko
+
+# Clients that hang up mid-session are normal here (timeouts, 'down' tests)
+logging.getLogger("paramiko").setLevel(logging.CRITICAL)
+
+# ==========================================
+# 🧪 Local Fleet Simulator
+# ==========================================
+# Many fake nodes in one process, each one an SSH server on its own
+# 127.0.0.1 port (paramiko ServerInterface). Every node has a sandbox folder
+# with its own /etc/os-release, /proc/meminfo, backup data and service state;
+# commands run there with real sh/tar/find and stub df, free, docker,
+# systemctl, ufw, dpkg-query and apt-get that read and change that state.
+# The simulator writes an inventory file (see inventory.py), so the real
+# tools run against it unchanged:
+#   python scripts/fleet_sim.py serve --nodes 50 --inventory sim.json
+#   INVENTORY_FILE=sim.json python scripts/compliance.py --fix
+# and 'bench' measures how a tool scales with the number of nodes:
+#   python scripts/fleet_sim.py bench --sizes 10,50,200 -- python scripts/monitor.py
+# Latency, bandwidth and failures (down, auth, hang, flaky, disk_full,
+# service_down) are configurable per fleet and can be changed per node.
+# ICMP is not simulated: all nodes share 127.0.0.1.
+
+SIM_PASSWORD = "sim"
+ZONES = ("NL", "DE", "RU", "AT", "FI")
+FAILURE_MODES = ("down", "auth", "hang", "flaky", "disk_full", "service_down")
+# Share of commands a 'flaky' node drops (channel closed without an exit status)
+FLAKY_RATE = 0.5
+READ_CHUNK = 32 * 1024
+
+# Absolute node paths the commands may use. They are made relative and the
+# command runs inside the node folder: tar and find print the same member
+# names as on a real node ('etc/x-ui/...'); find and sha256sum print absolute
+# paths again. '2>/dev/null' etc. stay untouched.
+_NODE_PATH = re.compile(r"(?<![\w.\-/~])/(?=(?:etc|proc|var|opt|srv|home|root)(?:/|\b))")
+# Same for file lists on stdin ('xargs -0 sha256sum', 'tar -T -')
+_NODE_PATH_BYTES = re.compile(_NODE_PATH.pattern.encode())
+
+# Versions apt-get "installs" (unknown package -> 'Unable to locate package')
+CANDIDATES = {"iperf3": "3.12-1", "curl": "7.88.1-10", "fail2ban": "1.0.2-2", "rsyslog": "8.2302.0-1",
+              "ufw": "0.36.2-1", "docker.io": "20.10.24+dfsg1-1", "openssh-server": "1:9.2p1-2"}
+BASE_PACKAGES = ("curl", "iperf3", "fail2ban", "rsyslog", "ufw", "openssh-server")
+BASE_UNITS = ("ssh", "fail2ban", "rsyslog", "ufw")
+
+# Stub tools. $SIM_STATE is the node's state folder, $SIM_BIN this folder.
+STUBS = {
+    "df": """
+used=$(cat "$SIM_STATE/disk_used")
+echo "Filesystem     1024-blocks     Used Available Capacity Mounted on"
+echo "/dev/vda1         41152736 $((41152736 * used / 100)) $((41152736 * (100 - used) / 100))      $used% /"
+""",
+    "free": """
+awk '/^MemTotal:/{t=int($2/1024)} /^MemAvailable:/{a=int($2/1024)}
+     END{printf "               total        used        free      shared  buff/cache   available\\n";
+         printf "Mem:     %11d %11d %11d %11d %11d %11d\\n", t, t-a, a/2, 8, a/2, a;
+         printf "Swap:              0           0           0\\n"}' proc/meminfo
+""",
+    "docker": """
+[ -f "$SIM_STATE/containers" ] || { echo "Cannot connect to the Docker daemon at unix:///var/run/docker.sock." >&2; exit 1; }
+case "$1" in ps) cat "$SIM_STATE/containers" ;; *) exit 0 ;; esac
+""",
+    "systemctl": """
+cmd=$1; shift
+for u; do
+  case "$u" in --*) continue ;; esac
+  u=${u%.service}; s="$SIM_STATE/services/$u"
+  case "$cmd" in
+    is-active) [ -f "$s.running" ] && echo active || { echo inactive; exit 3; } ;;
+    is-enabled) [ -f "$s.enabled" ] && echo enabled || { echo disabled; exit 1; } ;;
+    enable) [ -f "$s.unit" ] || { echo "Failed to enable unit: Unit file $u.service does not exist." >&2; exit 1; }
+            touch "$s.enabled"; [ "$1" = --now ] && touch "$s.running" ;;
+    start|restart) [ -f "$s.unit" ] || { echo "Failed to start $u.service: Unit $u.service not found." >&2; exit 5; }
+                   [ -f "$s.crashes" ] && { echo "Job for $u.service failed." >&2; exit 1; }
+                   touch "$s.running" ;;
+    stop) rm -f "$s.running" ;;
+  esac
+done
+""",
+    "ufw": """
+case "$1" in
+  status) [ -f "$SIM_STATE/ufw.active" ] && printf 'Status: active\\n\\nTo                         Action      From\\n--                         ------      ----\\n22/tcp                     ALLOW       Anywhere\\n' || echo "Status: inactive" ;;
+  enable|--force) touch "$SIM_STATE/ufw.active"; echo "Firewall is active and enabled on system startup" ;;
+  disable) rm -f "$SIM_STATE/ufw.active" ;;
+esac
+""",
+    "dpkg-query": """
+fmt='${Status}\n'
+for a; do case "$a" in -f=*) fmt=${a#-f=} ;; -*) ;; *) pkg=$a ;; esac; done
+[ -f "$SIM_STATE/packages/$pkg" ] || { echo "dpkg-query: no packages found matching $pkg" >&2; exit 1; }
+printf '%s' "$fmt" | sed "s|\${Status}|install ok installed|; s|\${Version}|$(cat "$SIM_STATE/packages/$pkg")|"
+""",
+    "apt-get": """
+[ -f "$SIM_STATE/apt.broken" ] && { echo "E: Could not get lock /var/lib/dpkg/lock-frontend" >&2; exit 100; }
+mode=""
+for a; do
+  case "$a" in
+    update) mkdir -p var/lib/apt/periodic && touch var/lib/apt/periodic/update-success-stamp; echo "Reading package lists..." ;;
+    install) mode=install ;;
+    -o) ;;
+    -*|*::*) ;;
+    *) [ "$mode" = install ] || continue
+       v=$(awk -v p="$a" '$1 == p {print $2}' "$SIM_BIN/candidates")
+       [ -n "$v" ] || { echo "E: Unable to locate package $a" >&2; exit 100; }
+       echo "$v" > "$SIM_STATE/packages/$a"
+       case "$a" in fail2ban|rsyslog) touch "$SIM_STATE/services/$a.unit" ;; esac ;;
+  esac
+done
+""",
+    # File lists come back absolute, like on the node (the command ran on relative paths)
+    "find": """
+case " $* " in
+  *" -printf "*) /usr/bin/find "$@" | sed -z 's|\\t\\([^/\\t][^\\t]*\\)$|\\t/\\1|' ;;
+  *) /usr/bin/find "$@" | sed 's|^\\([^/.]\\)|/\\1|' ;;
+esac
+""",
+    "sha256sum": """/usr/bin/sha256sum "$@" | sed 's|^\\([0-9a-f]*  \\)\\([^/]\\)|\\1/\\2|'""",
+    "sshd": 'echo "permitrootlogin yes"',
+    "journalctl": 'echo "$(date "+%b %d %T") $(hostname) systemd[1]: fail2ban.service: Main process exited, code=exited"',
+    "hostname": 'cat "$SIM_STATE/hostname"',
+    "sudo": '[ "$1" = -n ] && shift; exec "$@"',
+}
+
+
+def sandbox_command(command):
+    """'. /etc/os-release; tar -czf - /etc/x-ui' -> '. etc/os-release; tar -czf - etc/x-ui'"""
+    return _NODE_PATH.sub("", command)
+
+
+class SimNode:
+    """One simulated node: where it listens, its sandbox and how it misbehaves."""
+
+    def __init__(self, name, zone, kind, root, latency=0.0, failure=None, password=SIM_PASSWORD):
+        self.name = name
+        self.zone = zone
+        self.kind = kind
+        self.root = root
+        self.state = os.path.join(root, ".sim")
+        self.latency = latency
+        self.failure = failure
+        self.password = password
+        self.port = None
+        self.commands = 0
+        self.backup_paths = ["/etc/x-ui"] if kind == "xray" else ["/opt/outline"]
+        self.services = ["xray"] if kind == "xray" else ["outline"]
+
+    def set_state(self, relative, value=""):
+        path = os.path.join(self.state, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(str(value))
+
+    def clear_state(self, relative):
+        path = os.path.join(self.state, relative)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def inventory_entry(self):
+        return {"name": self.name, "ip": "127.0.0.1", "ssh_port": self.port, "user": "root",
+                "password": self.password, "zone": self.zone, "tags": ["sim"], "services": self.services,
+                "backup_paths": self.backup_paths, "ports": [["ssh", self.port]]}
+
+
+def _write(path, content, mode=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb" if isinstance(content, bytes) else "w") as f:
+        f.write(content)
+    if mode is not None:
+        os.chmod(path, mode)
+
+
+class _NodeServer(paramiko.ServerInterface):
+    def __init__(self, fleet, node):
+        self.fleet = fleet
+        self.node = node
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_auth_password(self, username, password):
+        # Auth costs about two round trips on a real link
+        time.sleep(2 * self.node.latency)
+        if self.node.failure == "auth" or password != self.node.password:
+            return paramiko.AUTH_FAILED
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self.fleet.exec_command, args=(self.node, channel, command.decode()),
+                         daemon=True).start()
+        return True
+
+
+class FleetSimulator:
+    """
+    count nodes named <ZONE>-SIM-001...; 'latency' is (min, max) seconds per
+    round trip, 'bandwidth_mbps' caps every command's stdout, 'backup_kb' is
+    the (incompressible) backup data per node and 'failures' maps a failure
+    mode to the share of nodes that get it, e.g. {"down": 0.1, "hang": 0.05}.
+    Everything is reproducible for a given seed.
+    """
+
+    def __init__(self, count=10, seed=0, latency=(0.0, 0.0), bandwidth_mbps=None, backup_kb=64, failures=None,
+                 flaky_rate=FLAKY_RATE, workdir=None):
+        self.rng = random.Random(seed)
+        self.bandwidth_mbps = bandwidth_mbps
+        self.flaky_rate = flaky_rate
+        self.workdir = workdir or tempfile.mkdtemp(prefix="fleet-sim-")
+        self._own_workdir = workdir is None
+        self.bin = os.path.join(self.workdir, "bin")
+        self.nodes = []
+        self._listeners = {}
+        self._transports = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._selector = None
+        self._acceptor = None
+        self._host_key = None
+
+        modes = self._assign_failures(count, failures or {})
+        self._write_tools()
+        for i in range(count):
+            zone = ZONES[i % len(ZONES)]
+            kind = "xray" if i % 2 == 0 else "outline"
+            node = SimNode(f"{zone}-SIM-{i + 1:03d}", zone, kind, os.path.join(self.workdir, "nodes", f"{i + 1:03d}"),
+                           latency=self.rng.uniform(*latency), failure=modes[i])
+            self._build_node(node, backup_kb)
+            self.nodes.append(node)
+        self.by_name = {node.name: node for node in self.nodes}
+
+    def _assign_failures(self, count, failures):
+        unknown = set(failures) - set(FAILURE_MODES)
+        if unknown:
+            raise ValueError(f"Unknown failure mode(s): {', '.join(sorted(unknown))}")
+        order = list(range(count))
+        self.rng.shuffle(order)
+        modes = [None] * count
+        for mode in FAILURE_MODES:
+            for _ in range(round(failures.get(mode, 0) * count)):
+                if order:
+                    modes[order.pop()] = mode
+        return modes
+
+    def _write_tools(self):
+        for tool, body in STUBS.items():
+            _write(os.path.join(self.bin, tool), f"#!/bin/sh\n{body.strip()}\n", 0o755)
+        _write(os.path.join(self.bin, "candidates"), "".join(f"{p} {v}\n" for p, v in CANDIDATES.items()))
+
+    def _build_node(self, node, backup_kb):
+        root = node.root
+        _write(os.path.join(root, "etc/os-release"),
+               'PRETTY_NAME="Debian GNU/Linux 12 (bookworm)"\nID=debian\nVERSION_ID="12"\nVERSION_CODENAME=bookworm\n')
+        total = self.rng.choice((1024, 2048, 4096)) * 1024
+        available = int(total * self.rng.uniform(0.3, 0.8))
+        _write(os.path.join(root, "proc/meminfo"),
+               f"MemTotal:       {total} kB\nMemFree:        {available // 2} kB\nMemAvailable:   {available} kB\n")
+        _write(os.path.join(root, "proc/loadavg"), f"{self.rng.uniform(0, 2):.2f} 0.40 0.35 1/123 4567\n")
+        _write(os.path.join(root, "var/log/auth.log"), "")
+        _write(os.path.join(root, "var/lib/apt/periodic/update-success-stamp"), "")
+
+        # Backup data: a config plus random (incompressible) blobs, and a folder the backup excludes
+        data = node.backup_paths[0].lstrip("/")
+        _write(os.path.join(root, data, "config.json"), json.dumps({"node": node.name, "inbounds": [443]}))
+        for i in range(max(1, backup_kb // 64)):
+            _write(os.path.join(root, data, f"db/blob-{i}.bin"), self.rng.randbytes(min(backup_kb, 64) * 1024))
+        if node.kind == "outline":
+            _write(os.path.join(root, data, "prometheus/metrics.db"), self.rng.randbytes(4096))
+
+        node.set_state("hostname", node.name)
+        node.set_state("disk_used", 97 if node.failure == "disk_full" else self.rng.randint(20, 70))
+        node.set_state("ufw.active")
+        for package in BASE_PACKAGES:
+            node.set_state(f"packages/{package}", CANDIDATES[package])
+        units = BASE_UNITS + (("x-ui",) if node.kind == "xray" else ("docker",))
+        for unit in units:
+            node.set_state(f"services/{unit}.unit")
+            node.set_state(f"services/{unit}.enabled")
+            node.set_state(f"services/{unit}.running")
+        if node.kind == "outline":
+            node.set_state("packages/docker.io", CANDIDATES["docker.io"])
+            node.set_state("containers", "shadowbox\nwatchtower\n")
+        if node.failure == "service_down":
+            node.clear_state("services/fail2ban.running")
+            node.clear_state("services/x-ui.running")
+            if node.kind == "outline":
+                node.set_state("containers", "watchtower\n")
+
+    # --- SSH side ---
+    def start(self):
+        """Opens one listening port per node ('down' nodes get a port nobody listens on)."""
+        self._host_key = paramiko.RSAKey.generate(2048)
+        self._selector = selectors.DefaultSelector()
+        for node in self.nodes:
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind(("127.0.0.1", 0))
+            node.port = listener.getsockname()[1]
+            if node.failure == "down":
+                listener.close()
+                continue
+            listener.listen(128)
+            listener.setblocking(False)
+            self._listeners[listener] = node
+            self._selector.register(listener, selectors.EVENT_READ, node)
+        self._acceptor = threading.Thread(target=self._accept_loop, name="fleet-sim-accept", daemon=True)
+        self._acceptor.start()
+        return self
+
+    def _accept_loop(self):
+        while not self._stop.is_set():
+            for key, _ in self._selector.select(timeout=0.2):
+                try:
+                    sock, _ = key.fileobj.accept()
+                except OSError:
+                    continue
+                sock.setblocking(True)
+                transport = paramiko.Transport(sock)
+                transport.add_server_key(self._host_key)
+                try:
+                    # With an event the handshake runs on the transport thread, not here
+                    transport.start_server(event=threading.Event(), server=_NodeServer(self, key.data))
+                except (paramiko.SSHException, EOFError, OSError):
+                    transport.close()
+                    continue
+                with self._lock:
+                    self._transports = [t for t in self._transports if t.is_active()] + [transport]
+
+    def exec_command(self, node, channel, command):
+        """Runs one exec request inside the node sandbox (on its own thread)."""
+        proc = None
+        try:
+            node.commands += 1
+            time.sleep(node.latency)
+            if node.failure == "hang":
+                while not channel.closed and not self._stop.wait(0.1):
+                    pass
+                return
+            if node.failure == "flaky" and self.rng.random() < self.flaky_rate:
+                return
+            env = {"PATH": f"{self.bin}:/usr/bin:/bin", "SIM_BIN": self.bin, "SIM_STATE": node.state,
+                   "HOME": os.path.join(node.root, "root"), "LANG": "C", "LC_ALL": "C"}
+            proc = subprocess.Popen(["sh", "-c", sandbox_command(command)], cwd=node.root, env=env,
+                                    stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            threading.Thread(target=self._pump_stdin, args=(channel, proc), daemon=True).start()
+            stderr_pump = threading.Thread(target=self._pump_stderr, args=(channel, proc), daemon=True)
+            stderr_pump.start()
+
+            # The link: every chunk takes as long as it would at bandwidth_mbps
+            bytes_per_second = self.bandwidth_mbps * 1_000_000 / 8 if self.bandwidth_mbps else None
+            while True:
+                chunk = proc.stdout.read1(READ_CHUNK)
+                if not chunk:
+                    break
+                if bytes_per_second:
+                    time.sleep(len(chunk) / bytes_per_second)
+                channel.sendall(chunk)
+            rc = proc.wait()
+            stderr_pump.join()
+            channel.send_exit_status(rc)
+        except (OSError, EOFError, paramiko.SSHException):
+            pass  # the client went away
+        finally:
+            if proc is not None and proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            channel.close()
+
+    @staticmethod
+    def _pump_stdin(channel, proc):
+        try:
+            while True:
+                data = channel.recv(READ_CHUNK)
+                if not data:
+                    break
+                proc.stdin.write(_NODE_PATH_BYTES.sub(b"", data))
+                proc.stdin.flush()
+        except (OSError, EOFError, ValueError):
+            pass
+        finally:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+
+    @staticmethod
+    def _pump_stderr(channel, proc):
+        try:
+            for chunk in iter(lambda: proc.stderr.read1(READ_CHUNK), b""):
+                channel.sendall_stderr(chunk)
+        except (OSError, EOFError, paramiko.SSHException):
+            pass
+
+    def stop(self):
+        self._stop.set()
+        if self._acceptor is not None:
+            self._acceptor.join()
+        for listener in self._listeners:
+            self._selector.unregister(listener)
+            listener.close()
+        self._listeners.clear()
+        with self._lock:
+            transports, self._transports = self._transports, []
+        for transport in transports:
+            transport.close()
+        if self._own_workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --- Inventory side ---
+    def inventory(self):
+        """The fleet as an inventory file (inventory.load_inventory_file format)."""
+        return {"nodes": [node.inventory_entry() for node in self.nodes]}
+
+    def write_inventory(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.inventory(), f, indent=2)
+        return path
+
+
+def parse_failures(items):
+    """['down=0.1', 'hang=0.05'] -> {'down': 0.1, 'hang': 0.05}"""
+    failures = {}
+    for item in items or ():
+        mode, _, share = item.partition("=")
+        if mode not in FAILURE_MODES or not share:
+            raise ValueError(f"Bad --fail '{item}': use MODE=SHARE, MODE one of {', '.join(FAILURE_MODES)}")
+        failures[mode] = float(share)
+    return failures
+
+
+def bench(sizes, command, **fleet_options):
+    """Runs 'command' against fleets of every size. Returns [(nodes, seconds, exit code)]."""
+    rows = []
+    for size in sizes:
+        with FleetSimulator(size, **fleet_options) as fleet:
+            path = fleet.write_inventory(os.path.join(fleet.workdir, "inventory.json"))
+            env = dict(os.environ, INVENTORY_FILE=path, INVENTORY_SELECT="")
+            started = time.monotonic()
+            rc = subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode
+            rows.append((size, time.monotonic() - started, rc))
+            print(f"   {size:>6} nodes  {rows[-1][1]:8.2f}s  rc={rc}", flush=True)
+    return rows
+
+
+def print_bench_report(rows, command):
+    print(f"\n📈 SCALING: {' '.join(command)}")
+    print(f"   {'nodes':>6}  {'wall':>8}  {'per node':>9}  {'vs. first':>9}")
+    base = rows[0][1] / rows[0][0] if rows else 0
+    for size, seconds, rc in rows:
+        per_node = seconds / size
+        ratio = per_node / base if base else 0
+        print(f"   {size:>6}  {seconds:7.2f}s  {per_node * 1000:7.1f}ms  {ratio:8.2f}x" + ("" if rc == 0 else f"  rc={rc}"))
+
+
+if __name__ == "__main__":
+    import argparse
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    parser = argparse.ArgumentParser(description="Simulated fleet of SSH nodes on 127.0.0.1 for load tests")
+    sub = parser.add_subparsers(dest="mode", required=True)
+    serve_parser = sub.add_parser("serve", help="Run a fleet until Ctrl+C and write its inventory file")
+    serve_parser.add_argument("--inventory", default="sim-inventory.json", help="Inventory file to write")
+    bench_parser = sub.add_parser("bench", help="Time a tool against fleets of growing size")
+    bench_parser.add_argument("--sizes", default="10,50,200", help="Comma-separated fleet sizes")
+    bench_parser.add_argument("command", nargs=argparse.REMAINDER, help="-- the command to run, e.g. python scripts/monitor.py")
+    for p in (serve_parser, bench_parser):
+        p.add_argument("--nodes", type=int, default=20, help="Fleet size (serve)")
+        p.add_argument("--seed", type=int, default=0)
+        p.add_argument("--latency-ms", default="0", metavar="MIN[,MAX]", help="Round-trip time per node")
+        p.add_argument("--bandwidth-mbps", type=float, help="Cap on every command's output")
+        p.add_argument("--backup-kb", type=int, default=64, help="Backup data per node")
+        p.add_argument("--fail", action="append", metavar="MODE=SHARE",
+                       help=f"Share of failing nodes, repeatable. Modes: {', '.join(FAILURE_MODES)}")
+    args = parser.parse_args()
+
+    latency = [float(ms) / 1000 for ms in args.latency_ms.split(",")]
+    options = {"seed": args.seed, "latency": (latency[0], latency[-1]), "bandwidth_mbps": args.bandwidth_mbps,
+               "backup_kb": args.backup_kb, "failures": parse_failures(args.fail)}
+
+    if args.mode == "serve":
+        with FleetSimulator(args.nodes, **options) as fleet:
+            fleet.write_inventory(args.inventory)
+            broken = sum(node.failure is not None for node in fleet.nodes)
+            print(f"🧪 {args.nodes} nodes on 127.0.0.1 ({broken} misbehaving), inventory: {args.inventory}")
+            print(f"   INVENTORY_FILE={os.path.abspath(args.inventory)} python scripts/monitor.py")
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                print("\n🛑 Stopped")
+    else:
+        command = args.command[1:] if args.command[:1] == ["--"] else args.command
+        if not command:
+            parser.error("bench needs a command after '--'")
+        rows = bench([int(s) for s in args.sizes.split(",")], command, **options)
+        print_bench_report(rows, command)
@@ -0,0 +1,330 @@
+import os
+import gzip
+import json
+import shlex
+import tarfile
+import hashlib
+import datetime
+import tempfile
+import threading
+
+# ==========================================
+# ♻️ Incremental Backups (Content-Addressed Store)
+# ==========================================
+# /etc/x-ui or /opt/outline barely change from day to day, so instead of a
+# full tar every night we:
+#   1. list the remote files (path, size, mtime, mode, owner) in one exec,
+#   2. compare with the last snapshot of the node: same size+mtime = same file,
+#   3. hash only the changed files on the node,
+#   4. download only the files whose content we do not have yet.
+# Every file is stored once in a local store, named by its sha256 ("object").
+# A snapshot is a small JSON manifest pointing to objects, and can be turned
+# back into a normal .tar.gz at any time with ChunkStore.export().
+# Symlinks have no content: the manifest keeps their target ("link") instead.
+
+# Same exclusions as the full tar in backup.py
+EXCLUDE_DIRS = ("prometheus", "pg_wal")
+HASH_CHUNK_SIZE = 1024 * 1024
+# Paths per stdin write when sending file lists to the node
+FILE_LIST_BATCH = 1000
+
+
+def _read_all(stream):
+    data = stream.read()
+    return data.decode(errors="replace") if isinstance(data, bytes) else data
+
+
+class ChunkStore:
+    """
+    Local content-addressed store:
+      <root>/objects/ab/ab12...ef.gz   - gzip'ed file content, name = sha256 of the raw content
+      <root>/snapshots/<node>/<stamp>.json - manifest of one backup run
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.snapshots_dir = os.path.join(root, "snapshots")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+
+    # --- objects ---
+    def object_path(self, sha):
+        return os.path.join(self.objects_dir, sha[:2], f"{sha}.gz")
+
+    def has(self, sha):
+        return os.path.exists(self.object_path(sha))
+
+    def put_stream(self, fileobj):
+        """Stores a file-like object, returns (sha256, size). Duplicates are stored once."""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.objects_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as gz:
+                while True:
+                    chunk = fileobj.read(HASH_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    gz.write(chunk)
+                    size += len(chunk)
+            sha = digest.hexdigest()
+            target = self.object_path(sha)
+            if os.path.exists(target):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(tmp_path, target)
+            return sha, size
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def open(self, sha):
+        return gzip.open(self.object_path(sha), "rb")
+
+    # --- snapshots ---
+    def save_snapshot(self, node, entries, stamp=None):
+        stamp = stamp or datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        node_dir = os.path.join(self.snapshots_dir, node)
+        os.makedirs(node_dir, exist_ok=True)
+        path = os.path.join(node_dir, f"{stamp}.json")
+        with open(path, "w") as f:
+            json.dump({"node": node, "created": stamp, "files": entries}, f, indent=1, sort_keys=True)
+        return path
+
+    def list_snapshots(self, node):
+        node_dir = os.path.join(self.snapshots_dir, node)
+        if not os.path.isdir(node_dir):
+            return []
+        return sorted(os.path.join(node_dir, n) for n in os.listdir(node_dir) if n.endswith(".json"))
+
+    def load_snapshot(self, path):
+        with open(path) as f:
+            return json.load(f)
+
+    def latest_entries(self, node):
+        """{path: entry} of the newest snapshot, or {} for the first run."""
+        snapshots = self.list_snapshots(node)
+        if not snapshots:
+            return {}
+        return self.load_snapshot(snapshots[-1])["files"]
+
+    def export(self, snapshot_path, out_path):
+        """Rebuilds a normal .tar.gz from a snapshot (same layout as the full backup)."""
+        snapshot = self.load_snapshot(snapshot_path)
+        part_path = out_path + ".part"
+        with tarfile.open(part_path, "w:gz") as tar:
+            for path, entry in sorted(snapshot["files"].items()):
+                info = tarfile.TarInfo(name=path.lstrip("/"))
+                info.mtime = float(entry["mtime"])
+                info.mode = int(entry.get("mode", "644"), 8)
+                # Snapshots taken before owners were recorded restore as root
+                info.uid = int(entry.get("uid", 0))
+                info.gid = int(entry.get("gid", 0))
+                if "link" in entry:
+                    info.type = tarfile.SYMTYPE
+                    info.linkname = entry["link"]
+                    tar.addfile(info)
+                    continue
+                info.size = entry["size"]
+                with self.open(entry["sha256"]) as src:
+                    tar.addfile(info, src)
+        os.replace(part_path, out_path)
+        return out_path
+
+    def gc(self):
+        """Deletes objects that no snapshot points to any more. Returns the number removed."""
+        referenced = set()
+        for node in os.listdir(self.snapshots_dir):
+            for path in self.list_snapshots(node):
+                referenced.update(e["sha256"] for e in self.load_snapshot(path)["files"].values() if "sha256" in e)
+        removed = 0
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                if name[:-len(".gz")] not in referenced:
+                    os.remove(os.path.join(prefix_dir, name))
+                    removed += 1
+        return removed
+
+
+# ==========================================
+# Remote side
+# ==========================================
+def build_manifest_cmd(paths):
+    """
+    find prints 'type<TAB>size<TAB>mtime<TAB>mode<TAB>uid<TAB>gid<TAB>path' NUL 'link target' NUL
+    for every regular file and symlink (NUL-separated: safe for any filename; the target is empty for files).
+    """
+    prune = " -o ".join(f"-name {shlex.quote(d)}" for d in EXCLUDE_DIRS)
+    roots = " ".join(shlex.quote(p) for p in paths)
+    return (f"find {roots} -type d \\( {prune} \\) -prune -o \\( -type f -o -type l \\)"
+            f" -printf '%y\\t%s\\t%T@\\t%m\\t%U\\t%G\\t%p\\0%l\\0'")
+
+
+def remote_manifest(ssh, paths):
+    """
+    Returns {path: {"size", "mtime", "mode", "uid", "gid"}} for every regular file under 'paths';
+    symlinks get "link" (their target) and size 0.
+    """
+    _, stdout, _ = ssh.exec_command(build_manifest_cmd(paths))
+    raw = _read_all(stdout)
+    stdout.channel.recv_exit_status()  # missing paths only print to stderr, partial lists are fine
+
+    manifest = {}
+    fields = raw.split("\0")
+    for record, target in zip(fields[0::2], fields[1::2]):
+        kind, size, mtime, mode, uid, gid, path = record.split("\t", 6)
+        entry = {"size": int(size), "mtime": mtime, "mode": mode, "uid": int(uid), "gid": int(gid)}
+        if kind == "l":
+            entry.update(size=0, link=target)
+        manifest[path] = entry
+    return manifest
+
+
+def _send_file_list(ssh, cmd, files):
+    """
+    Runs 'cmd' with the NUL-separated file list on its stdin. The list is written
+    by a thread: sha256sum and tar answer while they still read it, and with tens
+    of thousands of paths writing everything first fills the SSH window and the
+    pipes on both sides. Returns (stdout, stderr, feeder); join the feeder after
+    reading stdout.
+    """
+    stdin, stdout, stderr = ssh.exec_command(cmd)
+
+    def feed():
+        try:
+            for start in range(0, len(files), FILE_LIST_BATCH):
+                stdin.write("".join(f"{p}\0" for p in files[start:start + FILE_LIST_BATCH]))
+            stdin.flush()
+            stdin.channel.shutdown_write()
+        except (OSError, ValueError):
+            pass  # the command ended early; its exit status tells why
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    return stdout, stderr, feeder
+
+
+def remote_hashes(ssh, files):
+    """sha256 of the given remote files, computed on the node in one exec."""
+    if not files:
+        return {}
+    stdout, _, feeder = _send_file_list(ssh, "xargs -0 -r sha256sum --", files)
+    hashes = {}
+    for line in _read_all(stdout).splitlines():
+        sha, _, path = line.partition("  ")
+        if path and not sha.startswith("\\"):  # skip escaped names (newline in filename)
+            hashes[path] = sha
+    feeder.join()
+    stdout.channel.recv_exit_status()
+    return hashes
+
+
+class _MeteredReader:
+    """File wrapper: counts the downloaded bytes and applies the backup rate limiters."""
+
+    def __init__(self, fileobj, limiters=()):
+        self.fileobj = fileobj
+        self.limiters = [l for l in limiters if l is not None]
+        self.bytes = 0
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.bytes += len(data)
+        for limiter in self.limiters:
+            limiter.consume(len(data))
+        return data
+
+
+def _tar_errors(stderr_text, files):
+    """{path: reason} from GNU tar messages such as 'tar: /etc/x/y: Cannot stat: No such file or directory'."""
+    wanted = set(files)
+    errors = {}
+    for line in stderr_text.splitlines():
+        if not line.startswith("tar: "):
+            continue
+        message = line[len("tar: "):]
+        # Paths may contain ': ' themselves: try every split point
+        position = message.find(": ")
+        while position != -1:
+            if message[:position] in wanted:
+                errors[message[:position]] = message[position + 2:]
+                break
+            position = message.find(": ", position + 2)
+    return errors
+
+
+def fetch_files(ssh, files, store, limiters=()):
+    """
+    Streams only the listed files (tar over SSH, no temp file on the node)
+    straight into the store. Returns ({path: (sha256, size)}, bytes_on_the_wire,
+    {path: reason} of the files tar could not send).
+    """
+    if not files:
+        return {}, 0, {}
+    stdout, stderr, feeder = _send_file_list(ssh, "tar --null -T - -czf -", files)
+    reader = _MeteredReader(stdout, limiters)
+
+    fetched = {}
+    with tarfile.open(fileobj=reader, mode="r|gz") as tar:
+        for member in tar:
+            if member.isfile():
+                fetched["/" + member.name] = store.put_stream(tar.extractfile(member))
+    feeder.join()
+    errors = _tar_errors(_read_all(stderr), files)
+    status = stdout.channel.recv_exit_status()
+    # 1 = a file changed while tar read it, 2 = some files could not be read (named on stderr)
+    fallback = f"tar exited with status {status}" if status else "not in the tar stream"
+    failed = {path: errors.get(path, fallback) for path in files if path not in fetched}
+    return fetched, reader.bytes, failed
+
+
+def incremental_backup(ssh, node, paths, store, limiters=()):
+    """
+    Runs one incremental backup over an open SSH client and saves the snapshot.
+    Transfer volume depends on what changed since the last snapshot, not on total size.
+    """
+    previous = store.latest_entries(node)
+    current = remote_manifest(ssh, paths)
+
+    entries = {}
+    changed = []
+    for path, meta in current.items():
+        if "link" in meta:
+            entries[path] = meta  # nothing to download: the target is in the manifest
+            continue
+        old = previous.get(path)
+        if old and "sha256" in old and old["size"] == meta["size"] and old["mtime"] == meta["mtime"] and store.has(old["sha256"]):
+            entries[path] = dict(meta, sha256=old["sha256"])
+        else:
+            changed.append(path)
+
+    # Content we already have (touched but not modified, or moved) is not downloaded
+    hashes = remote_hashes(ssh, changed)
+    to_fetch = []
+    for path in changed:
+        sha = hashes.get(path)
+        if sha and store.has(sha):
+            entries[path] = dict(current[path], sha256=sha)
+        else:
+            to_fetch.append(path)
+
+    fetched, wire_bytes, missing = fetch_files(ssh, to_fetch, store, limiters)
+    for path, (sha, size) in fetched.items():
+        if path in current:
+            entries[path] = dict(current[path], sha256=sha, size=size)
+
+    snapshot = store.save_snapshot(node, entries)
+    return {
+        "snapshot": snapshot,
+        "files": len(entries),
+        "changed": len(changed),
+        "downloaded": len(fetched),
+        "missing": missing,  # {path: reason}: vanished or unreadable, not in the snapshot
+        "bytes": wire_bytes,
+    }
@@ -0,0 +1,252 @@
+import os
+import sys
+import json
+import time
+import shlex
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.tracing import span
+
+# ==========================================
+# 🕸️ iperf3 Bandwidth Mesh
+# ==========================================
+# Measures every node pair in both directions with iperf3 (installed by
+# install_tools.py):
+#   - TCP run: throughput and retransmits,
+#   - short UDP run at a fixed bitrate: jitter and datagram loss.
+# A node takes part in ONE test at a time (as client or server), otherwise
+# two tests share its uplink and both results are wrong. Disjoint pairs
+# (A-B and C-D) still run in parallel, so 4 nodes need 3 rounds, not 6.
+# One pair job runs A->B and then B->A (-R) against the same iperf3 server.
+
+IPERF_PORT = 5201
+TCP_SECONDS = 5
+UDP_SECONDS = 3
+# UDP bitrate for the jitter run: low enough to not measure congestion
+UDP_BITRATE = "10M"
+CLIENT_TIMEOUT_MARGIN = 15
+CONNECT_ATTEMPTS = 3
+RETRY_DELAY = 1.0
+
+
+class LocalShell:
+    """Runs the node commands on this machine (loopback mesh, tests)."""
+
+    def run(self, node, cmd, timeout=None):
+        proc = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=timeout)
+        return proc.returncode, proc.stdout, proc.stderr
+
+
+class SSHShell:
+    """Runs the node commands over the pooled SSH transports (SSHPool with registered nodes)."""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def run(self, node, cmd, timeout=None):
+        client = self.pool.get(node)
+        with span("exec", node, cmd=cmd[:80]):
+            _, stdout, stderr = client.exec_command(cmd, timeout=timeout)
+            rc = stdout.channel.recv_exit_status()
+            return rc, stdout.read().decode(errors="replace"), stderr.read().decode(errors="replace")
+
+
+def round_robin_pairs(names):
+    """
+    All unordered pairs, ordered round by round (circle method): every round is
+    a set of disjoint pairs, so the greedy scheduler below fills whole rounds.
+    """
+    players = list(names) + ([None] if len(names) % 2 else [])
+    pairs = []
+    for _ in range(len(players) - 1):
+        half = len(players) // 2
+        for a, b in zip(players[:half], reversed(players[half:])):
+            if a is not None and b is not None:
+                pairs.append((a, b))
+        # Keep the first player in place, rotate the others
+        players = [players[0], players[-1]] + players[1:-1]
+    return pairs
+
+
+def schedule(pairs, run_pair, workers=None):
+    """
+    Runs run_pair(a, b) for every pair so that no node is in two running jobs.
+    Whenever a job ends, every pending pair with two free nodes is started.
+    Returns [(pair, result)] in completion order.
+    """
+    pending = list(pairs)
+    busy = set()
+    running = {}
+    results = []
+    nodes = {n for pair in pairs for n in pair}
+    workers = workers or max(1, len(nodes) // 2)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            for pair in list(pending):
+                if len(running) >= workers:
+                    break
+                if busy.isdisjoint(pair):
+                    busy.update(pair)
+                    pending.remove(pair)
+                    running[pool.submit(run_pair, *pair)] = pair
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                pair = running.pop(future)
+                busy.difference_update(pair)
+                results.append((pair, future.result()))
+    return results
+
+
+def parse_iperf_json(raw, udp=False):
+    """Extracts the numbers we need from 'iperf3 -J' output."""
+    data = json.loads(raw)
+    if data.get("error"):
+        raise RuntimeError(data["error"])
+    end = data["end"]
+    if udp:
+        summary = end["sum"]
+        return {"udp_mbps": summary["bits_per_second"] / 1e6,
+                "jitter_ms": summary["jitter_ms"],
+                "loss": summary["lost_percent"] / 100}
+    received = end["sum_received"]
+    return {"mbps": received["bits_per_second"] / 1e6,
+            "retransmits": end.get("sum_sent", {}).get("retransmits")}
+
+
+class IperfMesh:
+    """
+    nodes: [(name, ip)]; ports: {name: iperf3 server port} (default IPERF_PORT for all).
+    Several "nodes" may share one host (loopback) as long as their ports differ.
+    """
+
+    def __init__(self, nodes, shell, ports=None, tcp_seconds=TCP_SECONDS, udp_seconds=UDP_SECONDS,
+                 udp_bitrate=UDP_BITRATE, workers=None):
+        self.ips = dict(nodes)
+        self.names = [name for name, _ in nodes]
+        self.shell = shell
+        self.ports = {name: (ports or {}).get(name, IPERF_PORT) for name in self.names}
+        self.tcp_seconds = tcp_seconds
+        self.udp_seconds = udp_seconds
+        self.udp_bitrate = udp_bitrate
+        self.workers = workers
+
+    def _pidfile(self, name):
+        return f"/tmp/vpnqa-iperf3-{self.ports[name]}.pid"
+
+    def start_servers(self):
+        for name in self.names:
+            cmd = f"iperf3 -s -D -p {self.ports[name]} --pidfile {self._pidfile(name)}"
+            rc, _, err = self.shell.run(name, cmd, timeout=15)
+            if rc != 0:
+                raise RuntimeError(f"iperf3 server did not start on {name}: {err.strip()}")
+
+    def stop_servers(self):
+        for name in self.names:
+            pidfile = self._pidfile(name)
+            try:
+                self.shell.run(name, f"test -f {pidfile} && kill $(cat {pidfile}); rm -f {pidfile}", timeout=15)
+            except Exception:
+                pass
+
+    def measure(self, src, dst, reverse=False):
+        """
+        One direction. The client always runs on 'src' and talks to the server on 'dst';
+        reverse=True makes dst send (iperf3 -R), so both directions need one server.
+        """
+        sender, receiver = (dst, src) if reverse else (src, dst)
+        result = {"src": sender, "dst": receiver, "mbps": None, "retransmits": None,
+                  "udp_mbps": None, "jitter_ms": None, "loss": None, "error": None}
+        base = f"iperf3 -c {shlex.quote(self.ips[dst])} -p {self.ports[dst]} -J" + (" -R" if reverse else "")
+        runs = [(f"{base} -t {self.tcp_seconds}", False, self.tcp_seconds)]
+        if self.udp_seconds:
+            runs.append((f"{base} -u -b {self.udp_bitrate} -t {self.udp_seconds}", True, self.udp_seconds))
+        for cmd, udp, seconds in runs:
+            error = self._client(src, cmd, udp, seconds, result)
+            if error:
+                result["error"] = error
+                break
+        return result
+
+    def _client(self, src, cmd, udp, seconds, result):
+        """Runs one client test and fills 'result'. Returns an error text or None."""
+        error = None
+        for _ in range(CONNECT_ATTEMPTS):
+            out = err = ""
+            try:
+                _, out, err = self.shell.run(src, cmd, timeout=seconds + CLIENT_TIMEOUT_MARGIN)
+                result.update(parse_iperf_json(out, udp=udp))
+                return None
+            except (ValueError, KeyError):
+                error = (err or out).strip()[:200] or "no iperf3 output"
+            except Exception as e:
+                error = str(e)
+            # A freshly daemonized server may not listen yet: only this is worth a retry
+            if "unable to connect" not in error:
+                return error
+            time.sleep(RETRY_DELAY)
+        return error
+
+    def run_pair(self, a, b):
+        return [self.measure(a, b), self.measure(a, b, reverse=True)]
+
+    def run(self):
+        """Returns one result per ordered pair (src, dst)."""
+        try:
+            self.start_servers()
+            done = schedule(round_robin_pairs(self.names), self.run_pair, self.workers)
+        finally:
+            self.stop_servers()
+        return [direction for _, pair_results in done for direction in pair_results]
+
+
+def format_matrix(results, names, key="mbps", fmt="{:.0f}"):
+    """Text matrix: rows = sender, columns = receiver."""
+    cells = {(r["src"], r["dst"]): r for r in results}
+    width = max([len(n) for n in names] + [8])
+    lines = [" " * width + " │ " + " ".join(f"{n:>{width}}" for n in names)]
+    lines.append("─" * width + "─┼─" + "─".join("─" * width for _ in names))
+    for src in names:
+        row = []
+        for dst in names:
+            r = cells.get((src, dst))
+            if src == dst:
+                row.append(f"{'—':>{width}}")
+            elif r is None or r["error"] or r[key] is None:
+                row.append(f"{'ERR':>{width}}")
+            else:
+                row.append(f"{fmt.format(r[key]):>{width}}")
+        lines.append(f"{src:<{width}} │ " + " ".join(row))
+    return "\n".join(lines)
+
+
+def format_report(results, names):
+    sections = [("Throughput TCP, Mbit/s (row sends to column)", "mbps", "{:.0f}"),
+                ("Jitter UDP, ms", "jitter_ms", "{:.2f}"),
+                ("Loss UDP", "loss", "{:.1%}")]
+    parts = [f"{title}\n{format_matrix(results, names, key, fmt)}" for title, key, fmt in sections]
+    errors = [f"{r['src']} -> {r['dst']}: {r['error']}" for r in results if r["error"]]
+    if errors:
+        parts.append("Errors\n" + "\n".join(errors))
+    return "\n\n".join(parts)
+
+
+if __name__ == "__main__":
+    import argparse
+    from inventory import select
+    from scripts.ssh_pool import SSHPool
+
+    parser = argparse.ArgumentParser(description="Node-to-node iperf3 bandwidth matrix")
+    parser.add_argument("--select", default="", metavar="SELECTOR",
+                        help="Only nodes matching a selector, e.g. zone=RU or service=outline (see inventory.py)")
+    servers = select(parser.parse_args().select)
+
+    with SSHPool() as pool:
+        pool.register_nodes(servers)
+        names = [s[0] for s in servers]
+        print(f"🕸️ iperf3 mesh: {len(names)} nodes, {len(names) * (len(names) - 1)} directions")
+        started = time.monotonic()
+        mesh_results = IperfMesh([(s[0], s[1]) for s in servers], SSHShell(pool)).run()
+        print(format_report(mesh_results, names))
+        print(f"\n⏱️ {time.monotonic() - started:.0f}s")
@@ -1,11 +1,11 @@
 import sys
 import os
 import time
-import socket
-import platform
+import argparse
 import warnings
 import logging
 import paramiko
+from concurrent.futures import ThreadPoolExecutor
 
 # --- 1. SILENCE THE NOISE ---
 warnings.filterwarnings("ignore", category=DeprecationWarning)
@@ -14,122 +14,347 @@ logging.getLogger("paramiko").setLevel(logging.CRITICAL)
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 try:
-    from inventory import SERVERS
+    from inventory import SERVERS, SERVICE_PORTS, default_service_ports, select
 except ImportError:
     print("❌ Critical Error: Could not import 'inventory.py'.")
     sys.exit(1)
 
+from scripts.remote_probe import build_probe_command, parse_probe_output, ProbeError
+from scripts.reachability import probe_many
+from scripts.service_probe import probe_services, describe
+from scripts.tsdb import TimeSeriesStore, TSDBSink, flatten_result, DEFAULT_DB
+from scripts.exporter import EXPORTER_HOST, EXPORTER_PORT
+from scripts.tracing import TracedSSHClient, span, enable_tracing, finish_tracing
+
 THRESHOLDS = {
     "disk_min_percent": 15,
     "mem_max_percent": 90,
 }
 
-
-def print_check(label, value, status="ok"):
-    icon = "✅ " if status == "ok" else "⚠️ " if status == "warn" else "❌ "
-    print(f"  ├── {icon} {label:<15}: {value}")
+# --- 2. CONCURRENT SCAN SETTINGS ---
+# How many nodes are scanned at the same time (1 = old sequential behaviour).
+DEFAULT_WORKERS = 16
+# Hard budget for one node: port + SSH must fit into it,
+# so a black-holed server cannot stall the whole report.
+NODE_TIMEOUT = 30
+# Echoes per node in the reachability phase (all nodes are pinged at once)
+PING_COUNT = 3
 
 
-def check_ping(ip):
-    system_os = platform.system().lower()
-    flag = "-n 1 -w 1000" if system_os == "windows" else "-c 1 -W 1"
-    null_dev = "NUL" if system_os == "windows" else "/dev/null"
-    return os.system(f"ping {flag} {ip} > {null_dev} 2>&1") == 0
+def format_check(label, value, status="ok"):
+    icon = "✅ " if status == "ok" else "⚠️ " if status == "warn" else "❌ "
+    return f"  ├── {icon} {label:<15}: {value}"
 
 
-def check_port(ip, port):
-    """Checks if a specific port (like 443) is open and accepting connections."""
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.settimeout(2.0)
-    result = sock.connect_ex((ip, port))
-    sock.close()
-    return result == 0
+def print_check(label, value, status="ok"):
+    print(format_check(label, value, status))
 
 
-def check_remote_details(ip, user, password, backup_paths):
-    client = paramiko.SSHClient()
+def check_remote_details(ip, user, password, backup_paths, timeout=15, port=22, node=None, deadline=None):
+    """
+    Connects and runs the metrics probe. 'deadline' (time.monotonic()) caps the whole
+    call: the probe only gets what the connect left of it.
+    """
+    client = TracedSSHClient()
+    client.trace_node = node
     client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
     try:
-        # We use a 15s timeout to help with unstable home connections
-        client.connect(ip, username=user, password=password, timeout=15)
+        # We use a 15s timeout to help with unstable home connections.
+        # Banner/auth waits share the same budget, so the node deadline holds.
+        client.connect(ip, port=port, username=user, password=password, timeout=timeout,
+                       banner_timeout=timeout, auth_timeout=timeout)
     except Exception as e:
         return {"error": str(e)}
 
-    data = {}
     try:
-        _, stdout, _ = client.exec_command("df -h / | tail -1 | awk '{print $5}'")
-        used_str = stdout.read().decode().strip().replace('%', '')
-        data['disk_used'] = int(used_str) if used_str.isdigit() else 0
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                return {"error": "node deadline reached before the probe"}
+        return collect_node_metrics(client, backup_paths, timeout=timeout)
+    finally:
+        client.close()
 
-        _, stdout, _ = client.exec_command("free | grep Mem | awk '{print $3/$2 * 100.0}'")
-        res = stdout.read().decode().strip()
-        data['mem_used'] = float(res) if res else 0.0
 
-        _, stdout, _ = client.exec_command("docker ps --format '{{.Names}}'")
-        running_containers = stdout.read().decode().splitlines()
+def expected_units(backup_paths):
+    """Systemd units worth asking about, guessed from what we back up on the node."""
+    paths_str = "".join(backup_paths).lower() if backup_paths else ""
+    return ["x-ui"] if "x-ui" in paths_str else []
 
-        services_report = []
-        paths_str = "".join(backup_paths).lower() if backup_paths else ""
 
-        if "x-ui" in paths_str:
-            _, stdout, _ = client.exec_command("systemctl is-active x-ui")
-            services_report.append(("Service: X-UI", stdout.read().decode().strip() == "active"))
+def services_from_probe(probe, backup_paths):
+    """Maps the probe result to the (label, is_up) rows printed in the report."""
+    services_report = []
+    paths_str = "".join(backup_paths).lower() if backup_paths else ""
+    # None means docker is missing on the node: the containers are DOWN for us
+    running_containers = probe["containers"] or []
 
-        if "outline" in paths_str:
-            services_report.append(("Docker: Outline", "shadowbox" in running_containers))
+    if "x-ui" in paths_str:
+        services_report.append(("Service: X-UI", probe["services"].get("x-ui") == "active"))
 
-        if "remnawave" in paths_str:
-            services_report.append(("Docker: Remna", any("remnawave" in n for n in running_containers)))
+    if "outline" in paths_str:
+        services_report.append(("Docker: Outline", "shadowbox" in running_containers))
 
-        data['services'] = services_report
-    except:
-        data['error'] = "Data parsing error"
-    finally:
-        client.close()
+    if "remnawave" in paths_str:
+        services_report.append(("Docker: Remna", any("remnawave" in n for n in running_containers)))
+
+    return services_report
+
+
+def collect_node_metrics(client, backup_paths, timeout=15):
+    """
+    Collects all metrics over an already connected SSH client.
+    One exec channel = one round trip, no matter how many services we check.
+    """
+    data = {}
+    try:
+        with span("exec", getattr(client, "trace_node", None), cmd="probe"):
+            _, stdout, _ = client.exec_command(build_probe_command(expected_units(backup_paths)), timeout=timeout)
+            probe = parse_probe_output(stdout.read())
+
+        data['disk_used'] = probe['disk_used'] if probe['disk_used'] is not None else 0
+        data['mem_used'] = probe['mem_used'] if probe['mem_used'] is not None else 0.0
+        data['load1'] = probe['load1']
+        data['containers'] = probe['containers']
+        data['services'] = services_from_probe(probe, backup_paths)
+    except ProbeError as e:
+        data['error'] = f"Data parsing error: {e}"
+    except Exception as e:
+        data['error'] = f"Probe failed: {e}"
     return data
 
 
-def run_monitor():
-    print(f"\n🔎  INFRASTRUCTURE HEALTH MONITOR")
-    print(f"📅  {time.strftime('%Y-%m-%d %H:%M:%S')}")
-    print("=" * 60)
+def ping_check(reachability):
+    """(label, value, status) row for the prober stats of one node."""
+    if reachability["received"]:
+        loss = reachability["loss"] * 100
+        return ("PING", f"Reachable ({reachability['avg']:.1f} ms, {loss:.0f}% loss, {reachability['method']})",
+                "ok" if loss == 0 else "warn")
+    return ("PING", "Unreachable", "fail")
 
-    for node in SERVERS:
-        name, ip, user, password, backup_paths = node
-        print(f"\n🖥️  {name} [{ip}]")
 
-        # 1. Network: Ping
-        if check_ping(ip):
-            print_check("PING", "Reachable", "ok")
-        else:
-            print_check("PING", "Unreachable", "fail")
-            continue
+def port_checks(services):
+    rows = []
+    for result in services:
+        value, status = describe(result)
+        rows.append((f"PORT {result['port']}", f"{result['name']}: {value}", status))
+    return rows
 
-        # 2. Network: Port 443 (Restored!)
-        if check_port(ip, 443):
-            print_check("PORT 443", "Open (HTTPS/VPN)", "ok")
-        else:
-            print_check("PORT 443", "Closed/Filtered", "fail")
 
-        # 3. Deep System Metrics
-        details = check_remote_details(ip, user, password, backup_paths)
-        if "error" in details:
-            print_check("SSH", f"Connection Failed: {details['error']}", "fail")
-            continue
+def metric_checks(details):
+    """Report rows for the remote metrics (disk, RAM, load, services) against THRESHOLDS."""
+    if "error" in details:
+        return [("SSH", f"Connection Failed: {details['error']}", "fail")]
+
+    rows = []
+    d_status = "fail" if details['disk_used'] > (100 - THRESHOLDS["disk_min_percent"]) else "ok"
+    rows.append(("DISK", f"{details['disk_used']}% Used", d_status))
 
-        d_status = "fail" if details['disk_used'] > (100 - THRESHOLDS["disk_min_percent"]) else "ok"
-        print_check("DISK", f"{details['disk_used']}% Used", d_status)
+    m_status = "warn" if details['mem_used'] > THRESHOLDS["mem_max_percent"] else "ok"
+    rows.append(("RAM", f"{int(details['mem_used'])}% Used", m_status))
 
-        m_status = "warn" if details['mem_used'] > THRESHOLDS["mem_max_percent"] else "ok"
-        print_check("RAM", f"{int(details['mem_used'])}% Used", m_status)
+    if details.get('load1') is not None:
+        rows.append(("LOAD", f"{details['load1']:.2f} (1 min)", "ok"))
 
-        for svc_name, is_up in details.get('services', []):
-            print_check(svc_name.upper(), "Active" if is_up else "DOWN", "ok" if is_up else "fail")
+    for svc_name, is_up in details.get('services', []):
+        rows.append((svc_name.upper(), "Active" if is_up else "DOWN", "ok" if is_up else "fail"))
+    return rows
 
+
+def node_ports(name):
+    """Service ports of a node: NODE_X_PORTS from .env, or its SSH port plus the ports of its services."""
+    return SERVICE_PORTS.get(name) or default_service_ports()
+
+
+def scan_node(node, node_timeout=NODE_TIMEOUT, reachability=None, services=None):
+    """
+    Runs all checks for one node and returns the report instead of printing it.
+    Every step gets only the time left until the node deadline.
+    'reachability' and 'services' are the prober results of this node
+    (probed in advance for the whole fleet); None = probe this node now.
+    """
+    with span("node", node[0], task="scan"):
+        return _scan_node(node, node_timeout, reachability, services)
+
+
+def _scan_node(node, node_timeout, reachability, services):
+    name, ip, user, password, backup_paths = node
+    started = time.monotonic()
+    deadline = started + node_timeout
+    report = {"name": name, "ip": ip, "checks": []}
+
+    def add(label, value, status="ok"):
+        report["checks"].append((label, value, status))
+
+    def time_left():
+        return deadline - time.monotonic()
+
+    def finish():
+        report["elapsed"] = time.monotonic() - started
+        return report
+
+    # 1. Network: Ping
+    if reachability is None:
+        reachability = probe_many([ip], count=1)[ip]
+    report["reachability"] = reachability
+    add(*ping_check(reachability))
+    if not reachability["received"]:
+        return finish()
+
+    # 2. Network: service ports (SSH, VLESS/Reality, Shadowsocks, panels)
+    if services is None:
+        services = probe_services({name: (ip, node_ports(name))})[name]
+    report["services"] = services
+    for row in port_checks(services):
+        add(*row)
+
+    # 3. Deep System Metrics
+    if time_left() <= 0:
+        add("DEADLINE", f"Node budget of {node_timeout}s exceeded", "fail")
+        return finish()
+
+    details = check_remote_details(ip, user, password, backup_paths, timeout=min(15, time_left()),
+                                   port=getattr(node, "ssh_port", 22), node=name, deadline=deadline)
+    report["details"] = details
+    for row in metric_checks(details):
+        add(*row)
+
+    return finish()
+
+
+def print_node_report(report):
+    print(f"\n🖥️  {report['name']} [{report['ip']}]")
+    for label, value, status in report["checks"]:
+        print_check(label, value, status)
+
+
+def print_timing_summary(reports, total):
+    print("\n⏱️  SCAN TIME")
+    for report in reports:
+        print(f"  ├── {report['name']:<18}: {report['elapsed']:.2f}s")
+    node_sum = sum(r["elapsed"] for r in reports)
+    print(f"  └── {'TOTAL (wall)':<18}: {total:.2f}s (sum of nodes: {node_sum:.2f}s)")
+
+
+def record_report(store, report, timestamp=None):
+    """Saves the raw results of one node scan into the time-series store."""
+    timestamp = timestamp if timestamp is not None else time.time()
+    for kind, key in (("reachability", "reachability"), ("ports", "services"), ("metrics", "details")):
+        if key in report:
+            for metric, value in flatten_result(kind, report[key]):
+                store.append(report["name"], metric, value, timestamp)
+
+
+def run_monitor(servers=None, workers=DEFAULT_WORKERS, node_timeout=NODE_TIMEOUT, store=None):
+    """
+    Scans the fleet concurrently, but prints the report in inventory order.
+    Total time is close to the slowest node instead of the sum of all nodes.
+    With a 'store' (TimeSeriesStore) every measured value is kept for later queries.
+    """
+    servers = SERVERS if servers is None else servers
+    print(f"\n🔎  INFRASTRUCTURE HEALTH MONITOR")
+    print(f"📅  {time.strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 60)
+
+    started = time.monotonic()
+    reports = []
+    # One event loop pings the whole fleet and one probes all service ports,
+    # then the deep SSH checks run in threads
+    reachability = probe_many([node[1] for node in servers], count=PING_COUNT)
+    services = probe_services({node[0]: (node[1], node_ports(node[0])) for node in servers})
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(scan_node, node, node_timeout, reachability[node[1]], services[node[0]])
+                   for node in servers]
+        # Results are consumed in submission order, so output stays stable
+        for node, future in zip(servers, futures):
+            try:
+                report = future.result()
+            except Exception as e:
+                report = {"name": node[0], "ip": node[1], "elapsed": 0.0,
+                          "checks": [("SCAN", f"Internal error: {e}", "fail")]}
+            print_node_report(report)
+            reports.append(report)
+            if store is not None:
+                record_report(store, report)
+
+    total = time.monotonic() - started
     print("\n" + "=" * 60)
-    print("✅ Scan Complete\n")
+    print_timing_summary(reports, total)
+    print("\n✅ Scan Complete\n")
+    return reports
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Infrastructure health monitor")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="How many nodes to scan at once (1 = sequential)")
+    parser.add_argument("--node-timeout", type=float, default=NODE_TIMEOUT,
+                        help="Time budget for a single node in seconds")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Keep running: persistent SSH sessions and per-check intervals")
+    parser.add_argument("--interval", action="append", default=[], metavar="CHECK=SECONDS",
+                        help="Daemon interval override, e.g. --interval metrics=120 (reachability, ports, metrics)")
+    parser.add_argument("--exporter", action="store_true",
+                        help="Daemon mode that serves OpenMetrics on --listen instead of printing")
+    parser.add_argument("--listen", default=f"{EXPORTER_HOST}:{EXPORTER_PORT}", metavar="HOST:PORT",
+                        help="Address of the /metrics endpoint in exporter mode")
+    parser.add_argument("--db", default=DEFAULT_DB or None, metavar="PATH",
+                        help="Keep every measurement in this SQLite time-series file (env: MONITOR_DB)")
+    parser.add_argument("--select", default="", metavar="SELECTOR",
+                        help="Only nodes matching a selector, e.g. zone=RU or service=outline (see inventory.py)")
+    parser.add_argument("--trace", metavar="FILE", default=os.getenv("TRACE_FILE"),
+                        help="Time every phase (connect, auth, exec) and write a Chrome trace (env: TRACE_FILE)")
+    parser.add_argument("--alerts", action="store_true",
+                        help="Send status changes to Telegram as digests (TG_BOT_TOKEN, TG_CHAT_ID)")
+    parser.add_argument("--alert-state", metavar="FILE", default=os.getenv("ALERT_STATE_FILE") or None,
+                        help="Remember the last statuses between runs, so cron runs alert on changes only")
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    run_monitor()
\ No newline at end of file
+    args = parse_args()
+    servers = select(args.select)
+    trace_file = enable_tracing(args.trace)
+    store = TimeSeriesStore(args.db) if args.db else None
+    alert_sink = None
+    if args.alerts:
+        from scripts.alerts import AlertDispatcher, AlertSink
+        dispatcher = AlertDispatcher.from_env()
+        if dispatcher is None:
+            print("❌ Error: --alerts needs TG_BOT_TOKEN and TG_CHAT_ID in .env")
+            sys.exit(1)
+        alert_sink = AlertSink(dispatcher, args.alert_state)
+    try:
+        if args.daemon or args.exporter:
+            from scripts.monitor_daemon import MonitorDaemon, ConsoleSink
+            from scripts.exporter import OpenMetricsExporter, serve
+            exporter = OpenMetricsExporter() if args.exporter else None
+            sinks = [exporter or ConsoleSink()] + ([TSDBSink(store)] if store else [])
+            sinks += [alert_sink] if alert_sink else []
+            try:
+                intervals = {k: float(v) for k, _, v in (item.partition("=") for item in args.interval)}
+                daemon = MonitorDaemon(servers, intervals=intervals, workers=args.workers, sinks=sinks)
+            except ValueError as e:
+                print(f"❌ Error: --interval: {e}")
+                sys.exit(1)
+            try:
+                if exporter:
+                    host, _, port = args.listen.rpartition(":")
+                    serve(daemon, exporter, host or EXPORTER_HOST, int(port))
+                else:
+                    daemon.run_forever()
+            except KeyboardInterrupt:
+                print("\n👋 Monitor daemon stopped")
+        else:
+            reports = run_monitor(servers, workers=args.workers, node_timeout=args.node_timeout, store=store)
+            finish_tracing(trace_file, {node.name: node.zone for node in servers})
+            if alert_sink:
+                for report in reports:
+                    alert_sink.handle(report["name"], "scan", report, report["checks"], time.time())
+    finally:
+        if alert_sink:
+            # Sends the pending digest before exit
+            alert_sink.dispatcher.close()
+        if store is not None:
+            store.close()
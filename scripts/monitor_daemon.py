@@ -0,0 +1,226 @@
+import time
+import heapq
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts import monitor
+from scripts.ssh_pool import SSHPool
+
+# ==========================================
+# 🔁 Monitor Daemon
+# ==========================================
+# Long-running mode of monitor.py: no interpreter start, no imports and
+# no SSH handshake per run. Every node keeps ONE pooled SSH transport and
+# each check kind runs on its own interval:
+#   reachability - fast, all due nodes in one prober pass
+#   ports        - service ports + TLS timing, all due nodes in one pass
+#   metrics      - disk/RAM/load/services, one exec channel on the open transport
+# Every next run is moved by a random jitter so 200 nodes do not all fire
+# in the same second, and a node that dropped is retried with backoff.
+
+CHECK_INTERVALS = {
+    "reachability": 30,
+    "ports": 60,
+    "metrics": 300,
+}
+# +-10% random shift of every interval
+JITTER = 0.1
+# Prober checks (reachability, ports) cost the same for 1 or 200 nodes, so
+# nodes due within this part of the interval are pulled into the same pass.
+# Jitter still spreads the SSH metrics checks.
+BATCHED_KINDS = ("reachability", "ports")
+# Failed metrics check: retry after 5s, 10s, 20s ... up to 10 min
+BACKOFF_BASE = 5
+BACKOFF_MAX = 600
+
+
+class ConsoleSink:
+    """Prints a line when a check of a node changes its status (not on every cycle)."""
+
+    def __init__(self):
+        self.last = {}
+
+    def handle(self, node, kind, result, rows, timestamp):
+        status = worst_status(rows)
+        if self.last.get((node, kind)) == status:
+            return
+        self.last[(node, kind)] = status
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+        print(f"[{stamp}] 🖥️  {node} · {kind}")
+        for row in rows:
+            monitor.print_check(*row)
+
+
+def worst_status(rows):
+    statuses = {status for _, _, status in rows}
+    return "fail" if "fail" in statuses else "warn" if "warn" in statuses else "ok"
+
+
+class MonitorDaemon:
+    """
+    Scheduler for periodic checks. 'sinks' get every result:
+    sink.handle(node_name, kind, result, report_rows, unix_timestamp).
+    Sinks with a 'handle_collection(kind, duration_seconds, errors)' method also
+    get the cost of every collection pass (one prober pass or one SSH metrics check).
+    """
+
+    def __init__(self, servers, intervals=None, jitter=JITTER, workers=monitor.DEFAULT_WORKERS,
+                 pool=None, sinks=None):
+        unknown = set(intervals or ()) - set(CHECK_INTERVALS)
+        if unknown:
+            raise ValueError(f"Unknown check kind(s): {', '.join(sorted(unknown))}"
+                             f" (use {', '.join(CHECK_INTERVALS)})")
+        self.servers = {node[0]: node for node in servers}
+        self.intervals = dict(CHECK_INTERVALS, **(intervals or {}))
+        self.jitter = jitter
+        self.pool = pool or SSHPool()
+        self.sinks = list(sinks) if sinks is not None else [ConsoleSink()]
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        self.failures = {}        # node -> consecutive metrics failures
+        self.in_flight = set()    # nodes with a metrics check running right now
+        self.state = {name: {} for name in self.servers}  # node -> kind -> (timestamp, result)
+        self.stop_event = threading.Event()
+        self._queue = []
+        self._lock = threading.Lock()
+
+        now = time.monotonic()
+        for name in self.servers:
+            for kind, interval in self.intervals.items():
+                # First run is spread over a part of the interval as well
+                self._schedule(name, kind, now + random.uniform(0, interval * self.jitter))
+
+    def _schedule(self, name, kind, due):
+        with self._lock:
+            heapq.heappush(self._queue, (due, kind, name))
+
+    def _next_due(self, kind, failures=0):
+        if failures:
+            return time.monotonic() + min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (failures - 1))
+        interval = self.intervals[kind]
+        return time.monotonic() + interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _emit(self, name, kind, result, rows):
+        timestamp = time.time()
+        self.state[name][kind] = (timestamp, result)
+        for sink in self.sinks:
+            try:
+                sink.handle(name, kind, result, rows, timestamp)
+            except Exception as e:
+                print(f"⚠️ Sink {type(sink).__name__} failed: {e}")
+
+    def _emit_collection(self, kind, duration, errors):
+        for sink in self.sinks:
+            handler = getattr(sink, "handle_collection", None)
+            if handler is None:
+                continue
+            try:
+                handler(kind, duration, errors)
+            except Exception as e:
+                print(f"⚠️ Sink {type(sink).__name__} failed: {e}")
+
+    # --- checks ---
+    def _run_reachability(self, names):
+        started = time.monotonic()
+        ips = {name: self.servers[name][1] for name in names}
+        try:
+            stats = monitor.probe_many(list(ips.values()), count=monitor.PING_COUNT)
+        except Exception as e:
+            # The prober itself broke (not a dead node): keep the schedule, count it
+            print(f"⚠️ Reachability pass failed: {e}")
+            stats = None
+        for name, ip in ips.items():
+            if stats is not None:
+                self._emit(name, "reachability", stats[ip], [monitor.ping_check(stats[ip])])
+            self._schedule(name, "reachability", self._next_due("reachability"))
+        self._emit_collection("reachability", time.monotonic() - started, 0 if stats is not None else len(names))
+
+    def _run_ports(self, names):
+        started = time.monotonic()
+        targets = {name: (self.servers[name][1], monitor.node_ports(name)) for name in names}
+        try:
+            results = monitor.probe_services(targets)
+        except Exception as e:
+            print(f"⚠️ Ports pass failed: {e}")
+            results = None
+        for name in names:
+            if results is not None:
+                self._emit(name, "ports", results[name], monitor.port_checks(results[name]))
+            self._schedule(name, "ports", self._next_due("ports"))
+        self._emit_collection("ports", time.monotonic() - started, 0 if results is not None else len(names))
+
+    def _run_metrics(self, name):
+        started = time.monotonic()
+        node = self.servers[name]
+        _, ip, user, password, backup_paths = node
+        try:
+            client = self.pool.get(name, ip, user, password, port=getattr(node, "ssh_port", 22))
+            details = monitor.collect_node_metrics(client, backup_paths)
+        except Exception as e:
+            details = {"error": str(e)}
+        if "error" in details:
+            # The transport may be half-dead: force a fresh connect on the next try
+            self.pool.drop(name)
+            self.failures[name] = self.failures.get(name, 0) + 1
+        else:
+            self.failures[name] = 0
+        self._emit(name, "metrics", details, monitor.metric_checks(details))
+        self._emit_collection("metrics", time.monotonic() - started, 1 if "error" in details else 0)
+        with self._lock:
+            self.in_flight.discard(name)
+        self._schedule(name, "metrics", self._next_due("metrics", self.failures[name]))
+
+    # --- loop ---
+    def tick(self):
+        """Runs everything that is due now. Returns seconds until the next due check."""
+        now = time.monotonic()
+        due = {"reachability": [], "ports": [], "metrics": []}
+        windows = {kind: (self.intervals[kind] * self.jitter * 2 if kind in BATCHED_KINDS else 0)
+                   for kind in self.intervals}
+        horizon = now + max(windows.values())
+        with self._lock:
+            later = []
+            while self._queue and self._queue[0][0] <= horizon:
+                item = heapq.heappop(self._queue)
+                due_at, kind, name = item
+                # A batch starts only when its first node is really due
+                if due_at <= now or (due[kind] and due_at <= now + windows[kind]):
+                    due[kind].append(name)
+                else:
+                    later.append(item)
+            for item in later:
+                heapq.heappush(self._queue, item)
+
+        for name in due["metrics"]:
+            with self._lock:
+                if name in self.in_flight:
+                    continue
+                self.in_flight.add(name)
+            self.executor.submit(self._run_metrics, name)
+        if due["reachability"]:
+            self._run_reachability(due["reachability"])
+        if due["ports"]:
+            self._run_ports(due["ports"])
+
+        with self._lock:
+            if not self._queue:
+                return 1.0
+            return max(0.0, self._queue[0][0] - time.monotonic())
+
+    def run_forever(self):
+        print(f"🔁 Monitor daemon started for {len(self.servers)} nodes "
+              f"(intervals: {', '.join(f'{k} {v}s' for k, v in self.intervals.items())})")
+        try:
+            while not self.stop_event.is_set():
+                wait = self.tick()
+                # Wake up at least once a second so newly scheduled checks are not late
+                self.stop_event.wait(min(wait, 1.0))
+        finally:
+            self.close()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.pool.close()
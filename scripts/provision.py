@@ -0,0 +1,207 @@
+import re
+import time
+import shlex
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts.facts import build_facts_cmd, parse_facts
+from scripts.tracing import span
+
+# ==========================================
+# 📦 Idempotent Package Provisioning
+# ==========================================
+# Brings every node to a declared package state and touches only what is
+# missing. One read-only round trip per node checks the installed versions
+# (dpkg) and the age of the apt index:
+#   - every package present in an accepted version -> node is 'unchanged';
+#   - something missing or too old -> 'apt-get update' (only when the index
+#     is older than max_index_age), one 'apt-get install' for the missing
+#     packages, then a second check that they are really there.
+# Nodes are provisioned in parallel, at most 'workers' at a time.
+
+PROVISION_WORKERS = 8
+# Skip 'apt-get update' when the index was refreshed less than this ago
+APT_INDEX_MAX_AGE = 24 * 3600
+COMMAND_TIMEOUT = 900
+# Wait for unattended-upgrades instead of failing on the dpkg lock
+APT_LOCK_TIMEOUT = 120
+
+# Declarative package list per role. A node gets "all" plus the lists of
+# its inventory tags and services (see inventory.py). A package can pin
+# a minimal version: "iperf3>=3.9".
+# Built in are only the tools this suite itself needs. Service stacks are
+# not: Outline brings docker-ce/containerd.io through its own installer, and
+# 'apt-get install -y docker.io' would replace them. Anything else goes into
+# a --roles file of install_tools.py.
+ROLE_PACKAGES = {
+    "all": ["iperf3", "curl"],
+    "security": ["fail2ban", "ufw"],
+}
+
+# Newest of: apt's own success stamp, the lists folder, the binary cache
+APT_INDEX_MTIME_CMD = ("echo \"apt $(stat -c %Y /var/lib/apt/periodic/update-success-stamp "
+                       "/var/lib/apt/lists /var/cache/apt/pkgcache.bin 2>/dev/null | sort -n | tail -n 1) "
+                       "$(date +%s)\"")
+
+
+# --- Debian version order (same rules as 'dpkg --compare-versions') ---
+def _char_order(c):
+    if c == "~":
+        return -1
+    if c.isalpha():
+        return ord(c)
+    return ord(c) + 256
+
+
+def _compare_part(a, b):
+    i = j = 0
+    while i < len(a) or j < len(b):
+        # Non-digit prefix: letters sort before other symbols, '~' before everything (even the end)
+        while (i < len(a) and not a[i].isdigit()) or (j < len(b) and not b[j].isdigit()):
+            ac = _char_order(a[i]) if i < len(a) and not a[i].isdigit() else 0
+            bc = _char_order(b[j]) if j < len(b) and not b[j].isdigit() else 0
+            if ac != bc:
+                return ac - bc
+            i, j = i + 1, j + 1
+        # Digit run: compared as numbers
+        start_i, start_j = i, j
+        while i < len(a) and a[i].isdigit():
+            i += 1
+        while j < len(b) and b[j].isdigit():
+            j += 1
+        diff = int(a[start_i:i] or 0) - int(b[start_j:j] or 0)
+        if diff:
+            return diff
+    return 0
+
+
+def compare_versions(a, b):
+    """<0, 0 or >0 like dpkg: '1:1.0' > '2.0', '3.9-1' > '3.9', '1.0~rc1' < '1.0'."""
+    def split(version):
+        epoch, _, rest = version.rpartition(":") if ":" in version else ("0", "", version)
+        upstream, _, revision = rest.rpartition("-") if "-" in rest else (rest, "", "0")
+        return int(epoch or 0), upstream, revision
+
+    (ea, ua, ra), (eb, ub, rb) = split(a), split(b)
+    return (ea - eb) or _compare_part(ua, ub) or _compare_part(ra, rb)
+
+
+def parse_spec(spec):
+    """'iperf3>=3.9' -> ('iperf3', '3.9'), 'curl' -> ('curl', None)"""
+    match = re.fullmatch(r"\s*([a-z0-9][a-z0-9+.-]*)\s*(?:>=\s*(\S+))?\s*", spec)
+    if not match:
+        raise ValueError(f"Bad package spec '{spec}': use 'name' or 'name>=version'")
+    return match.group(1), match.group(2)
+
+
+def is_satisfied(fact, min_version):
+    """fact: {'is_installed', 'version'} from the facts parser."""
+    if not fact or not fact["is_installed"]:
+        return False
+    return min_version is None or (fact["version"] is not None and compare_versions(fact["version"], min_version) >= 0)
+
+
+def packages_for(node, roles=None):
+    """Package specs of a node: role 'all' + its inventory tags and services, without duplicates."""
+    roles = ROLE_PACKAGES if roles is None else roles
+    node_roles = ["all", *getattr(node, "tags", ()), *getattr(node, "services", ())]
+    specs = {}
+    for role in node_roles:
+        for spec in roles.get(role, ()):
+            specs.setdefault(parse_spec(spec)[0], spec)
+    return list(specs.values())
+
+
+def parse_index_age(output):
+    """Seconds since the last apt index refresh (by the node's clock), None if unknown."""
+    for line in output.splitlines():
+        fields = line.split()
+        if fields[:1] == ["apt"] and len(fields) == 3 and fields[1].isdigit():
+            return max(0, int(fields[2]) - int(fields[1]))
+    return None
+
+
+class Provisioner:
+    """
+    'shell' runs a command on a node by name: .run(node, cmd, timeout) -> (rc, stdout, stderr)
+    (SSHShell over an SSHPool, or a fake in tests).
+    """
+
+    def __init__(self, shell, roles=None, max_index_age=APT_INDEX_MAX_AGE, workers=PROVISION_WORKERS,
+                 timeout=COMMAND_TIMEOUT):
+        self.shell = shell
+        self.roles = ROLE_PACKAGES if roles is None else roles
+        self.max_index_age = max_index_age
+        self.workers = workers
+        self.timeout = timeout
+
+    def check(self, name, specs):
+        """One read-only round trip: (unsatisfied specs, installed facts, index age)."""
+        names = [parse_spec(s)[0] for s in specs]
+        _, out, _ = self.shell.run(name, f"{build_facts_cmd(False, names, [])}; {APT_INDEX_MTIME_CMD}",
+                                   timeout=self.timeout)
+        _, packages, _ = parse_facts(out)
+        missing = [s for s in specs if not is_satisfied(packages.get(parse_spec(s)[0]), parse_spec(s)[1])]
+        return missing, packages, parse_index_age(out)
+
+    def _apt(self, name, args, sudo):
+        cmd = (f"{'sudo -n ' if sudo else ''}env DEBIAN_FRONTEND=noninteractive "
+               f"apt-get -o DPkg::Lock::Timeout={APT_LOCK_TIMEOUT} -q {args}")
+        rc, out, err = self.shell.run(name, cmd, timeout=self.timeout)
+        if rc != 0:
+            lines = (err or out).strip().splitlines()
+            raise RuntimeError(f"apt-get {args.split()[0]} failed (rc={rc}): {lines[-1] if lines else 'no output'}")
+
+    def provision_node(self, node):
+        """Never raises: returns a report dict with status changed / unchanged / failed."""
+        name, user = node[0], node[2]
+        sudo = bool(user) and user != "root"
+        specs = packages_for(node, self.roles)
+        report = {"name": name, "status": "unchanged", "duration": 0.0, "installed": [],
+                  "index_updated": False, "error": None}
+        started = time.monotonic()
+        try:
+            with span("node", name, task="provision"):
+                self._converge(name, specs, sudo, report)
+        except Exception as e:
+            report.update(status="failed", error=str(e))
+        report["duration"] = time.monotonic() - started
+        return report
+
+    def _converge(self, name, specs, sudo, report):
+        missing, _, index_age = self.check(name, specs)
+        if missing:
+            if index_age is None or index_age > self.max_index_age:
+                self._apt(name, "update", sudo)
+                report["index_updated"] = True
+            names = [parse_spec(s)[0] for s in missing]
+            self._apt(name, "install -y " + " ".join(shlex.quote(n) for n in names), sudo)
+            report["status"] = "changed"
+            report["installed"] = names
+
+            still_missing, packages, _ = self.check(name, missing)
+            if still_missing:
+                found = ", ".join(f"{parse_spec(s)[0]} {packages.get(parse_spec(s)[0], {}).get('version')}"
+                                  for s in still_missing)
+                raise RuntimeError(f"not satisfied after install: {', '.join(still_missing)} (found: {found})")
+
+    def run(self, nodes):
+        """Provisions all nodes, 'workers' at a time. Reports come back in inventory order."""
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            return list(pool.map(self.provision_node, nodes))
+
+
+def print_provision_report(reports, total):
+    print("\n📊 PROVISIONING REPORT")
+    icons = {"changed": "🔧", "unchanged": "✅", "failed": "❌"}
+    for r in reports:
+        line = f"   {icons[r['status']]} {r['name']:<18} {r['status']:<10} {r['duration']:7.1f}s"
+        if r["installed"]:
+            line += f"  installed: {', '.join(r['installed'])}"
+        if r["index_updated"]:
+            line += " (apt-get update)"
+        if r["error"]:
+            line += f"  ({r['error']})"
+        print(line)
+    counts = {status: sum(r["status"] == status for r in reports) for status in icons}
+    print(f"\n   changed: {counts['changed']}, unchanged: {counts['unchanged']}, "
+          f"failed: {counts['failed']} | total {total:.1f}s")
@@ -0,0 +1,209 @@
+import time
+import socket
+import struct
+import asyncio
+import itertools
+import statistics
+
+# ==========================================
+# 📡 Multiplexed Reachability Prober
+# ==========================================
+# One event loop pings every node at once instead of forking 'ping' per node.
+# - ICMP echo over an unprivileged "ping socket" (SOCK_DGRAM + IPPROTO_ICMP)
+#   when the OS allows it (Linux: net.ipv4.ping_group_range, macOS: always).
+# - Otherwise TCP connect timing: SYN -> SYN/ACK (or RST) is one round trip too.
+# Hundreds of targets finish in about one timeout interval.
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+# Port used for the TCP fallback (VLESS/Reality and HTTPS listen here on every node)
+TCP_FALLBACK_PORT = 443
+PROBE_TIMEOUT = 1.0
+PROBE_INTERVAL = 0.2
+_seq_counter = itertools.count(1)
+
+
+def icmp_checksum(data):
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def build_echo_request(seq, payload=b"vpn-qa-probe"):
+    """ICMP echo request. The identifier is 0: ping sockets replace it with the socket's own id."""
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, 0, seq)
+    checksum = icmp_checksum(header + payload)
+    return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, checksum, 0, seq) + payload
+
+
+def parse_echo_reply(packet):
+    """Returns the sequence number of an echo reply, or None for any other ICMP message."""
+    if len(packet) >= 20 and packet[0] >> 4 == 4:
+        # Some systems (macOS) deliver the IP header too: skip it
+        packet = packet[(packet[0] & 0x0F) * 4:]
+    if len(packet) < 8:
+        return None
+    icmp_type, _, _, _, seq = struct.unpack("!BBHHH", packet[:8])
+    return seq if icmp_type == ICMP_ECHO_REPLY else None
+
+
+def icmp_available():
+    """True if this process may open an unprivileged ICMP socket."""
+    try:
+        socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP).close()
+        return True
+    except (PermissionError, OSError):
+        return False
+
+
+def summarize(target, method, samples):
+    """
+    samples: [(sent_timestamp, rtt_ms or None)].
+    Jitter = mean difference between consecutive RTTs (like RFC 3550 / iperf).
+    """
+    rtts = [rtt for _, rtt in samples if rtt is not None]
+    sent = len(samples)
+    stats = {
+        "target": target,
+        "method": method,
+        "sent": sent,
+        "received": len(rtts),
+        "loss": (sent - len(rtts)) / sent if sent else 1.0,
+        "min": None, "avg": None, "max": None, "jitter": None,
+        "samples": samples,
+    }
+    if rtts:
+        stats.update(min=min(rtts), avg=statistics.fmean(rtts), max=max(rtts))
+        diffs = [abs(b - a) for a, b in zip(rtts, rtts[1:])]
+        stats["jitter"] = statistics.fmean(diffs) if diffs else 0.0
+    return stats
+
+
+async def _resolve(targets):
+    loop = asyncio.get_running_loop()
+
+    async def one(target):
+        try:
+            infos = await loop.getaddrinfo(target, None, family=socket.AF_INET, type=socket.SOCK_STREAM)
+            return infos[0][4][0]
+        except OSError:
+            return None
+
+    return dict(zip(targets, await asyncio.gather(*(one(t) for t in targets))))
+
+
+async def _icmp_probe(addresses, count, interval, timeout):
+    """All echoes go through ONE socket; replies are matched by sequence number."""
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+    sock.setblocking(False)
+
+    pending = {}   # seq -> (target, index)
+    sent_at = {}   # (target, index) -> (wall timestamp, perf counter)
+    rtts = {}      # (target, index) -> rtt ms
+    done = asyncio.Event()
+    expected = len(addresses) * count
+
+    def on_readable():
+        while True:
+            try:
+                packet, (source, _) = sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            received = time.perf_counter()
+            seq = parse_echo_reply(packet)
+            key = pending.get(seq)
+            if key is not None and addresses[key[0]] == source:
+                del pending[seq]
+                rtts[key] = (received - sent_at[key][1]) * 1000
+                if len(rtts) == expected:
+                    done.set()
+
+    loop.add_reader(sock.fileno(), on_readable)
+    try:
+        for index in range(count):
+            for target, address in addresses.items():
+                seq = next(_seq_counter) & 0xFFFF
+                pending[seq] = (target, index)
+                sent_at[(target, index)] = (time.time(), time.perf_counter())
+                try:
+                    sock.sendto(build_echo_request(seq), (address, 0))
+                except OSError:
+                    pending.pop(seq, None)  # e.g. network unreachable: counts as lost
+            if index < count - 1:
+                await asyncio.sleep(interval)
+        try:
+            await asyncio.wait_for(done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+    finally:
+        loop.remove_reader(sock.fileno())
+        sock.close()
+
+    return {
+        target: [(sent_at[(target, i)][0], rtts.get((target, i))) for i in range(count)]
+        for target in addresses
+    }
+
+
+async def _tcp_probe(addresses, count, interval, timeout, port):
+    """Connect timing. A refused connection still proves the host answered (RST = one RTT)."""
+
+    async def attempt(address):
+        started_wall = time.time()
+        started = time.perf_counter()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(address, port), timeout)
+            rtt = (time.perf_counter() - started) * 1000
+            writer.close()
+        except ConnectionRefusedError:
+            rtt = (time.perf_counter() - started) * 1000
+        except (OSError, asyncio.TimeoutError):
+            rtt = None
+        return started_wall, rtt
+
+    async def series(address):
+        samples = []
+        for index in range(count):
+            samples.append(await attempt(address))
+            if index < count - 1:
+                await asyncio.sleep(interval)
+        return samples
+
+    results = await asyncio.gather(*(series(a) for a in addresses.values()))
+    return dict(zip(addresses, results))
+
+
+async def probe_many_async(targets, count=3, interval=PROBE_INTERVAL, timeout=PROBE_TIMEOUT,
+                           method="auto", tcp_port=TCP_FALLBACK_PORT):
+    targets = list(dict.fromkeys(targets))
+    resolved = await _resolve(targets)
+    addresses = {t: a for t, a in resolved.items() if a}
+
+    if method == "auto":
+        method = "icmp" if icmp_available() else "tcp"
+    if method == "icmp":
+        samples = await _icmp_probe(addresses, count, interval, timeout)
+    else:
+        samples = await _tcp_probe(addresses, count, interval, timeout, tcp_port)
+
+    report = {}
+    for target in targets:
+        # Unresolvable names are reported as 100% loss, not as an exception
+        report[target] = summarize(target, method, samples.get(target, [(time.time(), None)] * count))
+    return report
+
+
+def probe_many(targets, **kwargs):
+    """
+    Sync entry point for scripts and tests.
+    Returns {target: {"method", "sent", "received", "loss", "min", "avg", "max", "jitter", "samples"}}.
+    RTT values are in milliseconds, 'samples' hold (unix timestamp, rtt_ms or None).
+    """
+    return asyncio.run(probe_many_async(targets, **kwargs))
+
@@ -0,0 +1,90 @@
+import json
+
+# ==========================================
+# 🔬 Composite Remote Probe
+# ==========================================
+# One SSH exec collects disk, memory, load, containers and service states.
+# On high-latency links (RU/AT) every extra exec channel costs a full RTT,
+# so everything the monitor needs is gathered in a single round trip.
+#
+# The script prints ONE line of JSON. Bump PROBE_SCHEMA_VERSION whenever
+# a field changes meaning; new optional fields do not need a bump.
+PROBE_SCHEMA_VERSION = 1
+
+# Plain POSIX sh: no python/jq on the node is required.
+# Every block falls back to 'null' when the tool is missing (e.g. no docker).
+_PROBE_TEMPLATE = r"""
+printf '{"schema":__SCHEMA__'
+d=$(df -P / 2>/dev/null | awk 'NR==2{gsub("%","",$5); print $5}')
+printf ',"disk_used":%s' "${d:-null}"
+m=$(awk '/^MemTotal:/{t=$2} /^MemAvailable:/{a=$2} END{if (t>0) printf "%.1f", (t-a)*100/t}' /proc/meminfo 2>/dev/null)
+printf ',"mem_used":%s' "${m:-null}"
+l=$(cut -d' ' -f1 /proc/loadavg 2>/dev/null)
+printf ',"load1":%s' "${l:-null}"
+printf ',"containers":'
+if command -v docker >/dev/null 2>&1 && n=$(docker ps --format '{{.Names}}' 2>/dev/null); then
+  printf '%s\n' "$n" | awk 'BEGIN{printf "["} NF{printf "%s\"%s\"", (c++ ? "," : ""), $0} END{printf "]"}'
+else
+  printf 'null'
+fi
+printf ',"services":{'
+sep=''
+for u in __UNITS__; do
+  s=$(systemctl is-active "$u" 2>/dev/null)
+  printf '%s"%s":"%s"' "$sep" "$u" "${s:-unknown}"
+  sep=','
+done
+printf '}}\n'
+"""
+
+
+class ProbeError(Exception):
+    """The probe output could not be understood (garbage, or an unknown schema)."""
+
+
+def build_probe_command(units=()):
+    """Returns the shell script for one exec. 'units' are systemd units to check."""
+    unit_list = " ".join(units) if units else ""
+    return (_PROBE_TEMPLATE
+            .replace("__SCHEMA__", str(PROBE_SCHEMA_VERSION))
+            .replace("__UNITS__", unit_list))
+
+
+def parse_probe_output(raw):
+    """
+    Turns the probe output into a dict with a stable set of keys.
+    Missing tools give None instead of an error:
+      containers=None means "docker is not installed / not reachable".
+    """
+    if isinstance(raw, bytes):
+        raw = raw.decode(errors="replace")
+
+    # Login banners or shell noise may come before the JSON line
+    line = next((l for l in reversed(raw.splitlines()) if l.strip().startswith("{")), None)
+    if line is None:
+        raise ProbeError("Probe returned no JSON")
+    try:
+        payload = json.loads(line)
+    except ValueError as e:
+        raise ProbeError(f"Broken probe JSON: {e}")
+
+    schema = payload.get("schema")
+    if schema != PROBE_SCHEMA_VERSION:
+        raise ProbeError(f"Unsupported probe schema: {schema}")
+
+    containers = payload.get("containers")
+    return {
+        "schema": schema,
+        "disk_used": _as_number(payload.get("disk_used"), int),
+        "mem_used": _as_number(payload.get("mem_used"), float),
+        "load1": _as_number(payload.get("load1"), float),
+        "containers": list(containers) if isinstance(containers, list) else None,
+        "services": dict(payload.get("services") or {}),
+    }
+
+
+def _as_number(value, kind):
+    try:
+        return kind(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,107 @@
+import ssl
+import time
+import asyncio
+
+# ==========================================
+# 🚪 Multi-Port Service Probe Engine
+# ==========================================
+# Checks every service port of every node at the same time (one asyncio loop).
+# For each port we measure:
+#   - TCP connect time (SYN -> SYN/ACK),
+#   - optional TLS handshake time on the same connection (VLESS/Reality, panels),
+# and tell the failure modes apart:
+#   open      - connection accepted
+#   refused   - host answered with RST: service is down, the host is up
+#   filtered  - no answer before the timeout: firewall/DPI drop or dead host
+#   error     - anything else (no route, DNS, ...)
+
+PORT_TIMEOUT = 3.0
+TLS_TIMEOUT = 5.0
+
+
+def _tls_context():
+    # We measure latency, not trust: Reality answers with the camouflage site's cert
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+async def probe_port(ip, name, port, tls=None, timeout=PORT_TIMEOUT, tls_timeout=TLS_TIMEOUT):
+    """
+    Probes one port. 'tls' is None for plain TCP, '' for TLS without SNI, or the SNI.
+    Returns {"name", "port", "status", "connect_ms", "tls_ms", "tls_error", "error"}.
+    """
+    loop = asyncio.get_running_loop()
+    result = {"name": name, "port": port, "status": "error", "connect_ms": None,
+              "tls_ms": None, "tls_error": None, "error": None}
+
+    started = time.perf_counter()
+    try:
+        transport, protocol = await asyncio.wait_for(
+            loop.create_connection(asyncio.Protocol, ip, port), timeout)
+    except ConnectionRefusedError:
+        result["status"] = "refused"
+        result["connect_ms"] = (time.perf_counter() - started) * 1000
+        return result
+    except asyncio.TimeoutError:
+        result["status"] = "filtered"
+        return result
+    except OSError as e:
+        result["error"] = str(e)
+        return result
+
+    result["status"] = "open"
+    result["connect_ms"] = (time.perf_counter() - started) * 1000
+
+    try:
+        if tls is not None:
+            started = time.perf_counter()
+            try:
+                transport = await asyncio.wait_for(
+                    loop.start_tls(transport, protocol, _tls_context(), server_hostname=tls or None),
+                    tls_timeout)
+                result["tls_ms"] = (time.perf_counter() - started) * 1000
+            except asyncio.TimeoutError:
+                result["tls_error"] = "handshake timeout"
+            except (ssl.SSLError, OSError) as e:
+                result["tls_error"] = str(e) or type(e).__name__
+    finally:
+        transport.close()
+    return result
+
+
+async def probe_services_async(targets, timeout=PORT_TIMEOUT, tls_timeout=TLS_TIMEOUT):
+    """targets: {node_name: (ip, [(name, port, tls), ...])} -> {node_name: [result, ...]}"""
+    jobs = []
+    for node, (ip, ports) in targets.items():
+        for name, port, tls in ports:
+            jobs.append((node, probe_port(ip, name, port, tls, timeout, tls_timeout)))
+
+    results = await asyncio.gather(*(job for _, job in jobs))
+    report = {node: [] for node in targets}
+    for (node, _), result in zip(jobs, results):
+        report[node].append(result)
+    return report
+
+
+def probe_services(targets, **kwargs):
+    """Sync entry point: all ports of all nodes are probed concurrently."""
+    return asyncio.run(probe_services_async(targets, **kwargs))
+
+
+def describe(result):
+    """(value, status) pair for the monitor report line of one port."""
+    if result["status"] == "open":
+        value = f"Open ({result['connect_ms']:.0f} ms"
+        if result["tls_ms"] is not None:
+            value += f", TLS {result['tls_ms']:.0f} ms"
+        value += ")"
+        if result["tls_error"]:
+            return f"{value} TLS failed: {result['tls_error']}", "warn"
+        return value, "ok"
+    if result["status"] == "refused":
+        return "Refused (service down)", "fail"
+    if result["status"] == "filtered":
+        return "Filtered (timeout)", "fail"
+    return f"Error: {result['error']}", "fail"
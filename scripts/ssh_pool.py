@@ -0,0 +1,122 @@
+import threading
+import logging
+from collections import Counter
+
+import paramiko
+
+from scripts.tracing import TracedSSHClient
+
+logging.getLogger("paramiko").setLevel(logging.CRITICAL)
+
+# ==========================================
+# 🔌 Pooled SSH Connections
+# ==========================================
+# One live SSH transport per node, shared by everybody in the process.
+# The handshake + auth is the most expensive part of any remote check
+# (seconds on RU/AT links), so we pay it once per node instead of once per check.
+
+# Same settings as the testinfra connection string in tests/conftest.py
+CONNECT_TIMEOUT = 20
+# Seconds between SSH keepalive packets. Stops NAT/ISP boxes from
+# silently killing idle sessions between two tests.
+KEEPALIVE_INTERVAL = 15
+
+
+def is_alive(client):
+    """True if the client still has an active transport."""
+    transport = client.get_transport() if client is not None else None
+    return transport is not None and transport.is_active()
+
+
+class SSHPool:
+    """
+    Keeps one connected paramiko.SSHClient per node name.
+    - get() returns the cached client, or reconnects if the transport died.
+    - drop() forgets a broken client, the next get() opens a new one.
+    - close() shuts everything down (call it at the end of the run).
+    'connects' counts real handshakes per node, so we can prove the reuse.
+    """
+
+    def __init__(self, timeout=CONNECT_TIMEOUT, keepalive=KEEPALIVE_INTERVAL, client_factory=TracedSSHClient):
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self.client_factory = client_factory
+        self.connects = Counter()
+        self._nodes = {}
+        self._clients = {}
+        self._node_locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, ip, user, password, port=22):
+        """Remembers how to reach a node, so it can be reconnected later by name."""
+        with self._lock:
+            self._nodes[name] = (ip, user, password, port)
+            self._node_locks.setdefault(name, threading.Lock())
+
+    def register_nodes(self, nodes):
+        """Registers inventory nodes (or plain (Name, IP, User, Pass, ...) tuples)."""
+        for node in nodes:
+            self.register(*node[:4], port=getattr(node, "ssh_port", 22))
+
+    def get(self, name, ip=None, user=None, password=None, port=22):
+        """Returns a live client for the node. Credentials are needed only on first use."""
+        if ip is not None:
+            self.register(name, ip, user, password, port)
+        if name not in self._nodes:
+            raise KeyError(f"Unknown node: {name}")
+
+        # Per-node lock: two nodes can connect in parallel, one node connects only once
+        with self._node_locks[name]:
+            client = self._clients.get(name)
+            if is_alive(client):
+                return client
+            if client is not None:
+                client.close()
+            client = self._connect(name)
+            self._clients[name] = client
+            return client
+
+    def drop(self, name):
+        """Closes and forgets the client of one node (e.g. after a broken channel)."""
+        with self._lock:
+            client = self._clients.pop(name, None)
+        if client is not None:
+            client.close()
+
+    def close(self):
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+    def _connect(self, name):
+        ip, user, password, port = self._nodes[name]
+        client = self.client_factory()
+        client.trace_node = name
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(
+            ip,
+            port=port,
+            username=user,
+            password=password,
+            timeout=self.timeout,
+            banner_timeout=self.timeout,
+            auth_timeout=self.timeout,
+            look_for_keys=False,
+            allow_agent=False,
+        )
+        transport = client.get_transport()
+        if transport is not None and self.keepalive:
+            transport.set_keepalive(self.keepalive)
+        self.connects[name] += 1
+        return client
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
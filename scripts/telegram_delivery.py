@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import random
+import hashlib
+import requests
+
+# ==========================================
+# ✈️ Telegram Delivery Layer
+# ==========================================
+# - One HTTP session (keep-alive) for all uploads of a run.
+# - Retries with exponential backoff + jitter, and Telegram's own 'retry_after' on 429.
+# - Archives above the Bot API upload limit are sent as numbered parts plus a
+#   JSON manifest with checksums (restore: cat part* > archive, compare sha256).
+# - Progress is saved next to the archive, so an interrupted run resumes from
+#   the first part that was not delivered yet.
+
+TG_API_URL = os.getenv("TG_API_URL", "https://api.telegram.org")
+# Bot API accepts documents up to 50 MB; keep a margin for multipart overhead
+PART_SIZE = 45 * 1024 * 1024
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+REQUEST_TIMEOUT = 120
+
+
+class TelegramError(Exception):
+    """Telegram refused the request (and retrying will not help) or retries ran out."""
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TelegramDelivery:
+
+    def __init__(self, token, chat_id, api_url=TG_API_URL, part_size=PART_SIZE, max_retries=MAX_RETRIES,
+                 backoff=BACKOFF_BASE, timeout=REQUEST_TIMEOUT, session=None, sleep=time.sleep):
+        self.base_url = f"{api_url.rstrip('/')}/bot{token}"
+        self.chat_id = chat_id
+        self.part_size = part_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.sleep = sleep
+
+    # --- low level ---
+    def call(self, method, data=None, files=None):
+        """
+        POSTs one Bot API method with retries. 'files' must hold bytes (not open files),
+        so the same body can be re-sent after a failure.
+        """
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(f"{self.base_url}/{method}", data=data, files=files,
+                                             timeout=self.timeout)
+            except requests.RequestException as e:
+                last_error = str(e)
+                self._backoff(attempt)
+                continue
+
+            try:
+                payload = response.json()
+            except ValueError:
+                payload = {}
+
+            if response.status_code == 200 and payload.get("ok", True):
+                return payload
+            last_error = payload.get("description") or response.text[:200]
+
+            if response.status_code == 429:
+                # Flood control: Telegram tells us exactly how long to wait
+                retry_after = (payload.get("parameters") or {}).get("retry_after")
+                if attempt < self.max_retries:
+                    self.sleep(float(retry_after) if retry_after else self._delay(attempt))
+            elif response.status_code >= 500:
+                self._backoff(attempt)
+            else:
+                raise TelegramError(f"{method} failed ({response.status_code}): {last_error}")
+
+        raise TelegramError(f"{method} failed after {self.max_retries + 1} attempts: {last_error}")
+
+    def _delay(self, attempt):
+        # Full jitter: random wait in [0, base * 2^attempt]; spreads parallel uploaders apart
+        return random.uniform(0, min(BACKOFF_MAX, self.backoff * (2 ** attempt)))
+
+    def _backoff(self, attempt):
+        if attempt < self.max_retries:
+            self.sleep(self._delay(attempt))
+
+    def send_message(self, text, disable_notification=False):
+        data = {"chat_id": self.chat_id, "text": text,
+                "disable_notification": "true" if disable_notification else "false"}
+        return self.call("sendMessage", data=data)
+
+    def send_document(self, filename, content, caption=None, disable_notification=True):
+        data = {"chat_id": self.chat_id, "disable_notification": "true" if disable_notification else "false"}
+        if caption:
+            data["caption"] = caption
+        return self.call("sendDocument", data=data, files={"document": (filename, content)})
+
+    # --- archives ---
+    def deliver(self, file_path, caption):
+        """
+        Sends an archive. Small files go as one document (old behaviour).
+        Big files go as parts + manifest, resuming from saved progress.
+        Returns the number of documents sent in this call.
+        """
+        size = os.path.getsize(file_path)
+        filename = os.path.basename(file_path)
+        if size <= self.part_size:
+            with open(file_path, "rb") as f:
+                self.send_document(filename, f.read(), caption)
+            return 1
+
+        state_path = file_path + ".tg.json"
+        sha = file_sha256(file_path)
+        state = self._load_state(state_path)
+        if state.get("sha256") != sha or state.get("part_size") != self.part_size:
+            state = {"sha256": sha, "part_size": self.part_size, "parts": {}, "manifest_sent": False}
+
+        total = (size + self.part_size - 1) // self.part_size
+        sent = 0
+        with open(file_path, "rb") as f:
+            for index in range(1, total + 1):
+                part_name = f"{filename}.part{index:03d}"
+                if part_name in state["parts"]:
+                    continue
+                f.seek((index - 1) * self.part_size)
+                chunk = f.read(self.part_size)
+                part_caption = f"{caption}\n🧩 Part {index}/{total}" if index == 1 else f"🧩 {filename} {index}/{total}"
+                self.send_document(part_name, chunk, part_caption)
+                state["parts"][part_name] = {"index": index, "size": len(chunk),
+                                             "sha256": hashlib.sha256(chunk).hexdigest()}
+                self._save_state(state_path, state)
+                sent += 1
+
+        if not state["manifest_sent"]:
+            manifest = {
+                "file": filename,
+                "size": size,
+                "sha256": sha,
+                "parts": sorted(({"name": n, **p} for n, p in state["parts"].items()), key=lambda p: p["index"]),
+                "restore": f"cat {filename}.part* > {filename} && sha256sum {filename}",
+            }
+            self.send_document(f"{filename}.manifest.json", json.dumps(manifest, indent=1).encode(),
+                               f"🧾 Manifest: {filename} ({total} parts)")
+            state["manifest_sent"] = True
+            self._save_state(state_path, state)
+            sent += 1
+
+        # Fully delivered: progress file is not needed any more
+        os.remove(state_path)
+        return sent
+
+    @staticmethod
+    def _load_state(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _save_state(path, state):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,209 @@
+import re
+import time
+import shlex
+import math
+import statistics
+import requests
+
+# ==========================================
+# 🏎️ Adaptive Throughput Probe
+# ==========================================
+# A download speed check does not need 100 MB: it needs an estimate that is
+# good enough to compare with the threshold. We sample the byte counter
+# during the transfer and stop as soon as:
+#   pass      - the whole confidence interval is above the threshold,
+#   fail      - the whole confidence interval is below it,
+#   converged - the interval is narrower than REL_TOLERANCE of the estimate,
+# or when the transfer ends / MAX_TIME runs out. The first WARMUP seconds
+# (DNS, TCP slow start) are not counted.
+
+SAMPLE_INTERVAL = 0.5
+WARMUP = 1.0
+MIN_SAMPLES = 4
+REL_TOLERANCE = 0.10
+CONFIDENCE = 0.95
+MAX_TIME = 20
+CHUNK_SIZE = 64 * 1024
+
+# Two-sided 95% Student t quantiles by degrees of freedom
+_T95 = {1: 12.71, 2: 4.30, 3: 3.18, 4: 2.78, 5: 2.57, 6: 2.45, 7: 2.36, 8: 2.31, 9: 2.26,
+        10: 2.23, 12: 2.18, 15: 2.13, 20: 2.09, 30: 2.04}
+
+
+def t_critical(df, confidence=CONFIDENCE):
+    """Student t quantile; table for 95% and small samples, normal approximation otherwise."""
+    if confidence == 0.95 and df <= 30:
+        return _T95[max(k for k in _T95 if k <= max(df, 1))]
+    return statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+class ThroughputEstimator:
+    """
+    Feed it (seconds, total_bytes) samples with add(); it returns a decision
+    ('pass', 'fail', 'converged') once it is safe to stop, otherwise None.
+    """
+
+    def __init__(self, threshold_mbps=None, warmup=WARMUP, min_samples=MIN_SAMPLES,
+                 rel_tolerance=REL_TOLERANCE, confidence=CONFIDENCE):
+        self.threshold = threshold_mbps
+        self.warmup = warmup
+        self.min_samples = min_samples
+        self.rel_tolerance = rel_tolerance
+        self.confidence = confidence
+        self.started = None      # first moment with data flowing
+        self.last = None         # last counted (seconds, bytes)
+        self.rates = []          # Mbit/s of every interval after the warm-up
+        self.bytes = 0
+        self.elapsed = 0.0
+        self.decision = None
+
+    def add(self, seconds, total_bytes):
+        self.bytes, self.elapsed = total_bytes, seconds
+        if self.started is None:
+            if total_bytes > 0:
+                self.started = seconds
+            return None
+        if seconds - self.started < self.warmup:
+            return None
+        if self.last is None:
+            self.last = (seconds, total_bytes)
+            return None
+        dt = seconds - self.last[0]
+        if dt <= 0:
+            return None
+        self.rates.append((total_bytes - self.last[1]) * 8 / dt / 1e6)
+        self.last = (seconds, total_bytes)
+        self.decision = self._decide()
+        return self.decision
+
+    def bounds(self):
+        """(estimate, half width of the confidence interval) in Mbit/s."""
+        if not self.rates:
+            return None, None
+        mean = statistics.fmean(self.rates)
+        if len(self.rates) < 2:
+            return mean, math.inf
+        half = t_critical(len(self.rates) - 1, self.confidence) * statistics.stdev(self.rates) / math.sqrt(len(self.rates))
+        return mean, half
+
+    def _decide(self):
+        if len(self.rates) < self.min_samples:
+            return None
+        mean, half = self.bounds()
+        if self.threshold is not None:
+            if mean - half > self.threshold:
+                return "pass"
+            if mean + half < self.threshold:
+                return "fail"
+        if mean > 0 and half / mean <= self.rel_tolerance:
+            return "converged"
+        return None
+
+    def result(self, reason=None):
+        """
+        Final report. If the transfer was too short for interval samples
+        the average over the whole transfer is used and the bound is unknown.
+        """
+        mean, half = self.bounds()
+        if mean is None and self.elapsed > 0:
+            start = self.started if self.started is not None else 0.0
+            span = self.elapsed - start
+            mean = self.bytes * 8 / span / 1e6 if span > 0 else None
+        return {
+            "mbps": mean,
+            "error": half if half is not None and math.isfinite(half) else None,
+            "samples": len(self.rates),
+            "bytes": self.bytes,
+            "elapsed": self.elapsed,
+            "stopped": self.decision or reason,
+        }
+
+
+def describe(result):
+    """'87.3 ± 4.1 Mbps (95% CI, 6 samples, 3.5s, 38.2 MB, stopped: pass)'"""
+    if result["mbps"] is None:
+        return f"no data ({result['stopped']})"
+    bound = f" ± {result['error']:.1f}" if result["error"] is not None else ""
+    return (f"{result['mbps']:.1f}{bound} Mbps ({CONFIDENCE:.0%} CI, {result['samples']} samples, "
+            f"{result['elapsed']:.1f}s, {result['bytes'] / 1e6:.1f} MB, stopped: {result['stopped']})")
+
+
+def probe_url(url, threshold_mbps=None, max_time=MAX_TIME, interval=SAMPLE_INTERVAL, session=None, **kwargs):
+    """Downloads 'url' from THIS machine until the estimator is sure. Returns result()."""
+    estimator = ThroughputEstimator(threshold_mbps, **kwargs)
+    session = session or requests.Session()
+    started = time.monotonic()
+    total = 0
+    next_sample = interval
+    reason = "complete"
+    with session.get(url, stream=True, timeout=10) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            total += len(chunk)
+            now = time.monotonic() - started
+            if now >= next_sample:
+                next_sample = now + interval
+                if estimator.add(now, total):
+                    break
+            if now >= max_time:
+                reason = "timeout"
+                break
+        else:
+            estimator.add(time.monotonic() - started, total)
+    return estimator.result(reason)
+
+
+def build_remote_probe_cmd(url, max_time=MAX_TIME, interval=SAMPLE_INTERVAL):
+    """
+    curl streams the file into 'dd of=/dev/null'; every 'interval' the shell sends
+    SIGUSR1 to dd, and GNU dd prints '<bytes> bytes (...) copied, <seconds> s, ...'.
+    The first line is 'pid <dd pid>' (killing dd stops curl with SIGPIPE), the last 'rc <exit code>'.
+    The first signal goes after one interval, so dd has its handler installed by then.
+    """
+    return (
+        f"curl -s --max-time {max_time} --connect-timeout 10 {shlex.quote(url)} "
+        "| LC_ALL=C dd of=/dev/null bs=64k 2>&1 & pid=$!; "
+        "echo pid $pid; "
+        f"while sleep {interval}; kill -USR1 $pid 2>/dev/null; do :; done; "
+        "wait $pid; echo rc $?"
+    )
+
+
+_DD_STATS = re.compile(r"^(\d+) bytes .*copied, ([\d.]+) s")
+
+
+def probe_remote(client, url, threshold_mbps=None, max_time=MAX_TIME, interval=SAMPLE_INTERVAL, **kwargs):
+    """
+    Same probe, but the download runs ON the node (paramiko client or anything
+    with exec_command). Measures the node's own internet bandwidth.
+    """
+    estimator = ThroughputEstimator(threshold_mbps, **kwargs)
+    _, stdout, _ = client.exec_command(build_remote_probe_cmd(url, max_time, interval))
+    pid, rc, decision = None, None, None
+    for raw in iter(stdout.readline, ""):
+        line = raw.decode() if isinstance(raw, bytes) else raw
+        stats = _DD_STATS.match(line)
+        if stats:
+            decision = estimator.add(float(stats.group(2)), int(stats.group(1)))
+            if decision:
+                break
+        elif line.startswith("pid "):
+            pid = line.split()[1]
+        elif line.startswith("rc "):
+            rc = int(line.split()[1])
+
+    if decision and pid:
+        # Enough data: stop the download instead of burning the node's traffic
+        client.exec_command(f"kill {pid} 2>/dev/null")
+    if hasattr(stdout, "channel"):
+        stdout.channel.close()
+    else:
+        stdout.close()
+
+    if rc is None:
+        reason = "interrupted"
+    elif estimator.elapsed >= max_time - interval:
+        reason = "timeout"
+    else:
+        reason = "complete" if rc == 0 else f"dd exit {rc}"
+    return estimator.result(reason)
@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import socket
+import threading
+from collections import defaultdict
+
+import paramiko
+
+# ==========================================
+# ⏱️ Phase Timing (spans)
+# ==========================================
+# Where does the time of a node go? Every tool can wrap its steps in spans:
+#   dns -> tcp -> ssh_kex -> ssh_auth    (TracedSSHClient.connect)
+#   exec                                 (a remote command and its output)
+#   transfer                             (archive streaming / SCP download)
+#   upload                               (Telegram delivery)
+# and one 'node' span around all the work of a node (the row total).
+# Off by default: a disabled span() returns a shared no-op object, so the
+# instrumentation costs one attribute check. Switched on by --trace FILE
+# (scripts), --phase-trace FILE (pytest) or TRACE_FILE in the environment.
+# The spans are written as Chrome-trace JSON (chrome://tracing, Perfetto)
+# with one row per node, and summarised per node and per zone.
+
+PHASES = ("dns", "tcp", "ssh_kex", "ssh_auth", "exec", "transfer", "upload")
+NODE_PHASE = "node"
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "phase", "node", "args", "start")
+
+    def __init__(self, tracer, phase, node, args):
+        self.tracer = tracer
+        self.phase = phase
+        self.node = node
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args = dict(self.args, error=exc_type.__name__)
+        self.tracer.record(self.phase, self.node, self.start, time.perf_counter(), self.args)
+        return False
+
+
+class Tracer:
+    """
+    Collects spans: [phase, node, start, end, thread id, args] with perf_counter
+    times (one clock for all processes of a machine, so xdist workers merge).
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def span(self, phase, node=None, **args):
+        """with TRACER.span("exec", "NL-AMS", cmd="df"): ..."""
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, phase, node, args)
+
+    def record(self, phase, node, start, end, args=None):
+        with self._lock:
+            self.spans.append([phase, node, start, end, threading.get_ident(), args or {}])
+
+    def merge(self, spans):
+        """Adds spans recorded elsewhere (an xdist worker)."""
+        with self._lock:
+            self.spans.extend(list(s) for s in spans)
+
+    def summary(self):
+        """{node: {phase: seconds}} plus 'total' (the node span) and 'other' (total minus the phases)."""
+        nodes = defaultdict(lambda: defaultdict(float))
+        for phase, node, start, end, _, _ in self.spans:
+            nodes[node or "-"]["total" if phase == NODE_PHASE else phase] += end - start
+        for phases in nodes.values():
+            if phases.get("total"):
+                phases["other"] = max(0.0, phases["total"] - sum(phases.get(p, 0.0) for p in PHASES))
+        return {node: dict(phases) for node, phases in nodes.items()}
+
+    def chrome_trace(self):
+        """Chrome trace events ('X' complete events), one thread row per node."""
+        if not self.spans:
+            return {"traceEvents": []}
+        epoch = min(s[2] for s in self.spans)
+        rows = {}
+        events = []
+        for phase, node, start, end, thread, args in sorted(self.spans, key=lambda s: s[2]):
+            row = rows.setdefault(node or f"thread {thread}", len(rows) + 1)
+            events.append({"name": phase, "cat": "node" if phase == NODE_PHASE else "phase", "ph": "X",
+                           "ts": round((start - epoch) * 1e6, 1), "dur": round((end - start) * 1e6, 1),
+                           "pid": 1, "tid": row, "args": args})
+        events += [{"name": "thread_name", "ph": "M", "pid": 1, "tid": row, "args": {"name": name}}
+                   for name, row in rows.items()]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+        return path
+
+    def format_summary(self, zones=None):
+        """Per-node breakdown and per-zone totals with the slowest phase. zones: {node: zone}."""
+        summary = self.summary()
+        if not summary:
+            return "No spans recorded."
+        columns = [p for p in (*PHASES, "other") if any(p in phases for phases in summary.values())]
+        lines = [f"{'node':<18} {'total':>8} " + " ".join(f"{c:>9}" for c in columns)]
+        for node in sorted(summary):
+            phases = summary[node]
+            lines.append(f"{node:<18} {phases.get('total', 0.0):7.2f}s "
+                         + " ".join(f"{phases.get(c, 0.0):8.2f}s" for c in columns))
+
+        by_zone = defaultdict(lambda: defaultdict(float))
+        for node, phases in summary.items():
+            zone = (zones or {}).get(node) or "-"
+            for phase, seconds in phases.items():
+                by_zone[zone][phase] += seconds
+        lines.append("")
+        lines.append(f"{'zone':<18} {'bottleneck':<10} " + " ".join(f"{c:>9}" for c in columns))
+        for zone in sorted(by_zone):
+            phases = by_zone[zone]
+            slowest = max(columns, key=lambda c: phases.get(c, 0.0)) if columns else "-"
+            lines.append(f"{zone:<18} {slowest:<10} " + " ".join(f"{phases.get(c, 0.0):8.2f}s" for c in columns))
+        return "\n".join(lines)
+
+
+TRACER = Tracer()
+span = TRACER.span
+
+
+def enable_tracing(path=None):
+    """Turns tracing on if a trace file is given (or TRACE_FILE is set). Returns the path or None."""
+    path = path or os.getenv("TRACE_FILE")
+    if path:
+        TRACER.enable()
+    return path
+
+
+def finish_tracing(path, zones=None):
+    """Writes the Chrome trace and prints the phase summary (no-op when tracing is off)."""
+    if not path or not TRACER.enabled:
+        return
+    TRACER.write_chrome_trace(path)
+    print("\n⏱️  PHASE TIMINGS")
+    print(TRACER.format_summary(zones))
+    print(f"   Chrome trace: {path} (open in chrome://tracing or ui.perfetto.dev)")
+
+
+class TracedSSHClient(paramiko.SSHClient):
+    """
+    paramiko.SSHClient that splits connect() into dns / tcp / ssh_kex / ssh_auth
+    spans when tracing is on (plain SSHClient behaviour when it is off).
+    Set 'trace_node' to label the spans with the node name instead of the IP.
+    """
+
+    trace_node = None
+    _kex_started = None
+    _label = None
+
+    def connect(self, hostname, port=22, *args, **kwargs):
+        if not TRACER.enabled or args or kwargs.get("sock") is not None:
+            return super().connect(hostname, port, *args, **kwargs)
+        node = self._label = self.trace_node or hostname
+        with TRACER.span("dns", node):
+            address = socket.getaddrinfo(hostname, port, 0, socket.SOCK_STREAM)[0][4]
+        with TRACER.span("tcp", node):
+            try:
+                sock = socket.create_connection(address[:2], kwargs.get("timeout"))
+            except socket.timeout:
+                raise
+            except OSError as e:
+                # Same error as an untraced connect
+                raise paramiko.ssh_exception.NoValidConnectionsError({address[:2]: e})
+        self._kex_started = time.perf_counter()
+        try:
+            return super().connect(hostname, port, sock=sock, **kwargs)
+        except Exception:
+            sock.close()
+            raise
+
+    def _auth(self, *args, **kwargs):
+        node = self._label or self.trace_node
+        if self._kex_started is not None:
+            # The transport is negotiated (banner + key exchange) when paramiko starts the auth
+            TRACER.record("ssh_kex", node, self._kex_started, time.perf_counter())
+            self._kex_started = None
+        with TRACER.span("ssh_auth", node):
+            return super()._auth(*args, **kwargs)
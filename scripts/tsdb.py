@@ -0,0 +1,353 @@
+import os
+import sys
+import time
+import zlib
+import sqlite3
+import argparse
+import threading
+from array import array
+
+# ==========================================
+# 📈 Compact Time-Series Store
+# ==========================================
+# Keeps every metric the monitor computes (disk %, RAM %, RTT, loss, port and
+# service state) in ONE local SQLite file.
+# - Points are buffered per series in small arrays and written as compressed
+#   blocks (delta-encoded timestamps + float64 values, zlib), not row by row.
+# - Old data is downsampled: raw -> 1 min -> 1 hour. A rollup point keeps
+#   mean/min/max/count of its bucket, so months of data stay small.
+# - Queries read only the blocks that overlap the time range.
+# Memory use is fixed: at most BLOCK_POINTS buffered points per series.
+
+DEFAULT_DB = os.getenv("MONITOR_DB", "")
+BLOCK_POINTS = 256
+# A buffer is flushed to disk when it is full or older than this (crash safety)
+FLUSH_SECONDS = 60
+# resolution (seconds, 0 = raw) -> how long it is kept before it is rolled up / deleted
+RETENTION = {
+    0: 2 * 86400,         # raw: 2 days
+    60: 30 * 86400,       # 1 min: 30 days
+    3600: 730 * 86400,    # 1 hour: 2 years
+}
+RESOLUTIONS = sorted(RETENTION)
+# How often the daemon sink runs the downsampling pass
+COMPACT_EVERY = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    node TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    UNIQUE (node, metric)
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    series_id INTEGER NOT NULL,
+    resolution INTEGER NOT NULL,
+    start_ms INTEGER NOT NULL,
+    end_ms INTEGER NOT NULL,
+    points INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blocks_range ON blocks (series_id, resolution, end_ms, start_ms);
+"""
+
+
+# --- block encoding ---
+def encode_block(ts_ms, columns):
+    """ts_ms: array('q'); columns: list of array('d') of the same length."""
+    deltas = array("q", [ts_ms[0]] + [b - a for a, b in zip(ts_ms, ts_ms[1:])])
+    payload = bytes([len(columns)]) + len(ts_ms).to_bytes(4, "little") + deltas.tobytes()
+    for column in columns:
+        payload += column.tobytes()
+    return zlib.compress(payload, 6)
+
+
+def decode_block(blob):
+    payload = zlib.decompress(blob)
+    n_columns, count = payload[0], int.from_bytes(payload[1:5], "little")
+    offset = 5
+    deltas = array("q")
+    deltas.frombytes(payload[offset:offset + count * 8])
+    offset += count * 8
+    ts_ms, total = array("q"), 0
+    for delta in deltas:
+        total += delta
+        ts_ms.append(total)
+    columns = []
+    for _ in range(n_columns):
+        column = array("d")
+        column.frombytes(payload[offset:offset + count * 8])
+        offset += count * 8
+        columns.append(column)
+    return ts_ms, columns
+
+
+def weighted_percentile(points, q):
+    """points: [(value, weight)] -> q-th percentile (0..100). Rollup means are weighted by their count."""
+    if not points:
+        return None
+    points = sorted(points)
+    total = sum(w for _, w in points)
+    target = total * q / 100.0
+    running = 0.0
+    for value, weight in points:
+        running += weight
+        if running >= target:
+            return value
+    return points[-1][0]
+
+
+class TimeSeriesStore:
+
+    def __init__(self, path, block_points=BLOCK_POINTS):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.block_points = block_points
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(_SCHEMA)
+        self.lock = threading.RLock()
+        self._series_ids = {}
+        self._buffers = {}   # series_id -> (array ts_ms, array values, first buffered at)
+
+    # --- writing ---
+    def series_id(self, node, metric):
+        key = (node, metric)
+        if key not in self._series_ids:
+            with self.lock:
+                self.db.execute("INSERT OR IGNORE INTO series (node, metric) VALUES (?, ?)", key)
+                row = self.db.execute("SELECT id FROM series WHERE node = ? AND metric = ?", key).fetchone()
+                self._series_ids[key] = row[0]
+        return self._series_ids[key]
+
+    def append(self, node, metric, value, timestamp=None):
+        if value is None:
+            return
+        sid = self.series_id(node, metric)
+        ts_ms = int((timestamp if timestamp is not None else time.time()) * 1000)
+        with self.lock:
+            ts, values, since = self._buffers.setdefault(sid, (array("q"), array("d"), time.monotonic()))
+            ts.append(ts_ms)
+            values.append(float(value))
+            if len(ts) >= self.block_points or time.monotonic() - since > FLUSH_SECONDS:
+                self._flush_series(sid)
+
+    def _flush_series(self, sid):
+        ts, values, _ = self._buffers.pop(sid)
+        if not ts:
+            return
+        order = sorted(range(len(ts)), key=ts.__getitem__)
+        ts = array("q", (ts[i] for i in order))
+        values = array("d", (values[i] for i in order))
+        self.db.execute("INSERT INTO blocks VALUES (?, 0, ?, ?, ?, ?)",
+                        (sid, ts[0], ts[-1], len(ts), encode_block(ts, [values])))
+        self.db.commit()
+
+    def flush(self):
+        with self.lock:
+            for sid in list(self._buffers):
+                self._flush_series(sid)
+
+    # --- reading ---
+    def points(self, node, metric, start=None, end=None):
+        """
+        Yields (timestamp_s, value, min, max, weight) in the range from all resolutions.
+        Raw points have weight 1 and min = max = value.
+        """
+        key = (node, metric)
+        if key not in self._series_ids:
+            row = self.db.execute("SELECT id FROM series WHERE node = ? AND metric = ?", key).fetchone()
+            if row is None:
+                return
+            self._series_ids[key] = row[0]
+        sid = self._series_ids[key]
+        start_ms = int(start * 1000) if start is not None else -2 ** 62
+        end_ms = int(end * 1000) if end is not None else 2 ** 62
+
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT resolution, data FROM blocks WHERE series_id = ? AND end_ms >= ? AND start_ms <= ? "
+                "ORDER BY start_ms", (sid, start_ms, end_ms)).fetchall()
+            buffered = self._buffers.get(sid)
+            if buffered:
+                rows.append((0, encode_block(buffered[0], [buffered[1]])))
+
+        for resolution, blob in rows:
+            ts_ms, columns = decode_block(blob)
+            for i, t in enumerate(ts_ms):
+                if start_ms <= t <= end_ms:
+                    if resolution == 0:
+                        v = columns[0][i]
+                        yield t / 1000, v, v, v, 1.0
+                    else:
+                        yield t / 1000, columns[0][i], columns[1][i], columns[2][i], columns[3][i]
+
+    def percentiles(self, node, metric, qs=(50, 95), start=None, end=None):
+        data = [(v, w) for _, v, _, _, w in self.points(node, metric, start, end)]
+        return {q: weighted_percentile(data, q) for q in qs}
+
+    def rate(self, node, metric, start=None, end=None, per=86400):
+        """Least-squares slope of the metric, in units per 'per' seconds (default: per day)."""
+        data = [(t, v, w) for t, v, _, _, w in self.points(node, metric, start, end)]
+        total = sum(w for _, _, w in data)
+        if len(data) < 2 or total <= 0:
+            return None
+        mean_t = sum(t * w for t, _, w in data) / total
+        mean_v = sum(v * w for _, v, w in data) / total
+        var = sum(w * (t - mean_t) ** 2 for t, _, w in data)
+        if var == 0:
+            return None
+        cov = sum(w * (t - mean_t) * (v - mean_v) for t, v, w in data)
+        return cov / var * per
+
+    def series(self):
+        return self.db.execute("SELECT node, metric FROM series ORDER BY node, metric").fetchall()
+
+    # --- downsampling ---
+    def compact(self, now=None):
+        """
+        Rolls up data older than its retention into the next resolution and deletes it.
+        Cutoffs are aligned to the target bucket, so a bucket is never split in two.
+        Returns the number of points that were rolled up or dropped.
+        """
+        now = now if now is not None else time.time()
+        self.flush()
+        moved = 0
+        with self.lock:
+            for level, resolution in enumerate(RESOLUTIONS):
+                target = RESOLUTIONS[level + 1] if level + 1 < len(RESOLUTIONS) else None
+                cutoff_s = now - RETENTION[resolution]
+                if target:
+                    cutoff_s -= cutoff_s % target
+                cutoff_ms = int(cutoff_s * 1000)
+                for (sid,) in self.db.execute(
+                        "SELECT DISTINCT series_id FROM blocks WHERE resolution = ? AND start_ms < ?",
+                        (resolution, cutoff_ms)).fetchall():
+                    moved += self._compact_series(sid, resolution, target, cutoff_ms)
+            self.db.commit()
+        return moved
+
+    def _compact_series(self, sid, resolution, target, cutoff_ms):
+        rows = self.db.execute(
+            "SELECT rowid, data FROM blocks WHERE series_id = ? AND resolution = ? AND start_ms < ?",
+            (sid, resolution, cutoff_ms)).fetchall()
+        buckets = {}
+        keep_ts, keep_cols = array("q"), None
+        moved = 0
+        for rowid, blob in rows:
+            ts_ms, columns = decode_block(blob)
+            if resolution == 0:
+                columns = [columns[0], columns[0], columns[0], array("d", [1.0] * len(ts_ms))]
+            if keep_cols is None:
+                keep_cols = [array("d") for _ in columns]
+            for i, t in enumerate(ts_ms):
+                if t >= cutoff_ms:
+                    keep_ts.append(t)
+                    for col, src in zip(keep_cols, columns):
+                        col.append(src[i])
+                    continue
+                moved += 1
+                if target is None:
+                    continue  # coarsest level: past retention, dropped
+                bucket = t - t % (target * 1000)
+                mean, lo, hi, count = (c[i] for c in columns)
+                b = buckets.setdefault(bucket, [0.0, lo, hi, 0.0])
+                b[0] += mean * count
+                b[1] = min(b[1], lo)
+                b[2] = max(b[2], hi)
+                b[3] += count
+            self.db.execute("DELETE FROM blocks WHERE rowid = ?", (rowid,))
+
+        if keep_ts:
+            # The part of a straddling block that is still fresh goes back as it was
+            cols = [keep_cols[0]] if resolution == 0 else keep_cols
+            self.db.execute("INSERT INTO blocks VALUES (?, ?, ?, ?, ?, ?)",
+                            (sid, resolution, min(keep_ts), max(keep_ts), len(keep_ts),
+                             encode_block(keep_ts, cols)))
+        if buckets:
+            keys = sorted(buckets)
+            ts = array("q", keys)
+            cols = [array("d", (buckets[k][0] / buckets[k][3] for k in keys)),
+                    array("d", (buckets[k][1] for k in keys)),
+                    array("d", (buckets[k][2] for k in keys)),
+                    array("d", (buckets[k][3] for k in keys))]
+            for i in range(0, len(ts), self.block_points):
+                chunk = slice(i, i + self.block_points)
+                self.db.execute("INSERT INTO blocks VALUES (?, ?, ?, ?, ?, ?)",
+                                (sid, target, ts[chunk][0], ts[chunk][-1], len(ts[chunk]),
+                                 encode_block(ts[chunk], [c[chunk] for c in cols])))
+        return moved
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+
+class TSDBSink:
+    """MonitorDaemon sink: turns every check result into time-series points and downsamples once an hour."""
+
+    def __init__(self, store, compact_every=COMPACT_EVERY):
+        self.store = store
+        self.compact_every = compact_every
+        self.last_compact = time.monotonic()
+
+    def handle(self, node, kind, result, rows, timestamp):
+        for metric, value in flatten_result(kind, result):
+            self.store.append(node, metric, value, timestamp)
+        if time.monotonic() - self.last_compact >= self.compact_every:
+            self.last_compact = time.monotonic()
+            self.store.compact()
+
+
+def flatten_result(kind, result):
+    """(metric, value) pairs of one check result. Booleans become 1/0."""
+    if kind == "reachability":
+        yield "reachable", 1.0 if result["received"] else 0.0
+        yield "loss", result["loss"]
+        yield "rtt_avg", result["avg"]
+        yield "jitter", result["jitter"]
+    elif kind == "ports":
+        for r in result:
+            yield f"port.{r['name']}.up", 1.0 if r["status"] == "open" else 0.0
+            yield f"port.{r['name']}.connect_ms", r["connect_ms"]
+            yield f"port.{r['name']}.tls_ms", r["tls_ms"]
+    elif kind == "metrics":
+        yield "ssh_ok", 0.0 if "error" in result else 1.0
+        if "error" not in result:
+            yield "disk_used", result.get("disk_used")
+            yield "mem_used", result.get("mem_used")
+            yield "load1", result.get("load1")
+            for label, is_up in result.get("services", []):
+                yield f"service.{label}", 1.0 if is_up else 0.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the monitor time-series store")
+    parser.add_argument("db", help="Path to the SQLite file (MONITOR_DB)")
+    parser.add_argument("command", choices=["series", "percentile", "rate", "compact"])
+    parser.add_argument("--node")
+    parser.add_argument("--metric")
+    parser.add_argument("--days", type=float, default=7)
+    parser.add_argument("--q", default="50,95", help="Percentiles, e.g. 50,95,99")
+    args = parser.parse_args(argv)
+
+    store = TimeSeriesStore(args.db)
+    start = time.time() - args.days * 86400
+    if args.command == "series":
+        for node, metric in store.series():
+            print(f"{node:<18} {metric}")
+    elif args.command == "percentile":
+        result = store.percentiles(args.node, args.metric, [float(q) for q in args.q.split(",")], start)
+        for q, value in result.items():
+            print(f"p{q:g} {args.metric} @ {args.node} ({args.days:g}d): {value if value is not None else 'n/a'}")
+    elif args.command == "rate":
+        value = store.rate(args.node, args.metric, start)
+        print(f"{args.metric} @ {args.node}: {value:+.3f} per day" if value is not None else "n/a")
+    else:
+        print(f"🗜️ Rolled up {store.compact()} points")
+    store.close()
+
+
+if __name__ == "__main__":
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    main()
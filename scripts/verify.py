@@ -0,0 +1,184 @@
+import os
+import gzip
+import hashlib
+import tarfile
+import threading
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+# ==========================================
+# 🔎 Archive Verification
+# ==========================================
+# A truncated download is a valid-looking file until the day it is needed.
+# Each archive is read ONCE, as a stream, nothing is extracted to disk:
+#   file -> sha256 -> decompressor (gzip CRC / zstd checksum) -> tar member headers
+# The archive passes when the compression stream ends cleanly, every member
+# is complete, every path recorded at backup time has members, and the sha256
+# matches the one recorded while downloading (when there is one).
+# Archives are verified in parallel, one process per core; each holds only
+# VERIFY_CHUNK_SIZE bytes plus one tar block at a time. Results go back to the
+# catalog with the file size+mtime, so an unchanged archive is not read again.
+
+VERIFY_CHUNK_SIZE = 1024 * 1024
+
+
+class VerifyError(Exception):
+    pass
+
+
+class _HashingReader:
+    """File-like wrapper that hashes everything read through it."""
+
+    def __init__(self, f):
+        self.f = f
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.f.read(size if size and size > 0 else VERIFY_CHUNK_SIZE)
+        self.digest.update(data)
+        return data
+
+    def drain(self):
+        while self.read(VERIFY_CHUNK_SIZE):
+            pass
+
+
+def codec_of(path):
+    if path.endswith(".tar.zst"):
+        return "zstd"
+    if path.endswith((".tar.gz", ".tgz")):
+        return "gzip"
+    return "none"
+
+
+def _read_members(stream, recorded_paths):
+    """Walks the tar stream (the data of every member is read and dropped). Returns (members, missing paths)."""
+    prefixes = {p.strip("/"): False for p in recorded_paths or () if p.strip("/")}
+    members = 0
+    with tarfile.open(fileobj=stream, mode="r|") as archive:
+        for member in archive:
+            members += 1
+            name = member.name[2:] if member.name.startswith("./") else member.name
+            name = name.strip("/")
+            for prefix in prefixes:
+                if name == prefix or name.startswith(prefix + "/"):
+                    prefixes[prefix] = True
+    missing = ["/" + p for p, seen in prefixes.items() if not seen]
+    return members, missing
+
+
+def _zstd_members(reader, recorded_paths):
+    """zstd has no stdlib module: the zstd binary decompresses, a thread feeds it the (hashed) file."""
+    proc = subprocess.Popen(["zstd", "-dcq"], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+
+    def feed():
+        try:
+            while True:
+                chunk = reader.read(VERIFY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                proc.stdin.write(chunk)
+        except (BrokenPipeError, ValueError):
+            reader.drain()
+        finally:
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    failed = False
+    try:
+        members, missing = _read_members(proc.stdout, recorded_paths)
+        while proc.stdout.read(VERIFY_CHUNK_SIZE):
+            pass
+    except BaseException:
+        # Nobody reads zstd's output any more: without the kill zstd blocks on
+        # the full pipe, the feeder blocks on stdin and join() never returns
+        failed = True
+        proc.kill()
+        raise
+    finally:
+        feeder.join()
+        error = proc.stderr.read().decode(errors="replace").strip()
+        proc.stdout.close()
+        proc.stderr.close()
+        if proc.wait() != 0 and not failed:
+            raise VerifyError(f"zstd: {error or 'corrupt stream'}")
+    return members, missing
+
+
+def verify_archive(path, recorded_paths=(), expected_sha256=None):
+    """
+    Checks one archive. Never raises: returns
+    {'ok', 'sha256', 'members', 'size', 'mtime', 'error'}.
+    """
+    result = {"ok": False, "sha256": None, "members": 0, "size": None, "mtime": None, "error": None}
+    try:
+        stat = os.stat(path)
+        result.update(size=stat.st_size, mtime=stat.st_mtime)
+        with open(path, "rb") as f:
+            reader = _HashingReader(f)
+            codec = codec_of(path)
+            if codec == "zstd":
+                members, missing = _zstd_members(reader, recorded_paths)
+            elif codec == "gzip":
+                with gzip.GzipFile(fileobj=reader, mode="rb") as gz:
+                    members, missing = _read_members(gz, recorded_paths)
+                    # Up to the end: GzipFile checks the CRC and length there
+                    while gz.read(VERIFY_CHUNK_SIZE):
+                        pass
+            else:
+                members, missing = _read_members(reader, recorded_paths)
+            reader.drain()
+        result.update(sha256=reader.digest.hexdigest(), members=members)
+        if expected_sha256 and result["sha256"] != expected_sha256:
+            raise VerifyError(f"sha256 mismatch (recorded {expected_sha256[:12]}…)")
+        if not members:
+            raise VerifyError("archive is empty")
+        if missing:
+            raise VerifyError(f"no members for {', '.join(missing)}")
+        result["ok"] = True
+    except (OSError, EOFError, tarfile.TarError, gzip.BadGzipFile, VerifyError) as e:
+        result["error"] = str(e) or type(e).__name__
+    return result
+
+
+def _verify_row(row):
+    return row["id"], verify_archive(row["path"], row["paths"], row["sha256"])
+
+
+def is_unchanged(row):
+    """Already checked and the file still has the same size and mtime."""
+    if row.get("checked_at") is None:
+        return False
+    try:
+        stat = os.stat(row["path"])
+    except OSError:
+        return False
+    return stat.st_size == row["checked_size"] and stat.st_mtime == row["checked_mtime"]
+
+
+def verify_catalog(catalog, nodes=None, workers=None, force=False, on_result=None):
+    """
+    Verifies the catalog's archives (of 'nodes', all by default) in parallel processes
+    and writes every result back. Unchanged, already checked archives are skipped
+    unless force=True. Returns [(row, result)] of the archives that were read.
+    """
+    rows = [r for r in catalog.archives() if nodes is None or r["node"] in nodes]
+    todo = [r for r in rows if force or not is_unchanged(r)]
+    if not todo:
+        return []
+    by_id = {r["id"]: r for r in todo}
+    done = []
+    workers = max(1, min(workers or os.cpu_count() or 1, len(todo)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Results are small dicts, written back in order as they arrive
+        for archive_id, result in pool.map(_verify_row, todo, chunksize=4):
+            catalog.record_verification(archive_id, result)
+            done.append((by_id[archive_id], result))
+            if on_result:
+                on_result(by_id[archive_id], result)
+    return done
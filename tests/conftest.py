@@ -1,8 +1,13 @@
 import pytest
-import testinfra
-import urllib.parse
 import os
 import sys
+import json
+import threading
+import urllib.parse
+from collections import Counter
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from allure_commons import plugin_manager
 from allure_commons import hookimpl
 
@@ -10,30 +15,376 @@ from allure_commons import hookimpl
 # We need this to import SERVERS from inventory.py without errors.
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from testinfra.backend.paramiko import ParamikoBackend
+from testinfra.host import Host
+from scripts.ssh_pool import SSHPool
+from scripts.facts import FactsCache
+from scripts.compliance import NodeCompliance
+from scripts.tracing import TRACER, span
+
+# The session pool is kept here so the terminal summary can read its counters
+SSH_POOL_KEY = pytest.StashKey[SSHPool]()
+FACTS_CACHE_KEY = pytest.StashKey[FactsCache]()
+# Counters sent by xdist workers, merged on the controller
+WORKER_STATS_KEY = pytest.StashKey[dict]()
+
+
+class PooledParamikoBackend(ParamikoBackend):
+    """
+    Testinfra paramiko backend that borrows its SSH client from the session pool.
+    Testinfra drops a dead client with 'del self.client' and reconnects (once):
+    the deleter sends that request to the pool, so the reconnect is counted too.
+    """
+
+    def __init__(self, pool, name, ip, user, **kwargs):
+        super().__init__(f"{user}@{ip}", **kwargs)
+        self.pool = pool
+        self.node_name = name
+
+    @property
+    def client(self):
+        return self.pool.get(self.node_name)
+
+    @client.deleter
+    def client(self):
+        self.pool.drop(self.node_name)
+
+    def run_command(self, command, *args, **kwargs):
+        with span("exec", self.node_name, cmd=command[:80]):
+            return super().run_command(command, *args, **kwargs)
+
+
+@pytest.fixture(scope="session")
+def ssh_pool(request):
+    """
+    One SSH transport per node for the whole pytest session.
+    Keepalives hold the idle sessions open, dead transports are reconnected
+    on the next command, and everything is closed when the session ends.
+    """
+    pool = SSHPool()
+    request.config.stash[SSH_POOL_KEY] = pool
+    yield pool
+    pool.close()
+
+
+@pytest.fixture(scope="session")
+def pooled_host(ssh_pool):
+    """
+    Factory fixture: returns the same Testinfra host for a node every time.
+    Usage: host = pooled_host(name, ip, user, password)
+    """
+    hosts = {}
+
+    def factory(name, ip, user, password, sudo=False):
+        key = (name, sudo)
+        if key not in hosts:
+            from inventory import INVENTORY
+            node = INVENTORY.get(name)
+            ssh_pool.register(name, ip, user, password, port=node.ssh_port if node else 22)
+            backend = PooledParamikoBackend(ssh_pool, name, ip, user, sudo=sudo)
+            host = Host(backend)
+            backend.set_host(host)
+            # We add the server name to the host object.
+            # This helps us print beautiful and clear error messages later.
+            host.node_name = name
+            hosts[key] = host
+        return hosts[key]
+
+    return factory
+
+
+@pytest.fixture(scope="session")
+def facts_cache(request):
+    """Remote facts (OS, packages, services) of every node, gathered once per session."""
+    cache = FactsCache()
+    request.config.stash[FACTS_CACHE_KEY] = cache
+    return cache
+
+
+@pytest.fixture(scope="session")
+def node_facts(facts_cache):
+    """
+    Factory fixture: cached facts of the node behind a Testinfra host.
+    Usage: facts = node_facts(host); facts.distribution, facts.package("fail2ban")["is_installed"]
+    After changing the node call facts.invalidate(packages=[...], services=[...]).
+    """
+    def factory(host):
+        return facts_cache.node(host.node_name, host.run)
+
+    return factory
+
+
+@pytest.fixture(scope="session")
+def compliance(request, node_facts):
+    """
+    Factory fixture: security policy results of the node behind a Testinfra host.
+    The whole policy is probed once per node, backend (sudo or not) and session;
+    every test then reads its rule. Failed rules are repaired first (self-healing),
+    unless pytest runs with --check-only.
+    Usage: result = compliance(host)["ufw_active"]; result["passed"], result["value"]
+    """
+    reports = {}
+    converge = not request.config.getoption("check_only")
+
+    def factory(host):
+        # 'ufw status' and 'sshd -T' answer differently without sudo
+        key = (host.node_name, bool(host.backend.sudo))
+        if key not in reports:
+            # testinfra already wraps commands in sudo for non-root users
+            engine = NodeCompliance(host.run, facts=node_facts(host))
+            reports[key] = engine.converge() if converge else engine.check()
+        return reports[key]
+
+    return factory
+
+
 @pytest.fixture(scope="function")
-def remote_host(request):
+def remote_host(request, pooled_host):
     """
     Core SSH connection fixture for all tests.
-    It takes server data, safely encodes passwords, and creates a connection.
+    It takes server data and returns a host that runs over the pooled connection.
     """
     name, ip, user, password = request.param
-    # SAFE ENCODING: We use urllib to encode special characters in the password.
-    # For example, if a password has '@' or '/', it will not break the SSH URL.
-    safe_password = urllib.parse.quote_plus(password) if password else ""
-    # We added ?timeout=20 to give slow servers more time to respond
-    #connection_string = f"paramiko://{user}:{safe_password}@{ip}?timeout=20&look_for_keys=false"
-    connection_string = f"paramiko://{user}:{safe_password}@{ip}?timeout=20&look_for_keys=false&allow_agent=false"
     # SMART LOGIC: Check if we need 'sudo'.
     # If the user is 'root', we do not need sudo. Otherwise, we enable it.
     use_sudo = (user != 'root')
+    return pooled_host(name, ip, user, password, sudo=use_sudo)
+
+
+# ==========================================
+# ⚡ Node-affinity parallel mode (pytest-xdist)
+# ==========================================
+# 'pytest -n auto' starts one worker per node and sends ALL tests of a node
+# to the same worker (--dist loadgroup + an xdist_group mark per node):
+# the tests of a node keep their order and share one SSH session, different
+# nodes run at the same time. Tests without a node go to any free worker.
+# Workers send their SSH/facts counters to the controller for the summary.
+
+def node_of(item):
+    """Node name of a test parametrised over SERVERS (remote_host or name/ip/user/password), else None."""
+    params = getattr(getattr(item, "callspec", None), "params", {})
+    # Empty SERVERS parametrise with a NOTSET placeholder: no node then
+    value = params.get("remote_host", params.get("name"))
+    if isinstance(value, (tuple, list)):
+        value = value[0] if value else None
+    return value if isinstance(value, str) else None
+
+
+def _use_node_affinity(config):
+    """'-n' without an explicit --dist means node affinity, not plain load balancing."""
+    workerinput = getattr(config, "workerinput", None)
+    if workerinput is not None:
+        # Workers re-parse the raw command line, so the controller tells them
+        config.option.loadgroup = workerinput.get("node_affinity", config.option.loadgroup)
+        return
+    explicit = any(arg.startswith("--dist") for arg in config.invocation_params.args)
+    if getattr(config.option, "numprocesses", None) and config.option.dist == "load" and not explicit:
+        config.option.dist = "loadgroup"
 
-    # Create the Testinfra host object
-    host = testinfra.get_host(connection_string, sudo=use_sudo)
 
-    # We add the server name to the host object.
-    # This helps us print beautiful and clear error messages later.
-    host.node_name = name
-    return host
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    node.workerinput["node_affinity"] = node.config.option.dist == "loadgroup"
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_xdist_auto_num_workers(config):
+    """'-n auto' = one worker per selected node (None lets xdist use the CPU count)."""
+    from inventory import select
+    return len(select(config.getoption("nodes"))) or None
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_collection_modifyitems(config, items):
+    # tryfirst: xdist turns the mark into a '@group' node id suffix right after this
+    for item in items:
+        node = node_of(item)
+        if node is not None:
+            item.add_marker(pytest.mark.xdist_group(name=node))
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    """With --phase-trace: one 'node' span per node test (the row total of the phase summary)."""
+    node = node_of(item) if TRACER.enabled else None
+    if node is None:
+        yield
+        return
+    with span("node", node, task=item.name):
+        yield
+
+
+@pytest.fixture(scope="session", autouse=True)
+def phase_timings():
+    """With --phase-trace: attaches the phase summary of this process to the Allure report."""
+    yield
+    if TRACER.enabled and TRACER.spans:
+        import allure
+        allure.attach(TRACER.format_summary(_zones()), name="Phase timings",
+                      attachment_type=allure.attachment_type.TEXT)
+
+
+def _zones():
+    from inventory import INVENTORY
+    return {node.name: node.zone for node in INVENTORY}
+
+
+def pytest_sessionfinish(session):
+    """On an xdist worker: hand the counters over to the controller. On the controller: write the trace."""
+    workeroutput = getattr(session.config, "workeroutput", None)
+    if workeroutput is None:
+        trace_file = session.config.getoption("phase_trace")
+        if trace_file and TRACER.enabled:
+            TRACER.write_chrome_trace(trace_file)
+        return
+    pool = session.config.stash.get(SSH_POOL_KEY, None)
+    cache = session.config.stash.get(FACTS_CACHE_KEY, None)
+    workeroutput["ssh_connects"] = dict(pool.connects) if pool else {}
+    workeroutput["facts_stats"] = {name: dict(c) for name, c in cache.stats.items()} if cache else {}
+    workeroutput["trace_spans"] = TRACER.spans
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    """On the controller: merge the counters of a finished worker."""
+    output = getattr(node, "workeroutput", {})
+    stats = node.config.stash.setdefault(WORKER_STATS_KEY, {"ssh_connects": Counter(), "facts_stats": {}})
+    stats["ssh_connects"].update(output.get("ssh_connects", {}))
+    for name, counter in output.get("facts_stats", {}).items():
+        stats["facts_stats"].setdefault(name, Counter()).update(counter)
+    TRACER.merge(output.get("trace_spans", []))
+
+
+def _session_stats(config):
+    """SSH connects and facts hit/miss counters of this process plus all xdist workers."""
+    workers = config.stash.get(WORKER_STATS_KEY, {"ssh_connects": Counter(), "facts_stats": {}})
+    connects = Counter(workers["ssh_connects"])
+    facts = {name: Counter(c) for name, c in workers["facts_stats"].items()}
+    pool = config.stash.get(SSH_POOL_KEY, None)
+    if pool is not None:
+        connects.update(pool.connects)
+    cache = config.stash.get(FACTS_CACHE_KEY, None)
+    if cache is not None:
+        for name, counter in cache.stats.items():
+            facts.setdefault(name, Counter()).update(counter)
+    return connects, facts
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    connects, facts = _session_stats(config)
+    _print_pool_summary(terminalreporter, connects)
+    _print_facts_summary(terminalreporter, facts)
+    if TRACER.enabled and TRACER.spans:
+        terminalreporter.section("Phase timings")
+        for line in TRACER.format_summary(_zones()).splitlines():
+            terminalreporter.write_line(line)
+        if config.getoption("phase_trace"):
+            terminalreporter.write_line(f"⏱️ Chrome trace: {config.getoption('phase_trace')}")
+
+
+def _print_pool_summary(terminalreporter, connects):
+    """Prints how many real SSH handshakes the run needed (ideally one per node)."""
+    if not connects:
+        return
+    terminalreporter.section("SSH connection pool")
+    for name, count in sorted(connects.items()):
+        terminalreporter.write_line(f"🔌 {name:<18}: {count} connect(s)")
+    terminalreporter.write_line(f"🔌 {'TOTAL':<18}: {sum(connects.values())} connect(s)")
+
+
+def _print_facts_summary(terminalreporter, facts):
+    """Hit/miss ratio of the remote facts cache (a miss = one SSH round trip)."""
+    if not facts:
+        return
+    terminalreporter.section("Remote facts cache")
+    total = Counter()
+    for counter in facts.values():
+        total.update(counter)
+    for name, counter in sorted(facts.items()) + [("TOTAL", total)]:
+        lookups = counter["hits"] + counter["misses"]
+        ratio = counter["hits"] / lookups if lookups else 0.0
+        terminalreporter.write_line(f"🧠 {name:<18}: {counter['hits']} hit(s), {counter['misses']} miss(es) "
+                                    f"({ratio:.0%} from memory)")
+
+
+class FakeBotAPI:
+    """
+    Local stand-in for api.telegram.org (http://127.0.0.1:<port>/bot<token>/<method>).
+    - 'calls' records every request: method, form fields and uploaded file bytes.
+    - 'script' is a queue of forced answers, e.g. [(429, {"retry_after": 1}), (500, None)],
+      used before the normal 200 OK answers.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.script = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+
+    def ok_calls(self, method=None):
+        return [c for c in self.calls if c["status"] == 200 and (method is None or c["method"] == method)]
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                fields, files = api._parse(self.headers.get("Content-Type", ""), body)
+                method = self.path.rsplit("/", 1)[-1]
+                with api.lock:
+                    status, params = api.script.pop(0) if api.script else (200, None)
+                    api.calls.append({"method": method, "fields": fields, "files": files, "status": status,
+                                      "connection": self.client_address})
+                if status == 200:
+                    answer = {"ok": True, "result": {"message_id": len(api.calls)}}
+                else:
+                    answer = {"ok": False, "error_code": status, "description": f"Stub error {status}"}
+                    if params:
+                        answer["parameters"] = params
+                raw = json.dumps(answer).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+        return Handler
+
+    @staticmethod
+    def _parse(content_type, body):
+        if content_type.startswith("multipart/form-data"):
+            message = BytesParser(policy=HTTP).parsebytes(
+                b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body)
+            fields, files = {}, {}
+            for part in message.iter_parts():
+                name = part.get_param("name", header="content-disposition")
+                if part.get_filename():
+                    files[name] = (part.get_filename(), part.get_payload(decode=True))
+                else:
+                    fields[name] = part.get_payload(decode=True).decode()
+            return fields, files
+        if content_type.startswith("application/json"):
+            return json.loads(body or b"{}"), {}
+        return dict(urllib.parse.parse_qsl(body.decode())), {}
+
+
+@pytest.fixture
+def bot_api():
+    """Runs a FakeBotAPI on a free loopback port for one test."""
+    api = FakeBotAPI()
+    api.thread.start()
+    yield api
+    api.server.shutdown()
+    api.server.server_close()
+
 
 class AllureSanitizer:
     """
@@ -52,10 +403,28 @@ class AllureSanitizer:
                     param.value = "'***'"
                     param.mode = "masked"
 
+
+def pytest_addoption(parser):
+    parser.addoption("--nodes", default="", metavar="SELECTOR",
+                     help="Run only against matching nodes, e.g. --nodes zone=RU or --nodes service=outline")
+    parser.addoption("--check-only", action="store_true",
+                     help="Security tests only report failed rules instead of repairing them (install, enable, restart)")
+    parser.addoption("--phase-trace", default=os.getenv("TRACE_FILE"), metavar="FILE",
+                     help="Time connect/auth/exec per node and write a Chrome trace (env: TRACE_FILE)")
+
+
 def pytest_configure(config):
     """
     This function runs automatically when Pytest starts.
-    It turns on our AllureSanitizer to protect the test reports.
+    It turns on our AllureSanitizer to protect the test reports
+    (in xdist mode this runs in the controller and in every worker).
     """
+    _use_node_affinity(config)
+    if config.getoption("phase_trace"):
+        TRACER.enable()
+    if config.getoption("nodes"):
+        # Before collection: test modules parametrise over the narrowed SERVERS
+        from inventory import restrict
+        restrict(config.getoption("nodes"))
     if config.pluginmanager.getplugin("allure_pytest"):
         plugin_manager.register(AllureSanitizer(), name="allure_sanitizer")
\ No newline at end of file
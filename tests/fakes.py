@@ -0,0 +1,33 @@
+"""Test doubles shared by several test modules (import with 'from fakes import ...')."""
+
+
+class FakeTransport:
+    def __init__(self):
+        self.active = True
+        self.keepalive = None
+
+    def is_active(self):
+        return self.active
+
+    def set_keepalive(self, interval):
+        self.keepalive = interval
+
+
+class FakeClient:
+    """Stands in for paramiko.SSHClient: 'connects' instantly, no network."""
+
+    def __init__(self):
+        self.transport = None
+
+    def set_missing_host_key_policy(self, policy):
+        pass
+
+    def connect(self, hostname, **kwargs):
+        self.transport = FakeTransport()
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        if self.transport:
+            self.transport.active = False
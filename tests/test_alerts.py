@@ -0,0 +1,139 @@
+import time
+import pytest
+from scripts.alerts import AlertDispatcher, AlertSink, ChatRateLimit, format_digest, Alert
+from scripts.telegram_delivery import TelegramDelivery
+
+FAIL = [("SSH", "Timeout", "fail")]
+OK = [("SSH", "Connected", "ok")]
+
+
+@pytest.fixture
+def make_dispatcher(bot_api):
+    dispatchers = []
+
+    def make(window=0.3, per_second=20, per_minute=100, **kwargs):
+        delivery = TelegramDelivery("TOKEN", "42", api_url=bot_api.url, sleep=lambda s: None)
+        dispatcher = AlertDispatcher(delivery, window=window,
+                                     rate_limit=ChatRateLimit(per_second, per_minute), **kwargs)
+        dispatchers.append(dispatcher)
+        return dispatcher
+    yield make
+    for dispatcher in dispatchers:
+        dispatcher.close()
+
+
+def texts(bot_api):
+    return [c["fields"]["text"] for c in bot_api.ok_calls("sendMessage")]
+
+
+def test_only_transitions_are_alerted(bot_api, make_dispatcher):
+    dispatcher = make_dispatcher(window=0.05)
+    sink = AlertSink(dispatcher)
+
+    sink.handle("NL-AMS", "metrics", {}, OK, 1)        # first check ok: quiet
+    for _ in range(5):
+        sink.handle("NL-AMS", "metrics", {}, FAIL, 2)  # one failure, repeated every cycle
+    time.sleep(0.3)
+    sink.handle("NL-AMS", "metrics", {}, OK, 3)
+    dispatcher.close()
+
+    assert texts(bot_api) == ["🚨 Monitor: 1 problem(s), 0 recovered\n🔴 NL-AMS · metrics: SSH Timeout",
+                              "🚨 Monitor: 0 problem(s), 1 recovered\n🟢 NL-AMS · metrics: recovered"]
+
+
+def test_outage_is_one_digest_and_flaps_are_dropped(bot_api, make_dispatcher):
+    dispatcher = make_dispatcher(window=0.3)
+    sink = AlertSink(dispatcher)
+    for i in range(30):
+        sink.handle(f"RU-{i:02d}", "reachability", {}, OK, 1)
+
+    for i in range(30):
+        sink.handle(f"RU-{i:02d}", "reachability", {}, FAIL, 2)
+    sink.handle("RU-00", "reachability", {}, OK, 3)      # back within the window
+    dispatcher.close()
+
+    [digest] = texts(bot_api)
+    assert digest.startswith("🚨 Monitor: 29 problem(s), 0 recovered")
+    assert "RU-00" not in digest and digest.count("🔴") == 29
+    assert len({c["connection"] for c in bot_api.calls}) == 1, "one keep-alive connection"
+
+
+def test_chat_rate_limit_spaces_messages(bot_api, make_dispatcher):
+    dispatcher = make_dispatcher(window=0.0, per_second=2, max_length=120)
+    alerts = [Alert(f"DE-{i:02d}", "ports", "fail", "ok", [("OUTLINE", "closed", "fail")], 1) for i in range(12)]
+    for alert in alerts:
+        dispatcher.submit(alert)
+    started = time.monotonic()
+    dispatcher.close()
+
+    sent = texts(bot_api)
+    assert len(sent) >= 5 and all(len(t) <= 120 for t in sent)
+    assert sum(t.count("🔴") for t in sent) == 12
+    assert time.monotonic() - started >= (len(sent) - 2) / 2 - 0.1
+
+
+def test_rate_limit_windows():
+    now = [0.0]
+    waits = []
+
+    def sleep(seconds):
+        waits.append(round(seconds, 3))
+        now[0] += seconds
+
+    limit = ChatRateLimit(per_second=1, per_minute=3, clock=lambda: now[0], sleep=sleep)
+    for _ in range(4):
+        limit.acquire()
+
+    assert waits == [1.0, 1.0, 58.0]
+
+
+def test_flood_control_and_state_file(bot_api, make_dispatcher, tmp_path):
+    bot_api.script = [(429, {"retry_after": 1})]
+    state = str(tmp_path / "alerts.json")
+    dispatcher = make_dispatcher(window=0.0)
+    AlertSink(dispatcher, state).handle("AT-VIE", "scan", {}, FAIL, 1)
+    dispatcher.close()
+    assert len(texts(bot_api)) == 1 and bot_api.calls[0]["status"] == 429
+
+    # Next cron run: still failing -> nothing new to say
+    dispatcher = make_dispatcher(window=0.0)
+    AlertSink(dispatcher, state).handle("AT-VIE", "scan", {}, FAIL, 2)
+    dispatcher.close()
+    assert len(texts(bot_api)) == 1
+    assert len(format_digest([Alert("X", "scan", "fail", None, [("A", "x" * 50, "fail")], 1)] * 3, 80)) == 3
+
+
+def test_undelivered_digest_is_retried_with_the_next_batch(bot_api, make_dispatcher):
+    bot_api.script = [(500, None)] * 6    # every retry of the first send fails
+    dispatcher = make_dispatcher(window=0.05)
+    sink = AlertSink(dispatcher)
+    sink.handle("FI-HEL", "metrics", {}, OK, 1)
+    sink.handle("FI-HEL", "metrics", {}, FAIL, 2)
+
+    deadline = time.monotonic() + 5
+    while not texts(bot_api) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    dispatcher.close()
+
+    assert texts(bot_api) == ["🚨 Monitor: 1 problem(s), 0 recovered\n🔴 FI-HEL · metrics: SSH Timeout"]
+    assert dispatcher.reported[("FI-HEL", "metrics")] == "fail"
+
+
+def test_state_file_keeps_undelivered_changes(bot_api, make_dispatcher, tmp_path):
+    state = str(tmp_path / "alerts.json")
+    bot_api.script = [(500, None)] * 6
+    dispatcher = make_dispatcher(window=0.0)
+    AlertSink(dispatcher, state).handle("AT-VIE", "scan", {}, FAIL, 1)
+    dispatcher.close()
+    assert texts(bot_api) == []
+
+    # Next cron run: the chat never heard of the failure, so it is sent now
+    dispatcher = make_dispatcher(window=0.0)
+    AlertSink(dispatcher, state).handle("AT-VIE", "scan", {}, FAIL, 2)
+    dispatcher.close()
+    assert len(texts(bot_api)) == 1
+
+    dispatcher = make_dispatcher(window=0.0)
+    AlertSink(dispatcher, state).handle("AT-VIE", "scan", {}, FAIL, 3)
+    dispatcher.close()
+    assert len(texts(bot_api)) == 1
@@ -0,0 +1,104 @@
+import io
+import time
+import hashlib
+import tarfile
+import subprocess
+import pytest
+from scripts import backup
+
+
+class FakeChannel:
+    """Plays back a tar stream in small pieces, like a slow SSH channel."""
+
+    def __init__(self, data, exit_status=0):
+        self.data = io.BytesIO(data)
+        self.exit_status = exit_status
+
+    def recv(self, size):
+        return self.data.read(min(size, 1000))
+
+    def recv_exit_status(self):
+        return self.exit_status
+
+
+class FakeStream:
+    def __init__(self, data=b"", channel=None):
+        self.channel = channel
+        self._data = data
+
+    def read(self):
+        return self._data
+
+
+class FakeSSH:
+    def __init__(self, data, exit_status=0, error=b""):
+        self.data, self.exit_status, self.error = data, exit_status, error
+        self.commands = []
+
+    def exec_command(self, cmd):
+        self.commands.append(cmd)
+        channel = FakeChannel(self.data, self.exit_status)
+        return None, FakeStream(channel=channel), FakeStream(self.error)
+
+
+@pytest.fixture
+def remote_tar(tmp_path):
+    """A real .tar.gz stream, produced the same way the node would do it."""
+    src = tmp_path / "x-ui"
+    src.mkdir()
+    (src / "x-ui.db").write_bytes(b"config" * 5000)
+    return subprocess.run(["tar", "-czf", "-", "-C", str(tmp_path), "x-ui"], capture_output=True, check=True).stdout
+
+
+def test_stream_writes_archive_and_checksum(tmp_path, remote_tar):
+    ssh = FakeSSH(remote_tar)
+    local_path = str(tmp_path / "backup.tar.gz")
+
+    info = backup.stream_remote_archive(ssh, ["/etc/x-ui"], local_path)
+
+    assert info == {"bytes": len(remote_tar), "sha256": hashlib.sha256(remote_tar).hexdigest()}
+    assert "-czf - /etc/x-ui" in ssh.commands[0], "tar must write to stdout, not to /tmp"
+    with tarfile.open(local_path) as archive:
+        assert "x-ui/x-ui.db" in archive.getnames()
+
+
+def test_failed_tar_leaves_no_partial_file(tmp_path, remote_tar):
+    ssh = FakeSSH(remote_tar[:100], exit_status=2, error=b"tar: /etc/x-ui: Cannot open")
+    local_path = tmp_path / "backup.tar.gz"
+
+    with pytest.raises(RuntimeError, match="Cannot open"):
+        backup.stream_remote_archive(ssh, ["/etc/x-ui"], str(local_path))
+
+    assert not local_path.exists()
+    assert not (tmp_path / "backup.tar.gz.part").exists()
+
+
+def test_rate_limiter_caps_throughput():
+    """1 MB through a 2 MB/s bucket: 0.5s minus the 0.25s burst allowance."""
+    limiter = backup.RateLimiter(2_000_000)
+    started = time.monotonic()
+    for _ in range(50):
+        limiter.consume(20_000)
+    elapsed = time.monotonic() - started
+
+    assert 0.2 < elapsed < 0.6, f"Limiter is off: {elapsed:.2f}s"
+
+
+def test_parallel_runner_isolates_failures(monkeypatch):
+    """Nodes run at the same time, and one broken node does not abort the others."""
+    def fake_backup(name, ip, user, password, paths, limiters=(), port=22, codec="auto"):
+        time.sleep(0.3)
+        if name == "RU-MOW":
+            raise ConnectionError("SSH timeout")
+        return {"bytes": 1_000_000, "sha256": "abc", "path": "/tmp/x"}
+
+    monkeypatch.setattr(backup, "create_remote_backup", fake_backup)
+    servers = [(n, "10.0.0.1", "root", "pass", ["/etc/x-ui"]) for n in ("NL-AMS", "RU-MOW", "AT-VIE", "DE-DUS")]
+
+    started = time.monotonic()
+    reports = backup.run_backups(servers, workers=4)
+
+    assert time.monotonic() - started < 1.0
+    assert [r["status"] for r in reports] == ["ok", "failed", "ok", "ok"]
+    assert reports[1]["error"] == "SSH timeout"
+    backup.print_backup_report(reports)
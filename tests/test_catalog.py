@@ -0,0 +1,84 @@
+import os
+import time
+import datetime
+from scripts.catalog import BackupCatalog, gfs_keep, parse_archive_name
+
+DAY = 86400
+
+
+def stamp(days_ago, base=datetime.datetime(2026, 6, 30, 3, 0)):
+    return (base - datetime.timedelta(days=days_ago)).timestamp()
+
+
+def test_gfs_keeps_days_weeks_and_months():
+    # One nightly archive for a year, newest first
+    rows = [{"id": i, "created_at": stamp(i), "verified": True} for i in range(365)]
+
+    keep = gfs_keep(rows, daily=7, weekly=4, monthly=6)
+
+    # 2026-06-30 is a Tuesday: the last 7 days, the Sundays closing the previous
+    # ISO weeks (the current week is already covered by day 0) and the month ends
+    assert keep == set(range(7)) | {9, 16} | {30, 61, 91, 122, 150}
+    assert gfs_keep([]) == set()
+
+
+def test_gfs_prefers_verified_archive_in_bucket():
+    rows = [{"id": 1, "created_at": stamp(0), "verified": None},
+            {"id": 2, "created_at": stamp(0) - 3600, "verified": None},
+            {"id": 3, "created_at": stamp(0) - 7200, "verified": True},
+            {"id": 4, "created_at": stamp(1), "verified": None}]
+    # The newest archive is always kept, the verified one represents its day
+    assert gfs_keep(rows, daily=1, weekly=0, monthly=0) == {1, 3}
+
+
+def test_latest_verified_and_retention(tmp_path):
+    catalog = BackupCatalog(str(tmp_path / "catalog.db"))
+    for node in ("NL-AMS", "RU-MOW"):
+        for i in range(60):
+            path = tmp_path / f"backup_{node}_{i}.tar.gz"
+            path.write_bytes(b"x")
+            catalog.record(node, str(path), created_at=stamp(i), paths=["/etc/x-ui"], sha256=f"{i:064x}",
+                           verified=(i % 3 == 2) if node == "NL-AMS" else True)
+
+    latest = catalog.latest("NL-AMS")
+    assert latest["created_at"] == stamp(2) and latest["verified"] and latest["paths"] == ["/etc/x-ui"]
+    assert catalog.latest("NL-AMS", verified=False)["created_at"] == stamp(0)
+    assert catalog.latest("DE-DUS") is None
+
+    expired = catalog.apply_retention(daily=7, weekly=2, monthly=2)
+    remaining = catalog.archives("RU-MOW")
+    assert expired and len(remaining) == 60 - len([r for r in expired if r["node"] == "RU-MOW"])
+    assert not any(os.path.exists(r["path"]) for r in expired)
+    assert all(os.path.exists(r["path"]) for r in remaining)
+    assert len(catalog.archives(include_deleted=True)) == 120
+    assert catalog.latest("RU-MOW")["created_at"] == stamp(0)
+
+
+def test_latest_lookup_is_indexed(tmp_path):
+    catalog = BackupCatalog(str(tmp_path / "catalog.db"))
+    with catalog.db:
+        catalog.db.executemany(
+            "INSERT INTO archives (node, created_at, path, verified) VALUES (?, ?, ?, ?)",
+            ((f"NODE-{n}", float(i), f"/b/{n}/{i}", i % 2) for n in range(50) for i in range(2000)))
+
+    started = time.perf_counter()
+    for n in range(50):
+        assert catalog.latest(f"NODE-{n}")["created_at"] == 1999.0
+    assert time.perf_counter() - started < 0.5
+    plan = " ".join(str(r) for r in catalog.db.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM archives WHERE node = 'NODE-1' AND deleted_at IS NULL AND verified = 1"
+        " ORDER BY created_at DESC LIMIT 1"))
+    assert "USING INDEX" in plan and "TEMP B-TREE" not in plan
+
+
+def test_import_existing_directory(tmp_path):
+    (tmp_path / "backup_NL-AMS_2026-02-17_03-00.tar.gz").write_bytes(b"a" * 10)
+    (tmp_path / "backup_RU-MOW_2026-02-18_03-00-05.tar.zst").write_bytes(b"b")
+    (tmp_path / "notes.txt").write_text("not an archive")
+    catalog = BackupCatalog(str(tmp_path / "catalog.db"))
+
+    assert catalog.import_directory(str(tmp_path)) == 2
+    assert catalog.import_directory(str(tmp_path)) == 0
+    assert catalog.latest("NL-AMS", verified=False)["bytes"] == 10
+    assert parse_archive_name("backup_NL-AMS_2026-02-17_03-00.tar") == \
+        ("NL-AMS", datetime.datetime(2026, 2, 17, 3, 0).timestamp())
@@ -0,0 +1,152 @@
+import os
+import subprocess
+from types import SimpleNamespace
+import pytest
+from scripts.compliance import (NodeCompliance, SECURITY_POLICY, audit_fleet, failed_rules, parse_fix,
+                                print_audit_report)
+from scripts.facts import FactsCache
+
+# Stand-ins for the system tools the policy calls. State lives in files under $STATE,
+# every call is appended to $STATE/log.
+STUBS = {
+    "systemctl": """
+case "$1" in
+  is-active) [ -f "$STATE/$2.running" ] && echo active || { echo inactive; exit 3; } ;;
+  is-enabled) [ -f "$STATE/$2.enabled" ] && echo enabled || { echo disabled; exit 1; } ;;
+  enable) [ -f "$STATE/$2.installed" ] || exit 1; shift; for u; do [ "$u" = --now ] || /usr/bin/touch "$STATE/$u.enabled"; done ;;
+  restart) [ -f "$STATE/$2.installed" ] && [ ! -f "$STATE/$2.crashes" ] && /usr/bin/touch "$STATE/$2.running" || exit 1 ;;
+esac""",
+    "dpkg-query": '[ -f "$STATE/fail2ban.installed" ] && printf "install ok installed" || exit 1',
+    "apt-get": """
+[ -f "$STATE/apt.broken" ] && { echo "E: Unable to locate package fail2ban" >&2; exit 100; }
+for a; do case "$a" in install|update|-*|*=*) ;; *) /usr/bin/touch "$STATE/$a.installed" ;; esac; done""",
+    "ufw": '[ -f "$STATE/ufw.active" ] && echo "Status: active" || echo "Status: inactive"',
+    "sshd": 'echo "permitrootlogin yes"',
+    "journalctl": 'echo "fail2ban[42]: ERROR No file(s) found for glob /var/log/auth.log"',
+    # Keep the Debian auth.log fix away from the real /var/log
+    "touch": ":",
+}
+
+
+class StubNode:
+    def __init__(self, tmp_path, *state):
+        self.bin = tmp_path / "bin"
+        self.state = tmp_path / "state"
+        self.bin.mkdir(parents=True)
+        self.state.mkdir(parents=True)
+        for name, body in STUBS.items():
+            path = self.bin / name
+            path.write_text(f'#!/bin/sh\necho "{name} $*" >> "$STATE/log"\n{body}\n')
+            path.chmod(0o755)
+        for flag in state:
+            (self.state / flag).touch()
+
+    def run(self, cmd):
+        env = dict(os.environ, PATH=f"{self.bin}:{os.environ['PATH']}", STATE=str(self.state))
+        proc = subprocess.run(cmd, shell=True, capture_output=True, text=True, env=env)
+        return SimpleNamespace(rc=proc.returncode, stdout=proc.stdout, stderr=proc.stderr)
+
+    def calls(self, tool):
+        log = self.state / "log"
+        return [line for line in (log.read_text().splitlines() if log.exists() else []) if line.startswith(tool)]
+
+
+HEALTHY = ("ufw.active", "fail2ban.installed", "fail2ban.enabled", "fail2ban.running")
+
+
+@pytest.fixture
+def debian_only():
+    with open("/etc/os-release") as f:
+        os_release = f.read().splitlines()
+        if "ID=debian" not in os_release and "ID=ubuntu" not in os_release:
+            pytest.skip("the policy's OS rule expects a Debian/Ubuntu test machine")
+
+
+def test_compliant_node_is_one_round_trip(tmp_path, debian_only):
+    node = StubNode(tmp_path, *HEALTHY)
+    engine = NodeCompliance(node.run)
+    results = engine.converge()
+
+    assert engine.round_trips == 1
+    assert list(results) == [rule.id for rule in SECURITY_POLICY]
+    assert all(r["passed"] for r in results.values() if r["rule"] != "root_login_disabled")
+    assert results["root_login_disabled"]["value"] == "yes"
+    assert failed_rules(results) == [], "the waived root login rule does not count"
+    assert node.calls("apt-get") == [] and not node.calls("systemctl enable")
+
+
+def test_broken_node_is_fixed_in_one_batch(tmp_path, debian_only):
+    node = StubNode(tmp_path, "ufw.active")
+    engine = NodeCompliance(node.run)
+    results = engine.converge()
+
+    assert engine.round_trips == 3, "probe, one fix script, re-probe"
+    for rule in ("fail2ban_installed", "fail2ban_enabled", "fail2ban_running"):
+        assert results[rule]["passed"] and results[rule]["remediated"] and results[rule]["error"] is None
+    assert results["fail2ban_running"]["initial"] == "inactive"
+    assert results["fail2ban_running"]["value"] == "active"
+    assert not results["ufw_active"]["remediated"]
+    assert len(node.calls("apt-get")) == 1, "install worked on the first try: no 'apt-get update'"
+
+
+def test_package_and_service_rules_come_from_facts(tmp_path, debian_only):
+    node = StubNode(tmp_path, "ufw.active")
+    cache = FactsCache()
+    facts = cache.node("NL-AMS", node.run)
+    engine = NodeCompliance(node.run, facts=facts)
+
+    results = engine.converge()
+
+    # Scripts: probe of ufw/sshd only, fix; the re-check is a facts refresh
+    assert engine.round_trips == 2
+    assert cache.stats["NL-AMS"]["misses"] == 2, "first gather + refresh of what the fix invalidated"
+    assert results["fail2ban_installed"]["initial"] == "not-installed"
+    assert all(results[r]["passed"] and results[r]["remediated"]
+               for r in ("fail2ban_installed", "fail2ban_enabled", "fail2ban_running"))
+    assert results["os_supported"]["passed"] and results["ufw_active"]["passed"]
+    assert facts.service("fail2ban") == {"is_running": True, "is_enabled": True}
+    assert cache.stats["NL-AMS"]["hits"] >= 1
+
+
+def test_failed_remediation_keeps_its_output(tmp_path, debian_only):
+    node = StubNode(tmp_path, "ufw.active", "apt.broken")
+    results = NodeCompliance(node.run).converge()
+
+    installed = results["fail2ban_installed"]
+    assert not installed["passed"] and installed["error"] == "remediation failed (rc=1)"
+    assert "Unable to locate package" in installed["output"]
+    assert len(node.calls("apt-get")) == 2, "install, then update (+ install skipped: update failed)"
+    running = results["fail2ban_running"]
+    assert running["error"] and "No file(s) found" in running["output"], "the journal comes with the failure"
+    assert {r["rule"] for r in failed_rules(results)} == {"fail2ban_installed", "fail2ban_enabled",
+                                                          "fail2ban_running"}
+
+
+def test_check_only_never_fixes(tmp_path, debian_only):
+    node = StubNode(tmp_path)
+    engine = NodeCompliance(node.run)
+    results = engine.check()
+    assert engine.round_trips == 1
+    assert not results["ufw_active"]["passed"] and results["ufw_active"]["value"] == "Status: inactive"
+    assert node.calls("apt-get") == [] and node.calls("systemctl restart") == []
+
+
+def test_parse_fix_with_a_killed_script():
+    output = "@@fix a begin\nok\n@@fix a rc 0\n@@fix b begin\nhalf done\n"
+    assert parse_fix(output) == {"a": (0, "ok"), "b": (None, "")}
+
+
+def test_audit_fleet(tmp_path, capsys, debian_only):
+    nodes = {"NL-AMS": StubNode(tmp_path / "a", *HEALTHY), "RU-MOW": StubNode(tmp_path / "b", "ufw.active")}
+
+    class Shell:
+        def run(self, node, cmd, timeout=None):
+            result = nodes[node].run(cmd)
+            return result.rc, result.stdout, result.stderr
+
+    servers = [(name, "10.0.0.1", "root", "pw", []) for name in nodes]
+    rows = audit_fleet(servers, Shell(), fix=True, workers=2)
+    print_audit_report(rows)
+    out = capsys.readouterr().out
+    assert "✅ NL-AMS" in out and "1 round trip(s)" in out
+    assert "🔧 RU-MOW" in out and "fixed: fail2ban_installed, fail2ban_enabled, fail2ban_running" in out
@@ -0,0 +1,55 @@
+import shutil
+import subprocess
+import pytest
+from inventory import Inventory, load_inventory_file
+from scripts import backup
+from scripts.compression import (CODECS, choose_codec, build_benchmark_script, parse_benchmark,
+                                 parse_node_profile, benchmark_node)
+from scripts.fleet_sim import FleetSimulator
+from scripts.ssh_pool import SSHPool
+
+
+def test_choose_codec_per_node():
+    big = {"tools": {"zstd", "pigz"}, "cores": 8, "link_mbps": 100.0}
+    assert choose_codec(big).name == "zstd-mt"
+    # Only gzip on a slow link: compression is not the bottleneck, the packed size is
+    assert choose_codec({"tools": set(), "cores": 1, "link_mbps": 20.0}).name == "gzip"
+    assert choose_codec({"tools": {"pigz"}, "cores": 4, "link_mbps": 400.0}).name == "pigz"
+    # A LAN link beats any single-threaded compressor
+    assert choose_codec({"tools": set(), "cores": 1, "link_mbps": 10_000.0}).name == "none"
+    # --limit-mbps caps the measured link
+    assert choose_codec({"tools": set(), "cores": 1, "link_mbps": 10_000.0}, cap_mbps=20).name == "gzip"
+    assert parse_node_profile("tool zstd\ncores 4\ngarbage\n") == {"tools": {"zstd"}, "cores": 4}
+
+
+def test_tar_command_per_codec():
+    assert backup.build_tar_cmd(["/etc/x-ui"]).endswith("-czf - /etc/x-ui")
+    assert "-I 'zstd -T0 -3 -q' -cf /tmp/b.tar.zst /opt" in backup.build_tar_cmd(["/opt"], "/tmp/b.tar.zst", "zstd-mt")
+    assert backup.build_tar_cmd(["/opt"], codec="none").endswith("-cf - /opt")
+
+
+def test_benchmark_script_runs(tmp_path):
+    (tmp_path / "data").mkdir()
+    (tmp_path / "data" / "db.sqlite").write_bytes(b"row" * 100_000)
+    codecs = [CODECS["gzip"], CODECS["none"]] + ([CODECS["zstd"]] if shutil.which("zstd") else [])
+    script = build_benchmark_script(f"tar -C {tmp_path}", ["data"], codecs)
+
+    results = parse_benchmark(subprocess.run(["sh", "-c", script], capture_output=True, text=True).stdout)
+
+    assert set(results) == {c.name for c in codecs}
+    raw = results["none"][0]
+    assert raw > 300_000 and all(size < raw / 10 for name, (size, _) in results.items() if name != "none")
+
+
+def test_benchmark_node_over_ssh(tmp_path):
+    with FleetSimulator(1, seed=3, backup_kb=256, workdir=str(tmp_path)) as sim, SSHPool(timeout=3) as pool:
+        node = sim.nodes[0]
+        pool.register_nodes(Inventory(load_inventory_file(sim.write_inventory(str(tmp_path / "sim.json")))))
+        profile, rows = benchmark_node(pool.get(node.name), backup.TAR_PREFIX, node.backup_paths)
+
+    assert profile["cores"] >= 1 and profile["link_mbps"] > 0
+    assert {r["codec"] for r in rows} >= {"gzip", "none"}
+    assert all(r["bytes"] > 0 for r in rows)
+    assert rows == sorted(rows, key=lambda r: r["estimate"])
+    with pytest.raises(KeyError):
+        backup.resolve_codec(None, "lz4")
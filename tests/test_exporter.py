@@ -0,0 +1,132 @@
+import time
+import threading
+import requests
+from scripts import monitor
+from scripts.ssh_pool import SSHPool
+from scripts.reachability import summarize
+from scripts.monitor_daemon import MonitorDaemon
+from scripts.exporter import OpenMetricsExporter, start_http_server, CONTENT_TYPE, format_sample
+from fakes import FakeClient
+
+FLEET = [(f"Node-{i}", f"10.0.0.{i}", "root", "pass", ["/opt/outline"]) for i in range(1, 4)]
+
+
+def sample_lines(page):
+    return [line for line in page.decode().splitlines() if not line.startswith("#")]
+
+
+def test_format_sample_escapes_labels():
+    assert format_sample("m", {"node": 'a"b\\c\nd'}, 1.0) == 'm{node="a\\"b\\\\c\\nd"} 1.0'
+    assert format_sample("m", {}, 0.5) == "m 0.5"
+
+
+def test_render_node_results():
+    exporter = OpenMetricsExporter()
+    exporter.handle("Node-1", "reachability", summarize("10.0.0.1", "tcp", [(0, 20.0), (0, None)]), [], 1000.0)
+    exporter.handle("Node-1", "ports", [
+        {"name": "vless", "port": 443, "status": "open", "connect_ms": 12.0, "tls_ms": None,
+         "tls_error": "handshake timeout", "error": None},
+        {"name": "ssh", "port": 22, "status": "refused", "connect_ms": 1.0, "tls_ms": None,
+         "tls_error": None, "error": None},
+    ], [], 1000.0)
+    exporter.handle("Node-1", "metrics", {"disk_used": 93, "mem_used": 40.0, "load1": 0.5,
+                                          "containers": ["shadowbox"],
+                                          "services": [("Docker: Outline", True)]}, [], 1000.0)
+    exporter.handle("Node-2", "metrics", {"error": "Auth failed"}, [], 1000.0)
+    lines = sample_lines(exporter.render())
+
+    assert 'vpnqa_node_reachable{node="Node-1"} 1.0' in lines
+    assert 'vpnqa_node_packet_loss_ratio{node="Node-1"} 0.5' in lines
+    assert 'vpnqa_node_rtt_seconds{node="Node-1"} 0.02' in lines
+    assert 'vpnqa_port_up{node="Node-1",service="vless",port="443"} 1.0' in lines
+    assert 'vpnqa_port_tls_ok{node="Node-1",service="vless",port="443"} 0.0' in lines
+    assert 'vpnqa_port_up{node="Node-1",service="ssh",port="22"} 0.0' in lines
+    assert 'vpnqa_disk_used_ratio{node="Node-1"} 0.93' in lines
+    assert 'vpnqa_containers_running{node="Node-1"} 1.0' in lines
+    assert 'vpnqa_service_up{node="Node-1",service="Docker: Outline"} 1.0' in lines
+    assert 'vpnqa_ssh_up{node="Node-2"} 0.0' in lines
+    assert not any(line.startswith("vpnqa_disk_used_ratio{node=\"Node-2\"") for line in lines)
+    assert 'vpnqa_check_timestamp_seconds{node="Node-2",check="metrics"} 1000.0' in lines
+
+
+def test_page_is_valid_openmetrics():
+    exporter = OpenMetricsExporter()
+    exporter.handle_collection("ports", 0.25, 0)
+    exporter.handle_collection("ports", 0.5, 2)
+    page = exporter.render().decode()
+    assert page.endswith("# EOF\n")
+    assert "# TYPE vpnqa_collection counter" in page
+    assert "# UNIT vpnqa_node_rtt_seconds seconds" in page
+    assert 'vpnqa_collection_total{check="ports"} 2.0' in page
+    assert 'vpnqa_collection_errors_total{check="ports"} 2.0' in page
+    assert 'vpnqa_collection_duration_seconds{check="ports"} 0.5' in page
+    # Every metric family is announced exactly once
+    types = [line.split()[2] for line in page.splitlines() if line.startswith("# TYPE")]
+    assert len(types) == len(set(types))
+
+
+def test_render_is_cached_until_new_data():
+    exporter = OpenMetricsExporter()
+    first = exporter.render()
+    assert exporter.render() is first
+    exporter.handle_collection("metrics", 0.1, 0)
+    assert exporter.render() is not first
+
+
+def test_http_endpoint():
+    exporter = OpenMetricsExporter()
+    exporter.handle_collection("reachability", 0.1, 0)
+    server = start_http_server(exporter, "127.0.0.1", 0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        response = requests.get(f"{url}/metrics", timeout=5)
+        assert response.status_code == 200
+        assert response.headers["Content-Type"] == CONTENT_TYPE
+        assert 'vpnqa_collection_total{check="reachability"} 1.0' in response.text
+        assert requests.get(f"{url}/other", timeout=5).status_code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_daemon_feeds_exporter_in_background(monkeypatch):
+    def slow_fleet_ping(targets, count=1, **kwargs):
+        time.sleep(0.2)
+        return {t: summarize(t, "tcp", [(0, 10.0)] * count) for t in targets}
+
+    def broken_services(targets, **kwargs):
+        raise RuntimeError("event loop exploded")
+
+    monkeypatch.setattr(monitor, "probe_many", slow_fleet_ping)
+    monkeypatch.setattr(monitor, "probe_services", broken_services)
+    monkeypatch.setattr(monitor, "collect_node_metrics",
+                        lambda client, paths, timeout=15: {"disk_used": 10, "mem_used": 20.0, "load1": 0.1,
+                                                           "containers": [], "services": []})
+
+    exporter = OpenMetricsExporter()
+    daemon = MonitorDaemon(FLEET, intervals={"reachability": 0.3, "ports": 0.3, "metrics": 0.3},
+                           pool=SSHPool(client_factory=FakeClient), sinks=[exporter])
+    server = start_http_server(exporter, "127.0.0.1", 0)
+    thread = threading.Thread(target=daemon.run_forever)
+    thread.start()
+    try:
+        time.sleep(1.0)
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        started = time.monotonic()
+        page = requests.get(url, timeout=5).text
+        # A scrape never waits for a probe (a prober pass takes 0.2s here)
+        assert time.monotonic() - started < 0.15
+    finally:
+        daemon.stop()
+        thread.join(timeout=5)
+        server.shutdown()
+        server.server_close()
+
+    assert 'vpnqa_node_reachable{node="Node-3"} 1.0' in page
+    assert 'vpnqa_ssh_up{node="Node-1"} 1.0' in page
+    # The broken ports pass is visible as collection errors, the daemon kept running
+    errors = next(line for line in page.splitlines() if line.startswith('vpnqa_collection_errors_total{check="ports"}'))
+    assert float(errors.split()[-1]) >= len(FLEET)
+    duration = next(line for line in page.splitlines()
+                    if line.startswith('vpnqa_collection_duration_seconds{check="reachability"}'))
+    assert float(duration.split()[-1]) >= 0.2
@@ -0,0 +1,106 @@
+import subprocess
+from types import SimpleNamespace
+from scripts.facts import FactsCache, build_facts_cmd, parse_facts
+
+OUTPUT = """os debian 12 bookworm
+pkg fail2ban install ok installed 1.0.2-2
+pkg rsyslog deinstall ok config-files 8.2302.0-1
+pkg iperf3
+svc fail2ban 3 0
+svc ufw 0 0
+"""
+
+
+class FakeNode:
+    """host.run stand-in: records every command and answers from a mutable state."""
+
+    def __init__(self):
+        self.commands = []
+        self.installed = {"fail2ban": "1.0.2-2", "ufw": "0.36"}
+        self.running = {"ufw"}
+
+    def run(self, cmd):
+        self.commands.append(cmd)
+        lines = []
+        if "os-release" in cmd:
+            lines.append("os Ubuntu 22.04 jammy")
+        packages = cmd.split("for p in ")[1].split(";")[0].split() if "for p in " in cmd else []
+        services = cmd.split("for u in ")[1].split(";")[0].split() if "for u in " in cmd else []
+        for p in packages:
+            status = f"install ok installed {self.installed[p]}" if p in self.installed else ""
+            lines.append(f"pkg {p} {status}")
+        for u in services:
+            lines.append(f"svc {u} {0 if u in self.running else 3} {0 if u in self.running else 1}")
+        return SimpleNamespace(stdout="\n".join(lines), rc=0)
+
+
+def test_parse_facts():
+    os_release, packages, services = parse_facts(OUTPUT)
+    assert os_release == {"distribution": "debian", "release": "12", "codename": "bookworm"}
+    assert packages["fail2ban"] == {"is_installed": True, "version": "1.0.2-2"}
+    assert packages["rsyslog"]["is_installed"] is False
+    assert packages["iperf3"] == {"is_installed": False, "version": None}
+    assert services["fail2ban"] == {"is_running": False, "is_enabled": True}
+    assert services["ufw"] == {"is_running": True, "is_enabled": True}
+
+
+def test_first_lookup_gathers_everything_in_one_round_trip():
+    node = FakeNode()
+    cache = FactsCache(packages=("fail2ban", "ufw"), services=("fail2ban", "ufw"))
+    facts = cache.node("NL-AMS", node.run)
+
+    assert facts.distribution == "ubuntu"
+    assert facts.release == "22.04"
+    assert facts.package("fail2ban")["is_installed"]
+    assert facts.service("ufw")["is_running"]
+    assert not facts.service("fail2ban")["is_running"]
+
+    assert len(node.commands) == 1
+    assert cache.stats["NL-AMS"] == {"misses": 1, "hits": 4}
+    # The same node object is served to every test of the session
+    assert cache.node("NL-AMS", node.run) is facts
+
+
+def test_unknown_fact_costs_one_targeted_query():
+    node = FakeNode()
+    facts = FactsCache(packages=("ufw",), services=("ufw",)).node("NL-AMS", node.run)
+    facts.os
+    assert facts.package("nginx") == {"is_installed": False, "version": None}
+    assert len(node.commands) == 2
+    assert "os-release" not in node.commands[1]
+    assert "for p in nginx;" in node.commands[1]
+    assert "for u in" not in node.commands[1]
+
+
+def test_invalidation_refreshes_exactly_what_changed():
+    node = FakeNode()
+    cache = FactsCache(packages=("fail2ban", "rsyslog", "ufw"), services=("fail2ban", "ufw"))
+    facts = cache.node("DE-FRA", node.run)
+    assert not facts.service("fail2ban")["is_running"]
+
+    # Self-healing: restart fail2ban
+    node.running.add("fail2ban")
+    assert not facts.service("fail2ban")["is_running"], "not invalidated yet: served from memory"
+    node.installed["rsyslog"] = "8.2302.0-1"
+    facts.invalidate(packages=["rsyslog"], services=["fail2ban"])
+
+    assert facts.service("fail2ban")["is_running"]
+    # The stale rsyslog package came along in the same round trip
+    assert facts.package("rsyslog")["is_installed"]
+    assert facts.service("ufw")["is_running"]
+    assert facts.distribution == "ubuntu"
+
+    refresh = node.commands[1]
+    assert "for p in rsyslog;" in refresh and "for u in fail2ban;" in refresh
+    assert "ufw" not in refresh and "os-release" not in refresh
+    assert len(node.commands) == 2
+    assert cache.totals() == {"misses": 2, "hits": 4}
+
+
+def test_facts_command_runs_in_posix_sh():
+    cmd = build_facts_cmd(True, ["definitely-not-a-package"], ["definitely-not-a-unit"])
+    out = subprocess.run(["sh", "-c", cmd], capture_output=True, text=True).stdout
+    os_release, packages, services = parse_facts(out)
+    assert os_release["distribution"] != ""
+    assert packages["definitely-not-a-package"]["is_installed"] is False
+    assert services["definitely-not-a-unit"] == {"is_running": False, "is_enabled": False}
@@ -0,0 +1,97 @@
+import time
+import tarfile
+import pytest
+import paramiko
+from inventory import Inventory, load_inventory_file
+from scripts import monitor
+from scripts.backup import stream_remote_archive
+from scripts.compliance import audit_fleet
+from scripts.fleet_sim import FleetSimulator, parse_failures, sandbox_command
+from scripts.iperf_mesh import SSHShell
+from scripts.ssh_pool import SSHPool
+
+FAILURES = {"down": 0.125, "auth": 0.125, "hang": 0.125, "disk_full": 0.125, "service_down": 0.25}
+
+
+@pytest.fixture(scope="module")
+def fleet():
+    with FleetSimulator(8, seed=1, latency=(0.01, 0.02), bandwidth_mbps=4, backup_kb=128,
+                        failures=FAILURES) as sim:
+        yield sim
+
+
+@pytest.fixture
+def inventory(fleet, tmp_path):
+    return Inventory(load_inventory_file(fleet.write_inventory(str(tmp_path / "sim.json"))))
+
+
+@pytest.fixture
+def pool(inventory):
+    with SSHPool(timeout=3) as ssh_pool:
+        ssh_pool.register_nodes(inventory)
+        yield ssh_pool
+
+
+def pick(fleet, failure=None, kind=None):
+    return next(n for n in fleet.nodes if n.failure == failure and kind in (None, n.kind))
+
+
+def test_sandbox_paths(tmp_path):
+    assert sandbox_command(". /etc/os-release; cat /proc/loadavg 2>/dev/null") == \
+        ". etc/os-release; cat proc/loadavg 2>/dev/null"
+    assert sandbox_command("tar -czf - /opt/outline ./etc /usr/bin/x") == "tar -czf - opt/outline ./etc /usr/bin/x"
+    assert parse_failures(["down=0.1"]) == {"down": 0.1}
+    with pytest.raises(ValueError):
+        FleetSimulator(2, failures={"meteor": 1.0}, workdir=str(tmp_path))
+
+
+def test_inventory_points_at_the_fleet(fleet, inventory):
+    assert len(inventory) == 8
+    node = inventory.get(fleet.nodes[0].name)
+    assert (node.ip, node.ssh_port, node.ports) == ("127.0.0.1", fleet.nodes[0].port, [("ssh", node.ssh_port, None)])
+    assert sorted(n.failure for n in fleet.nodes if n.failure) == sorted(["down", "auth", "hang", "disk_full",
+                                                                          "service_down", "service_down"])
+    assert [n.name for n in inventory.select("zone=NL")] == ["NL-SIM-001", "NL-SIM-006"]
+
+
+def test_monitor_metrics(fleet, pool):
+    for sim_node, expected in ((pick(fleet, kind="xray"), "ok"), (pick(fleet, "disk_full"), "fail")):
+        details = monitor.collect_node_metrics(pool.get(sim_node.name), sim_node.backup_paths)
+        checks = {label: status for label, _, status in monitor.metric_checks(details)}
+        assert checks["DISK"] == expected and checks["RAM"] == "ok"
+
+    outline = pick(fleet, "service_down", kind="outline")
+    details = monitor.collect_node_metrics(pool.get(outline.name), outline.backup_paths)
+    assert details["containers"] == ["watchtower"]
+    assert details["services"] == [("Docker: Outline", False)]
+
+
+def test_compliance_heals_stopped_services(fleet, inventory, pool):
+    healthy, broken = pick(fleet), pick(fleet, "service_down")
+    nodes = [inventory.get(healthy.name), inventory.get(broken.name)]
+    rows = {name: (results, trips) for name, results, trips, _, error in audit_fleet(nodes, SSHShell(pool), fix=True)}
+    assert rows[healthy.name][1] == 1
+    results, trips = rows[broken.name]
+    assert trips == 3 and results["fail2ban_running"]["remediated"] and results["fail2ban_running"]["passed"]
+    assert results["os_supported"]["value"] == "debian"
+
+
+def test_backup_stream_respects_the_bandwidth(fleet, pool, tmp_path):
+    node = pick(fleet, kind="outline")
+    started = time.monotonic()
+    info = stream_remote_archive(pool.get(node.name), node.backup_paths, str(tmp_path / "b.tar.gz"))
+    elapsed = time.monotonic() - started
+    assert elapsed >= info["bytes"] / (4_000_000 / 8) * 0.9, "128 KB of random data at 4 Mbit/s"
+    with tarfile.open(tmp_path / "b.tar.gz") as archive:
+        names = archive.getnames()
+    assert "opt/outline/config.json" in names and not any("prometheus" in n for n in names)
+
+
+def test_failure_modes(fleet, pool):
+    with pytest.raises(paramiko.ssh_exception.NoValidConnectionsError):
+        pool.get(pick(fleet, "down").name)
+    with pytest.raises(paramiko.AuthenticationException):
+        pool.get(pick(fleet, "auth").name)
+    _, stdout, _ = pool.get(pick(fleet, "hang").name).exec_command("hostname", timeout=0.5)
+    with pytest.raises(TimeoutError):
+        stdout.read()
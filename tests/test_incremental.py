@@ -0,0 +1,144 @@
+import os
+import shutil
+import tarfile
+import threading
+import subprocess
+import pytest
+from scripts.incremental import ChunkStore, incremental_backup, fetch_files
+
+pytestmark = pytest.mark.skipif(shutil.which("find") is None or os.name == "nt",
+                                reason="GNU find/tar/sha256sum are required to play the remote node")
+
+
+class _Channel:
+    def __init__(self, proc):
+        self.proc = proc
+
+    def shutdown_write(self):
+        self.proc.stdin.close()
+
+    def recv_exit_status(self):
+        return self.proc.wait()
+
+
+class _Stream:
+    def __init__(self, pipe, proc):
+        self.pipe = pipe
+        self.channel = _Channel(proc)
+
+    def read(self, size=-1):
+        return self.pipe.read(size)
+
+    def write(self, data):
+        self.pipe.write(data.encode() if isinstance(data, str) else data)
+
+    def flush(self):
+        self.pipe.flush()
+
+
+class LocalSSH:
+    """Runs 'remote' commands on this machine: the local disk plays the VPN node."""
+
+    def __init__(self):
+        self.commands = []
+
+    def exec_command(self, cmd):
+        self.commands.append(cmd)
+        proc = subprocess.Popen(["sh", "-c", cmd], stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return _Stream(proc.stdin, proc), _Stream(proc.stdout, proc), _Stream(proc.stderr, proc)
+
+
+@pytest.fixture
+def node_dir(tmp_path):
+    root = tmp_path / "node" / "x-ui"
+    (root / "prometheus").mkdir(parents=True)
+    (root / "x-ui.db").write_bytes(os.urandom(50_000))
+    (root / "config.json").write_text('{"inbounds": []}')
+    (root / "prometheus" / "metrics").write_bytes(b"noise" * 1000)
+    return root
+
+
+def test_second_run_transfers_only_the_changed_file(tmp_path, node_dir):
+    store = ChunkStore(str(tmp_path / "store"))
+    ssh = LocalSSH()
+
+    first = incremental_backup(ssh, "NL-AMS", [str(node_dir)], store)
+    assert first["files"] == 2, "prometheus must be excluded like in the full tar"
+    assert first["downloaded"] == 2
+
+    (node_dir / "config.json").write_text('{"inbounds": [1]}')
+    os.utime(node_dir / "config.json", (1, 1))
+    second = incremental_backup(ssh, "NL-AMS", [str(node_dir)], store)
+
+    assert second["changed"] == 1
+    assert second["downloaded"] == 1
+    assert second["bytes"] < first["bytes"] / 5, "the big unchanged database must not be re-sent"
+
+
+def test_touched_file_with_same_content_is_not_downloaded(tmp_path, node_dir):
+    store = ChunkStore(str(tmp_path / "store"))
+    incremental_backup(LocalSSH(), "NL-AMS", [str(node_dir)], store)
+
+    os.utime(node_dir / "x-ui.db", (2, 2))
+    info = incremental_backup(LocalSSH(), "NL-AMS", [str(node_dir)], store)
+
+    assert info["changed"] == 1
+    assert info["downloaded"] == 0
+
+
+def test_snapshot_exports_to_a_normal_archive(tmp_path, node_dir):
+    store = ChunkStore(str(tmp_path / "store"))
+    info = incremental_backup(LocalSSH(), "NL-AMS", [str(node_dir)], store)
+
+    out = store.export(info["snapshot"], str(tmp_path / "restored.tar.gz"))
+
+    with tarfile.open(out) as tar:
+        restored = tar.extractfile(str(node_dir / "x-ui.db").lstrip("/")).read()
+    assert restored == (node_dir / "x-ui.db").read_bytes()
+    assert store.gc() == 0
+
+
+def test_symlinks_and_owners_survive_the_export(tmp_path, node_dir):
+    os.symlink("config.json", node_dir / "active.json")
+    owner = (1234, 4321) if os.getuid() == 0 else (os.getuid(), os.getgid())
+    os.chown(node_dir / "x-ui.db", *owner)
+    store = ChunkStore(str(tmp_path / "store"))
+    info = incremental_backup(LocalSSH(), "NL-AMS", [str(node_dir)], store)
+    assert info["files"] == 3 and info["downloaded"] == 2, "a symlink has nothing to download"
+
+    out = store.export(info["snapshot"], str(tmp_path / "restored.tar.gz"))
+
+    with tarfile.open(out) as tar:
+        link = tar.getmember(str(node_dir / "active.json").lstrip("/"))
+        db = tar.getmember(str(node_dir / "x-ui.db").lstrip("/"))
+    assert link.issym() and link.linkname == "config.json"
+    assert (db.uid, db.gid) == owner
+
+
+def test_long_file_lists_do_not_deadlock(tmp_path):
+    """The list is fed while the node answers: 5000 paths overflow every pipe and SSH window."""
+    root = tmp_path / "node" / "many"
+    root.mkdir(parents=True)
+    for i in range(5000):
+        (root / f"peer-{i:05d}.json").write_text(str(i))
+    store = ChunkStore(str(tmp_path / "store"))
+    results = []
+
+    worker = threading.Thread(target=lambda: results.append(incremental_backup(LocalSSH(), "NL-AMS", [str(root)], store)),
+                              daemon=True)
+    worker.start()
+    worker.join(60)
+
+    assert results, "incremental backup deadlocked on a long file list"
+    assert results[0]["files"] == 5000 and results[0]["downloaded"] == 5000
+
+
+def test_files_tar_could_not_read_are_reported(tmp_path, node_dir):
+    store = ChunkStore(str(tmp_path / "store"))
+    gone = str(node_dir / "rotated.log")
+
+    fetched, _, failed = fetch_files(LocalSSH(), [str(node_dir / "config.json"), gone], store)
+
+    assert list(fetched) == [str(node_dir / "config.json")]
+    assert list(failed) == [gone] and "No such file" in failed[gone]
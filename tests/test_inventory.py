@@ -0,0 +1,111 @@
+import json
+import time
+import pytest
+from inventory import Inventory, Node, load_env_nodes, load_inventory_file, load_inventory
+
+ZONES = ["RU", "NL", "DE", "AT"]
+
+
+@pytest.fixture
+def fleet_file(tmp_path):
+    """2000 nodes: zone by position, every 2nd is staging, every 5th runs outline."""
+    nodes = [{"name": f"{ZONES[i % 4]}-{i:04d}", "ip": f"10.{i // 250}.{i % 250}.1",
+              "zone": ZONES[i % 4], "tags": ["staging"] if i % 2 else ["prod"],
+              "services": ["xray", "outline"] if i % 5 == 0 else ["xray"]}
+             for i in range(2000)]
+    nodes.append({"name": "no-ip-yet", "ip": ""})
+    path = tmp_path / "inventory.json"
+    path.write_text(json.dumps({"defaults": {"user": "root", "password_env": "FLEET_PASS",
+                                             "backup_paths": "/etc/x-ui, /opt/outline"},
+                                "nodes": nodes}))
+    return path
+
+
+def test_node_behaves_like_the_old_tuple():
+    node = Node("NL-AMS", "1.1.1.1", "root", "secret", ["/etc/x-ui"], zone="NL")
+    name, ip, user, password, paths = node
+    assert (name, ip, user, password, paths) == ("NL-AMS", "1.1.1.1", "root", "secret", ["/etc/x-ui"])
+    assert node[:4] == ("NL-AMS", "1.1.1.1", "root", "secret")
+    assert len(node) == 5 and node[4] == ["/etc/x-ui"]
+    assert "secret" not in repr(node)
+    assert not hasattr(node, "__dict__")
+
+
+def test_load_file_with_defaults(fleet_file, monkeypatch):
+    monkeypatch.setenv("FLEET_PASS", "from-env")
+    nodes = load_inventory_file(fleet_file)
+    assert len(nodes) == 2000, "nodes without an IP are skipped"
+    first = nodes[0]
+    assert (first.name, first.user, first.password, first.zone) == ("RU-0000", "root", "from-env", "RU")
+    assert first.backup_paths == ["/etc/x-ui", "/opt/outline"]
+    assert first.ports == [("ssh", 22, None), ("vless", 443, "")]
+    assert first.ports is nodes[1].ports, "identical port layouts are parsed once"
+
+
+def test_selectors(fleet_file):
+    inventory = Inventory(load_inventory_file(fleet_file))
+    assert len(inventory.select("")) == 2000
+    assert all(n.zone == "RU" for n in inventory.select("zone=RU"))
+    assert len(inventory.select("zone=ru")) == 500
+    outline = inventory.select("service=outline")
+    assert len(outline) == 400 and all("outline" in n.services for n in outline)
+    # NL nodes are all odd positions = staging, so only RU outline nodes are left
+    assert len(inventory.select("zone=RU|NL,service=outline,tag!=staging")) == 100
+    assert [n.name for n in inventory.select("name=NL-000?")] == ["NL-0001", "NL-0005", "NL-0009"]
+    assert [n.name for n in inventory.select("name=AT-0003")] == ["AT-0003"]
+    assert inventory.select("zone=MARS") == []
+
+    selected = inventory.select("tag=prod")
+    assert selected == sorted(selected, key=inventory.nodes.index), "selection keeps inventory order"
+    assert inventory.values("zone") == ["at", "de", "nl", "ru"]
+    assert inventory.get("DE-0002").ip == "10.0.2.1"
+    assert inventory.get("nope") is None
+
+
+def test_selection_stays_fast(fleet_file):
+    inventory = Inventory(load_inventory_file(fleet_file))
+    started = time.perf_counter()
+    for _ in range(100):
+        inventory.select("zone=RU,service=outline")
+    assert (time.perf_counter() - started) / 100 < 0.01
+
+
+def test_bad_selector_and_duplicates():
+    inventory = Inventory([Node("a", "1.1.1.1", "root", None)])
+    with pytest.raises(ValueError, match="Bad selector term"):
+        inventory.select("region=RU")
+    with pytest.raises(ValueError, match="Duplicate node name"):
+        Inventory([Node("a", "1.1.1.1", "root", None), Node("a", "2.2.2.2", "root", None)])
+
+
+def test_env_source_is_still_supported():
+    environ = {
+        "NODE_1_NAME": "NL-AMS", "NODE_1_IP": "1.1.1.1", "NODE_1_USER": "root", "NODE_1_PASS": "p1",
+        "NODE_1_BACKUP_PATHS": "/etc/x-ui,/opt/outline", "NODE_1_ZONE": "NL", "NODE_1_SERVICES": "xray,outline",
+        "NODE_2_NAME": "empty", "NODE_2_IP": "",
+        "NODE_12_IP": "12.12.12.12", "NODE_12_USER": "deploy", "NODE_12_PORTS": "ssh:2222",
+        "NODE_12_SSH_PORT": "2222",
+    }
+    nodes = load_env_nodes(environ)
+    assert [tuple(n) for n in nodes] == [("NL-AMS", "1.1.1.1", "root", "p1", ["/etc/x-ui", "/opt/outline"]),
+                                         ("Node-12", "12.12.12.12", "deploy", None, [])]
+    assert nodes[0].ports == [("ssh", 22, None), ("vless", 443, "")]
+    assert nodes[1].ports == [("ssh", 2222, None)]
+    assert (nodes[0].ssh_port, nodes[1].ssh_port) == (22, 2222)
+    assert [n.name for n in Inventory(nodes).select("service=outline")] == ["NL-AMS"]
+
+
+def test_default_ports_follow_ssh_port_and_services():
+    environ = {"NODE_1_IP": "1.1.1.1", "NODE_1_SSH_PORT": "2222",
+               "NODE_2_IP": "2.2.2.2", "NODE_2_SERVICES": "outline",
+               "NODE_3_IP": "3.3.3.3", "NODE_3_SERVICES": "xray", "NODE_3_SSH_PORT": "2200"}
+    assert [n.ports for n in load_env_nodes(environ)] == [
+        [("ssh", 2222, None)],
+        [("ssh", 22, None)],                             # no TLS listener assumed on 443
+        [("ssh", 2200, None), ("vless", 443, "")],
+    ]
+
+
+def test_load_inventory_prefers_the_file(fleet_file, monkeypatch):
+    monkeypatch.setenv("INVENTORY_FILE", str(fleet_file))
+    assert len(load_inventory()) == 2000
@@ -0,0 +1,140 @@
+import json
+import time
+import shutil
+import threading
+import pytest
+from scripts import iperf_mesh
+from scripts.iperf_mesh import (IperfMesh, LocalShell, round_robin_pairs, schedule,
+                                parse_iperf_json, format_matrix, format_report)
+
+NAMES = ["A", "B", "C", "D", "E"]
+
+
+def tcp_json(bps, retransmits=0):
+    return json.dumps({"end": {"sum_sent": {"bits_per_second": bps, "retransmits": retransmits},
+                               "sum_received": {"bits_per_second": bps}}})
+
+
+def udp_json(bps, jitter_ms, lost_percent):
+    return json.dumps({"end": {"sum": {"bits_per_second": bps, "jitter_ms": jitter_ms,
+                                       "lost_percent": lost_percent}}})
+
+
+class FakeIperfShell:
+    """Answers iperf3 commands and fails the test if a node is in two tests at once."""
+
+    def __init__(self, ports, delay=0.05):
+        self.by_port = {port: name for name, port in ports.items()}
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = set()
+        self.max_parallel = 0
+        self.clients = []
+        self.refuse_first = set()
+
+    def run(self, node, cmd, timeout=None):
+        if "-s -D" in cmd or "kill" in cmd:
+            return 0, "", ""
+        dst = self.by_port[int(cmd.split(" -p ")[1].split()[0])]
+        if dst in self.refuse_first:
+            self.refuse_first.discard(dst)
+            return 1, json.dumps({"error": "unable to connect to server: Connection refused"}), ""
+        with self.lock:
+            assert not {node, dst} & self.active, f"{node} or {dst} is already in a test"
+            self.active |= {node, dst}
+            self.max_parallel = max(self.max_parallel, len(self.active) // 2)
+            self.clients.append((node, dst, "-R" in cmd))
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= {node, dst}
+        if " -u " in cmd:
+            return 0, udp_json(10e6, 0.5, 1.0), ""
+        return 0, tcp_json(400e6), ""
+
+
+def test_round_robin_covers_every_pair_once():
+    pairs = round_robin_pairs(NAMES)
+    assert sorted(tuple(sorted(p)) for p in pairs) == sorted(
+        (a, b) for i, a in enumerate(NAMES) for b in NAMES[i + 1:])
+    # Every round of (odd) 5 nodes has 2 disjoint pairs
+    for i in range(0, len(pairs), 2):
+        assert not set(pairs[i]) & set(pairs[i + 1])
+
+
+def test_scheduler_never_shares_a_node_and_runs_disjoint_pairs_in_parallel():
+    lock = threading.Lock()
+    active = set()
+    overlap = []
+
+    def run_pair(a, b):
+        with lock:
+            if {a, b} & active:
+                overlap.append((a, b))
+            active.update((a, b))
+        time.sleep(0.05)
+        with lock:
+            active.difference_update((a, b))
+        return a + b
+
+    names = ["A", "B", "C", "D", "E", "F"]
+    started = time.monotonic()
+    results = schedule(round_robin_pairs(names), run_pair)
+    elapsed = time.monotonic() - started
+
+    assert not overlap
+    assert len(results) == 15
+    # 15 pairs, 3 at a time: about 5 rounds instead of 15 sequential runs
+    assert elapsed < 15 * 0.05 * 0.6
+
+
+def test_parse_iperf_json():
+    assert parse_iperf_json(tcp_json(250e6, 3)) == {"mbps": 250.0, "retransmits": 3}
+    assert parse_iperf_json(udp_json(10e6, 0.25, 2.0), udp=True) == {
+        "udp_mbps": 10.0, "jitter_ms": 0.25, "loss": 0.02}
+    with pytest.raises(RuntimeError, match="busy"):
+        parse_iperf_json(json.dumps({"error": "the server is busy running a test"}))
+
+
+def test_mesh_measures_both_directions(monkeypatch):
+    monkeypatch.setattr(iperf_mesh, "RETRY_DELAY", 0)
+    ports = {name: 6000 + i for i, name in enumerate(NAMES)}
+    shell = FakeIperfShell(ports)
+    shell.refuse_first.add("C")  # server not listening yet on the first try
+    mesh = IperfMesh([(n, "127.0.0.1") for n in NAMES], shell, ports=ports)
+    results = mesh.run()
+
+    assert sorted((r["src"], r["dst"]) for r in results) == sorted(
+        (a, b) for a in NAMES for b in NAMES if a != b)
+    assert all(r["error"] is None for r in results)
+    assert all(r["mbps"] == 400.0 and r["jitter_ms"] == 0.5 and r["loss"] == 0.01 for r in results)
+    assert shell.max_parallel == 2
+    # The reverse direction reuses the same client/server pair
+    assert sum(1 for _, _, reverse in shell.clients if reverse) == len(shell.clients) // 2
+
+
+def test_matrix_report():
+    results = [
+        {"src": "A", "dst": "B", "mbps": 512.4, "jitter_ms": 0.2, "loss": 0.0, "error": None},
+        {"src": "B", "dst": "A", "mbps": None, "jitter_ms": None, "loss": None, "error": "unable to connect"},
+    ]
+    matrix = format_matrix(results, ["A", "B"]).splitlines()
+    assert matrix[2].split() == ["A", "│", "—", "512"]
+    assert matrix[3].split() == ["B", "│", "ERR", "—"]
+    report = format_report(results, ["A", "B"])
+    assert "Jitter UDP, ms" in report
+    assert "B -> A: unable to connect" in report
+
+
+@pytest.mark.skipif(shutil.which("iperf3") is None, reason="iperf3 is not installed")
+def test_loopback_mesh():
+    names = ["L1", "L2", "L3"]
+    ports = {name: 15201 + i for i, name in enumerate(names)}
+    mesh = IperfMesh([(n, "127.0.0.1") for n in names], LocalShell(), ports=ports,
+                     tcp_seconds=1, udp_seconds=1)
+    results = mesh.run()
+    assert len(results) == 6
+    for r in results:
+        assert r["error"] is None, r["error"]
+        assert r["mbps"] > 100
+        assert r["jitter_ms"] is not None
+    print("\n" + format_report(results, names))
@@ -0,0 +1,77 @@
+import time
+import pytest
+from scripts import monitor
+from scripts.reachability import summarize
+
+
+# Fake fleet: the checks are replaced with sleeps, so no real servers are needed.
+FLEET = [(f"Node-{i}", f"10.0.0.{i}", "root", "pass", ["/etc/x-ui"]) for i in range(1, 9)]
+
+
+@pytest.fixture
+def fake_checks(monkeypatch):
+    """Every node answers after 0.3s, Node-3 is black-holed on SSH."""
+    def fleet_ping(targets, count=1, **kwargs):
+        time.sleep(0.1)
+        return {t: summarize(t, "icmp", [(0, 20.0)] * count) for t in targets}
+
+    def slow_remote(ip, user, password, backup_paths, timeout=15, port=22, node=None, deadline=None):
+        time.sleep(min(timeout, 5.0) if ip == "10.0.0.3" else 0.2)
+        if ip == "10.0.0.3":
+            return {"error": "timed out"}
+        return {"disk_used": 40, "mem_used": 50.0, "services": [("Service: X-UI", True)]}
+
+    monkeypatch.setattr(monitor, "probe_many", fleet_ping)
+    monkeypatch.setattr(monitor, "probe_services", lambda targets, **kw: {
+        node: [{"name": "vless", "port": 443, "status": "open", "connect_ms": 20.0,
+                "tls_ms": 45.0, "tls_error": None, "error": None}] for node in targets})
+    monkeypatch.setattr(monitor, "check_remote_details", slow_remote)
+
+
+def test_concurrent_scan_takes_about_one_node(fake_checks):
+    """8 nodes with 8 workers must take about as long as the slowest node, not the sum."""
+    started = time.monotonic()
+    reports = monitor.run_monitor(FLEET, workers=8, node_timeout=1.0)
+    total = time.monotonic() - started
+
+    assert total < 2.0, f"Scan was not concurrent: {total:.2f}s"
+    assert [r["name"] for r in reports] == [n[0] for n in FLEET], "Report order must follow inventory"
+
+
+def test_node_deadline_is_respected(fake_checks):
+    """A black-holed node is cut at its own deadline and reported as failed."""
+    reports = monitor.run_monitor(FLEET[:4], workers=4, node_timeout=1.0)
+    stuck = reports[2]
+
+    assert stuck["elapsed"] < 1.5
+    assert ("SSH", "Connection Failed: timed out", "fail") in stuck["checks"]
+    assert all(status == "ok" for _, _, status in reports[0]["checks"])
+
+
+def test_probe_gets_only_the_time_left_after_connect(monkeypatch):
+    """A slow handshake must not give the exec channel a fresh full timeout."""
+    exec_timeouts = []
+
+    class SlowHandshakeClient:
+        trace_node = None
+
+        def set_missing_host_key_policy(self, policy):
+            pass
+
+        def connect(self, hostname, **kwargs):
+            time.sleep(0.6)
+
+        def exec_command(self, command, timeout=None):
+            exec_timeouts.append(timeout)
+            raise TimeoutError("hung in exec")
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(monitor, "TracedSSHClient", SlowHandshakeClient)
+    deadline = time.monotonic() + 1.0
+    details = monitor.check_remote_details("10.0.0.1", "root", "pass", ["/etc/x-ui"], timeout=1.0, deadline=deadline)
+
+    assert "hung in exec" in details["error"]
+    assert exec_timeouts and exec_timeouts[0] <= 0.45
+    assert "deadline" in monitor.check_remote_details("10.0.0.1", "root", "pass", [], deadline=time.monotonic())["error"]
@@ -0,0 +1,90 @@
+import time
+import threading
+import pytest
+from scripts import monitor
+from scripts.ssh_pool import SSHPool
+from scripts.reachability import summarize
+from scripts import monitor_daemon
+from scripts.monitor_daemon import MonitorDaemon
+from fakes import FakeClient
+
+FLEET = [(f"Node-{i}", f"10.0.0.{i}", "root", "pass", ["/etc/x-ui"]) for i in range(1, 5)]
+
+
+class RecordingSink:
+    def __init__(self):
+        self.events = []
+
+    def handle(self, node, kind, result, rows, timestamp):
+        self.events.append((node, kind, rows))
+
+    def count(self, kind, node=None):
+        return sum(1 for n, k, _ in self.events if k == kind and (node is None or n == node))
+
+
+@pytest.fixture
+def fake_checks(monkeypatch):
+    calls = {"probe_many": 0}
+
+    def fleet_ping(targets, count=1, **kwargs):
+        calls["probe_many"] += 1
+        return {t: summarize(t, "icmp", [(0, 20.0)] * count) for t in targets}
+
+    def metrics(client, backup_paths, timeout=15):
+        if client.get_transport() is None:
+            return {"error": "no transport"}
+        return {"disk_used": 40, "mem_used": 50.0, "load1": 0.1, "services": []}
+
+    monkeypatch.setattr(monitor, "probe_many", fleet_ping)
+    monkeypatch.setattr(monitor, "probe_services", lambda targets, **kw: {n: [] for n in targets})
+    monkeypatch.setattr(monitor, "collect_node_metrics", metrics)
+    return calls
+
+
+def run_for(daemon, seconds):
+    thread = threading.Thread(target=daemon.run_forever)
+    thread.start()
+    time.sleep(seconds)
+    daemon.stop()
+    thread.join(timeout=5)
+
+
+def test_daemon_keeps_one_transport_per_node(fake_checks):
+    sink = RecordingSink()
+    pool = SSHPool(client_factory=FakeClient)
+    daemon = MonitorDaemon(FLEET, intervals={"reachability": 0.1, "ports": 0.2, "metrics": 0.2},
+                           pool=pool, sinks=[sink])
+
+    run_for(daemon, 1.2)
+
+    assert sink.count("metrics", "Node-1") >= 3, "metrics must repeat on their own interval"
+    assert sink.count("reachability", "Node-1") > sink.count("metrics", "Node-1"), "fast checks run more often"
+    assert all(pool.connects[n[0]] == 1 for n in FLEET), "no reconnects between cycles"
+    # Due nodes are batched: one prober pass covers several nodes
+    assert fake_checks["probe_many"] < sink.count("reachability")
+
+
+def test_dropped_node_is_retried_with_backoff(fake_checks, monkeypatch):
+    class BrokenClient(FakeClient):
+        def connect(self, hostname, **kwargs):
+            if hostname == "10.0.0.2":
+                raise TimeoutError("node dropped")
+            super().connect(hostname, **kwargs)
+
+    monkeypatch.setattr(monitor_daemon, "BACKOFF_BASE", 0.3)
+    sink = RecordingSink()
+    daemon = MonitorDaemon(FLEET, intervals={"reachability": 5, "ports": 5, "metrics": 0.1},
+                           pool=SSHPool(client_factory=BrokenClient), sinks=[sink])
+
+    run_for(daemon, 1.2)
+
+    healthy, broken = sink.count("metrics", "Node-1"), sink.count("metrics", "Node-2")
+    assert broken < healthy / 2, f"backoff did not slow down retries: {broken} vs {healthy}"
+    assert daemon.failures["Node-2"] >= 2
+    last_rows = [rows for n, k, rows in sink.events if n == "Node-2" and k == "metrics"][-1]
+    assert last_rows[0][0] == "SSH" and last_rows[0][2] == "fail"
+
+
+def test_unknown_interval_kind_is_rejected():
+    with pytest.raises(ValueError, match="Unknown check kind.*metric\\b"):
+        MonitorDaemon(FLEET, intervals={"metric": 60}, pool=SSHPool(client_factory=FakeClient), sinks=[])
@@ -0,0 +1,89 @@
+import os
+import sys
+import json
+import glob
+import subprocess
+import pytest
+
+pytest.importorskip("xdist")
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Three "nodes", three ordered checks each, every check takes 0.5s
+NODE_SUITE = '''
+import os
+import time
+import pytest
+
+NODES = [("NL-AMS", "s3cret-1"), ("AT-VIE", "s3cret-2"), ("RU-MOW", "s3cret-3")]
+
+
+@pytest.mark.parametrize("name, password", NODES, ids=[n[0] for n in NODES])
+class TestNode:
+
+    def record(self, name, step):
+        started = time.time()
+        time.sleep(0.5)
+        with open(os.path.join(os.environ["LOG_DIR"], name), "a") as f:
+            f.write(f"{os.environ['PYTEST_XDIST_WORKER']} {step} {started} {time.time()}\\n")
+
+    def test_first(self, name, password):
+        self.record(name, 1)
+
+    def test_second(self, name, password):
+        self.record(name, 2)
+
+    def test_third(self, name, password):
+        self.record(name, 3)
+'''
+
+
+@pytest.fixture
+def node_suite(tmp_path):
+    (tmp_path / "suite").mkdir()
+    (tmp_path / "suite" / "test_nodes.py").write_text(NODE_SUITE)
+    (tmp_path / "logs").mkdir()
+    return tmp_path
+
+
+def run_suite(tmp_path, *args):
+    env = dict(os.environ, LOG_DIR=str(tmp_path / "logs"),
+               PYTHONPATH=os.pathsep.join([TESTS_DIR, os.path.dirname(TESTS_DIR)]))
+    # Our conftest is loaded as a plugin, so the suite gets the same hooks as tests/
+    return subprocess.run([sys.executable, "-m", "pytest", "-p", "conftest", "-q", "-p", "no:cacheprovider",
+                           str(tmp_path / "suite"), "--alluredir", str(tmp_path / "allure"), *args],
+                          cwd=str(tmp_path), env=env, capture_output=True, text=True, timeout=120)
+
+
+def test_nodes_run_in_parallel_with_affinity(node_suite):
+    result = run_suite(node_suite, "-n", "3")
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    workers, starts, ends = set(), [], []
+    for node in ("NL-AMS", "AT-VIE", "RU-MOW"):
+        lines = [line.split() for line in (node_suite / "logs" / node).read_text().splitlines()]
+        node_workers = {line[0] for line in lines}
+        assert len(node_workers) == 1, f"{node} tests were split across workers: {node_workers}"
+        assert [line[1] for line in lines] == ["1", "2", "3"], f"{node} tests ran out of order"
+        workers |= node_workers
+        starts += [float(line[2]) for line in lines]
+        ends += [float(line[3]) for line in lines]
+    assert len(workers) == 3, "different nodes must run on different workers"
+
+    # 9 x 0.5s serial = 4.5s; parallel by node = ~1.5s (worker start-up not counted)
+    assert max(ends) - min(starts) < 3.0
+
+
+def test_allure_masking_works_in_every_worker(node_suite):
+    result = run_suite(node_suite, "-n", "3")
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    results = [json.load(open(path)) for path in glob.glob(str(node_suite / "allure" / "*-result.json"))]
+    assert len(results) == 9
+    for item in results:
+        params = {p["name"]: p for p in item["parameters"]}
+        assert params["password"]["value"] == "'***'"
+        assert params["password"].get("mode") == "masked"
+        assert params["name"]["value"] != "'***'"
+    raw = "".join(open(path).read() for path in glob.glob(str(node_suite / "allure" / "*")))
+    assert "s3cret" not in raw
@@ -0,0 +1,138 @@
+import time
+import threading
+import pytest
+from inventory import Node
+from scripts.provision import Provisioner, compare_versions, packages_for, parse_spec, print_provision_report
+
+NOW = 1_700_000_000
+ROLES = {"all": ["iperf3>=3.9", "curl"], "outline": ["docker.io"]}
+
+
+class FakeAptNode:
+    """One node's dpkg/apt state behind the provisioner's commands."""
+
+    def __init__(self, installed=None, candidates=None, index_age=3600, delay=0.0):
+        self.installed = dict(installed or {})
+        self.candidates = candidates or {"iperf3": "3.12-1", "curl": "7.88.1-10", "docker.io": "20.10.24"}
+        self.index_mtime = NOW - index_age
+        self.delay = delay
+        self.commands = []
+
+    def run(self, cmd):
+        self.commands.append(cmd)
+        time.sleep(self.delay)
+        if "apt-get" in cmd and " update" in cmd:
+            self.index_mtime = NOW
+            return 0, "Reading package lists...", ""
+        if "apt-get" in cmd and " install" in cmd:
+            names = cmd.split("install -y ")[1].split()
+            unknown = [n for n in names if n not in self.candidates]
+            if unknown:
+                return 100, "", f"E: Unable to locate package {unknown[0]}"
+            self.installed.update({n: self.candidates[n] for n in names})
+            return 0, "", ""
+        packages = cmd.split("for p in ")[1].split(";")[0].split()
+        lines = [f"pkg {p} install ok installed {self.installed[p]}" if p in self.installed else f"pkg {p} "
+                 for p in packages]
+        lines.append(f"apt {self.index_mtime} {NOW}")
+        return 0, "\n".join(lines), ""
+
+    def mutations(self):
+        return [c for c in self.commands if "apt-get" in c]
+
+
+class FakeFleet:
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def run(self, node, cmd, timeout=None):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            return self.nodes[node].run(cmd)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def node(name, user="root", **kw):
+    return Node(name, "10.0.0.1", user, "pw", **kw)
+
+
+def test_compare_versions_like_dpkg():
+    assert compare_versions("3.12-1", "3.9") > 0
+    assert compare_versions("1.0~rc1", "1.0") < 0
+    assert compare_versions("1:1.0", "2.0") > 0
+    assert compare_versions("2.4.2-1ubuntu1", "2.4.2-1") > 0
+    assert compare_versions("0001", "1") == 0
+    assert parse_spec("iperf3 >= 3.9") == ("iperf3", "3.9")
+    with pytest.raises(ValueError):
+        parse_spec("iperf3 (>> 3)")
+
+
+def test_packages_per_role():
+    assert packages_for(node("a"), ROLES) == ["iperf3>=3.9", "curl"]
+    assert packages_for(node("b", services=["outline", "xray"]), ROLES) == ["iperf3>=3.9", "curl", "docker.io"]
+    assert packages_for(("c", "10.0.0.3", "root", "pw", []), ROLES) == ["iperf3>=3.9", "curl"]
+    # Built-in roles never touch a service's own stack (Outline ships docker-ce)
+    assert packages_for(node("d", services=["outline"])) == ["iperf3", "curl"]
+
+
+def test_nothing_to_do_is_one_read_only_round_trip():
+    fake = FakeAptNode(installed={"iperf3": "3.12-1", "curl": "7.88.1-10"})
+    report = Provisioner(FakeFleet({"a": fake}), roles=ROLES).provision_node(node("a"))
+    assert report["status"] == "unchanged" and report["error"] is None
+    assert len(fake.commands) == 1 and fake.mutations() == []
+
+
+def test_fresh_index_skips_apt_update():
+    fake = FakeAptNode(installed={"curl": "7.88.1-10"}, index_age=3600)
+    report = Provisioner(FakeFleet({"a": fake}), roles=ROLES, max_index_age=6 * 3600).provision_node(node("a"))
+    assert report["status"] == "changed"
+    assert report["installed"] == ["iperf3"] and not report["index_updated"]
+    assert len(fake.mutations()) == 1 and "install -y iperf3" in fake.mutations()[0]
+    assert "DPkg::Lock::Timeout" in fake.mutations()[0]
+
+
+def test_stale_index_is_updated_and_old_version_upgraded():
+    fake = FakeAptNode(installed={"iperf3": "3.7-3", "curl": "7.88.1-10"}, index_age=3 * 86400)
+    report = Provisioner(FakeFleet({"a": fake}), roles=ROLES).provision_node(node("a", user="deploy"))
+    assert report["status"] == "changed" and report["index_updated"]
+    update, install = fake.mutations()
+    assert update.startswith("sudo -n ") and " update" in update
+    assert install.endswith("install -y iperf3")
+    assert fake.installed["iperf3"] == "3.12-1"
+
+
+def test_failures_are_reported_per_node():
+    too_old = FakeAptNode(candidates={"iperf3": "3.7-3", "curl": "7.88.1-10"})
+    unknown = FakeAptNode(installed={"iperf3": "3.12-1", "curl": "7.88.1-10"}, candidates={"curl": "7.88.1-10"})
+    ok = FakeAptNode()
+    fleet = FakeFleet({"old": too_old, "odd": unknown, "ok": ok})
+    reports = Provisioner(fleet, roles=ROLES).run([node("old"), node("odd", services=["outline"]), node("ok")])
+
+    assert [r["name"] for r in reports] == ["old", "odd", "ok"]
+    assert reports[0]["status"] == "failed" and "iperf3>=3.9" in reports[0]["error"] and "3.7-3" in reports[0]["error"]
+    assert reports[1]["status"] == "failed" and "Unable to locate package docker.io" in reports[1]["error"]
+    assert reports[2]["status"] == "changed"
+
+
+def test_nodes_run_in_parallel_with_a_limit(capsys):
+    fakes = {f"n{i}": FakeAptNode(installed={"iperf3": "3.12-1", "curl": "7.88.1-10"}, delay=0.2)
+             for i in range(6)}
+    fleet = FakeFleet(fakes)
+    started = time.monotonic()
+    reports = Provisioner(fleet, roles=ROLES, workers=3).run([node(n) for n in fakes])
+    elapsed = time.monotonic() - started
+
+    assert fleet.peak == 3
+    assert elapsed < 0.2 * 6 * 0.75, "6 nodes x 0.2s must not run one by one"
+    assert all(r["status"] == "unchanged" for r in reports)
+
+    print_provision_report(reports, elapsed)
+    out = capsys.readouterr().out
+    assert "changed: 0, unchanged: 6, failed: 0" in out
@@ -0,0 +1,57 @@
+import socket
+import time
+import pytest
+from scripts.reachability import probe_many, build_echo_request, parse_echo_reply, icmp_checksum, summarize
+
+
+@pytest.fixture
+def listener():
+    """A local TCP listener on 0.0.0.0, reachable via any 127.x.y.z address."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("0.0.0.0", 0))
+    sock.listen(1024)
+    yield sock.getsockname()[1]
+    sock.close()
+
+
+def test_echo_packet_roundtrip():
+    packet = build_echo_request(513)
+    assert icmp_checksum(packet) == 0, "a valid ICMP checksum sums to zero"
+
+    reply = bytes([0]) + packet[1:]  # same packet with type 0 (echo reply)
+    assert parse_echo_reply(reply) == 513
+    assert parse_echo_reply(packet) is None, "our own request is not a reply"
+
+
+def test_hundreds_of_targets_in_about_one_timeout(listener):
+    """200 loopback targets, 3 probes each, must take ~one timeout, not 200 of them."""
+    targets = [f"127.0.{i // 250}.{i % 250 + 1}" for i in range(200)]
+
+    started = time.monotonic()
+    report = probe_many(targets, count=3, interval=0.05, timeout=1.0, method="tcp", tcp_port=listener)
+    elapsed = time.monotonic() - started
+
+    assert elapsed < 2.0, f"Probes were not multiplexed: {elapsed:.2f}s"
+    stats = report["127.0.0.1"]
+    assert stats["received"] == 3 and stats["loss"] == 0
+    assert stats["min"] <= stats["avg"] <= stats["max"]
+    assert len(stats["samples"]) == 3 and stats["samples"][0][0] <= time.time()
+
+
+def test_refused_port_still_counts_as_reachable_and_bad_names_as_lost():
+    with socket.socket() as tmp:
+        tmp.bind(("127.0.0.1", 0))
+        closed_port = tmp.getsockname()[1]
+
+    report = probe_many(["127.0.0.1", "no-such-node.invalid"], count=2, timeout=0.5,
+                        method="tcp", tcp_port=closed_port)
+
+    assert report["127.0.0.1"]["loss"] == 0, "RST is an answer from the host"
+    assert report["no-such-node.invalid"]["loss"] == 1.0
+
+
+def test_jitter_is_mean_rtt_difference():
+    stats = summarize("n", "icmp", [(0, 10.0), (0, 14.0), (0, None), (0, 12.0)])
+    assert stats["loss"] == 0.25
+    assert stats["jitter"] == pytest.approx(3.0)
@@ -0,0 +1,32 @@
+import shutil
+import subprocess
+import pytest
+from scripts.remote_probe import build_probe_command, parse_probe_output, ProbeError, PROBE_SCHEMA_VERSION
+from scripts.monitor import services_from_probe
+
+
+@pytest.mark.skipif(shutil.which("sh") is None, reason="POSIX shell is required to run the probe locally")
+def test_probe_script_runs_in_one_exec():
+    """The composite probe must produce valid JSON on a plain Linux box (this one)."""
+    result = subprocess.run(["sh", "-c", build_probe_command(["x-ui"])], capture_output=True, text=True, timeout=10)
+
+    probe = parse_probe_output(result.stdout)
+    assert probe["schema"] == PROBE_SCHEMA_VERSION
+    assert 0 <= probe["disk_used"] <= 100
+    assert "x-ui" in probe["services"]
+
+
+def test_parser_tolerates_missing_tools_and_noise():
+    """No docker and no /proc on the node: fields become None, the parse does not fail."""
+    raw = b'Welcome to Ubuntu!\n{"schema":1,"disk_used":null,"mem_used":12.5,"load1":null,"containers":null,"services":{}}\n'
+    probe = parse_probe_output(raw)
+
+    assert probe["disk_used"] is None
+    assert probe["containers"] is None
+    assert services_from_probe(probe, ["/opt/outline"]) == [("Docker: Outline", False)]
+
+
+@pytest.mark.parametrize("raw", ["", "command not found", '{"schema":99}', '{"schema":1,'])
+def test_parser_rejects_garbage(raw):
+    with pytest.raises(ProbeError):
+        parse_probe_output(raw)
@@ -26,48 +26,42 @@ class TestSecurityInfrastructure:
 
     @allure.id("REQ-004")
     @allure.title("Audit: OS Distribution Compliance")
-    def test_os_version(self, remote_host):
+    def test_os_version(self, remote_host, compliance):
         """Standardization check: Ensures the node runs a supported Linux version."""
-        distro = remote_host.system_info.distribution.lower()
-        allowed_distros = ["ubuntu", "debian"]
+        result = compliance(remote_host)["os_supported"]
 
-        assert distro in allowed_distros, f"❌ Unsupported OS: {distro} on {remote_host.node_name}"
+        assert result["passed"], f"❌ Unsupported OS: {result['value']} on {remote_host.node_name}"
 
     @allure.id("REQ-002")
     @allure.title("Audit: Firewall (UFW) Status")
     @pytest.mark.security
-    def test_firewall_status(self, remote_host):
+    def test_firewall_status(self, remote_host, compliance):
         """Ensures that the Uncomplicated Firewall (UFW) is active and protecting the node."""
         with allure.step("Check UFW status"):
-            result = remote_host.run("ufw status")
+            result = compliance(remote_host)["ufw_active"]
 
-        assert "Status: active" in result.stdout, f"⚠️ UFW is INACTIVE on {remote_host.node_name}!"
+        assert result["passed"], f"⚠️ UFW is INACTIVE on {remote_host.node_name}!"
 
     @allure.id("REQ-003")
     @allure.title("Audit: Fail2Ban Service with Self-Healing")
     @pytest.mark.security
-    def test_fail2ban_status(self, remote_host):
+    def test_fail2ban_status(self, remote_host, compliance):
         """
         Verifies Fail2Ban service.
-        If it is missing or stopped, the test attempts to fix the system automatically.
+        A missing or stopped fail2ban is repaired by the policy engine (install, enable,
+        restart in one batched script) before the final check; pytest --check-only only reports.
         """
-        f2b_pkg = remote_host.package("fail2ban")
-        f2b_service = remote_host.service("fail2ban")
+        policy = compliance(remote_host)
 
-        # SELF-HEALING LOGIC
-        if not f2b_pkg.is_installed or not f2b_service.is_running:
-            with allure.step("Self-Healing: Attempting to repair Fail2Ban"):
-                # Update cache and install packages
-                remote_host.run("apt-get update")
-                distro = remote_host.system_info.distribution.lower()
-
-                # Debian requires rsyslog for Fail2Ban to work correctly
-                pkgs = "fail2ban rsyslog" if distro == "debian" else "fail2ban"
-                remote_host.run(f"DEBIAN_FRONTEND=noninteractive apt-get install -y {pkgs}")
-
-                # Try to enable and restart the service
-                remote_host.run("systemctl enable fail2ban")
-                remote_host.run("systemctl restart fail2ban")
+        # SELF-HEALING REPORT
+        for rule in ("fail2ban_installed", "fail2ban_enabled", "fail2ban_running"):
+            result = policy[rule]
+            if result["remediated"]:
+                with allure.step(f"Self-Healing: {result['title']} ('{result['initial']}' -> '{result['value']}')"):
+                    if result["output"]:
+                        allure.attach(result["output"], name=f"{rule} remediation",
+                                      attachment_type=allure.attachment_type.TEXT)
 
         with allure.step("Final verification"):
-            assert f2b_service.is_running, f"❌ Fail2Ban is DEAD on {remote_host.node_name} even after repair attempt."
\ No newline at end of file
+            assert policy["fail2ban_running"]["passed"], \
+                f"❌ Fail2Ban is DEAD on {remote_host.node_name} even after repair attempt."
@@ -0,0 +1,92 @@
+import ssl
+import socket
+import datetime
+import threading
+import pytest
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from scripts.service_probe import probe_services, describe
+
+
+def _listener(backlog=128):
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(backlog)
+    return sock
+
+
+@pytest.fixture
+def tls_listener(tmp_path):
+    """A local TLS server with a throw-away self-signed certificate."""
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(1).not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+            .sign(key, hashes.SHA256()))
+    (tmp_path / "cert.pem").write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    (tmp_path / "key.pem").write_bytes(key.private_bytes(serialization.Encoding.PEM,
+                                                          serialization.PrivateFormat.PKCS8,
+                                                          serialization.NoEncryption()))
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(tmp_path / "cert.pem", tmp_path / "key.pem")
+
+    sock = _listener()
+
+    def serve():
+        while True:
+            try:
+                conn, _ = sock.accept()
+            except OSError:
+                return
+            try:
+                with context.wrap_socket(conn, server_side=True) as tls:
+                    tls.recv(1)
+            except (ssl.SSLError, OSError):
+                pass
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield sock.getsockname()[1]
+    sock.close()
+
+
+def test_open_refused_and_filtered_are_told_apart(tls_listener):
+    plain = _listener()
+    # backlog 0 + one queued connection: the kernel drops further SYNs, just like a firewall
+    black_hole = _listener(backlog=0)
+    queued = socket.create_connection(black_hole.getsockname())
+    with socket.socket() as tmp:
+        tmp.bind(("127.0.0.1", 0))
+        closed_port = tmp.getsockname()[1]
+
+    ports = [("ssh", plain.getsockname()[1], None),
+             ("reality", tls_listener, "www.example.com"),
+             ("ss", closed_port, None),
+             ("panel", black_hole.getsockname()[1], None)]
+    try:
+        report = probe_services({"NL-AMS": ("127.0.0.1", ports)}, timeout=0.5)["NL-AMS"]
+    finally:
+        for s in (plain, black_hole, queued):
+            s.close()
+
+    ssh, reality, ss, panel = report
+    assert ssh["status"] == "open" and ssh["tls_ms"] is None
+    assert reality["status"] == "open" and reality["tls_ms"] > 0 and reality["tls_error"] is None
+    assert ss["status"] == "refused"
+    assert panel["status"] == "filtered"
+    assert describe(reality)[1] == "ok" and describe(panel) == ("Filtered (timeout)", "fail")
+
+
+def test_tls_failure_on_a_plain_port_is_a_warning():
+    plain = _listener()
+    try:
+        report = probe_services({"AT-VIE": ("127.0.0.1", [("panel", plain.getsockname()[1], "")])},
+                                timeout=0.5, tls_timeout=0.5)["AT-VIE"]
+    finally:
+        plain.close()
+
+    assert report[0]["status"] == "open"
+    assert report[0]["tls_error"]
+    assert describe(report[0])[1] == "warn"
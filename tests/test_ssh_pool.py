@@ -0,0 +1,40 @@
+import threading
+from scripts.ssh_pool import SSHPool
+from fakes import FakeClient
+
+
+def test_pool_reuses_one_transport_per_node():
+    pool = SSHPool(client_factory=FakeClient)
+    first = pool.get("NL-AMS", "10.0.0.1", "root", "secret")
+
+    for _ in range(10):
+        assert pool.get("NL-AMS") is first
+
+    assert pool.connects["NL-AMS"] == 1
+    assert first.get_transport().keepalive == pool.keepalive
+
+
+def test_pool_reconnects_dead_transport_and_closes():
+    pool = SSHPool(client_factory=FakeClient)
+    first = pool.get("AT-VIE", "10.0.0.2", "root", "secret")
+    first.get_transport().active = False  # e.g. the ISP dropped the session
+
+    second = pool.get("AT-VIE")
+    assert second is not first
+    assert pool.connects["AT-VIE"] == 2
+
+    pool.close()
+    assert not second.get_transport().is_active()
+
+
+def test_parallel_callers_share_a_single_connect():
+    pool = SSHPool(client_factory=FakeClient)
+    pool.register("RU-MOW", "10.0.0.3", "root", "secret")
+
+    threads = [threading.Thread(target=pool.get, args=("RU-MOW",)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert pool.connects["RU-MOW"] == 1
@@ -0,0 +1,77 @@
+import os
+import json
+import hashlib
+import pytest
+from scripts.telegram_delivery import TelegramDelivery, TelegramError
+
+
+def make_delivery(bot_api, **kwargs):
+    kwargs.setdefault("sleep", lambda seconds: None)
+    return TelegramDelivery("TOKEN", "42", api_url=bot_api.url, **kwargs)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    path = tmp_path / "backup_NL-AMS_2026-10-18_02-00.tar.gz"
+    path.write_bytes(os.urandom(2500))
+    return path
+
+
+def test_small_archive_goes_as_one_document(bot_api, archive):
+    sent = make_delivery(bot_api).deliver(str(archive), "📦 Backup: NL-AMS")
+
+    assert sent == 1
+    call = bot_api.ok_calls("sendDocument")[0]
+    assert call["files"]["document"] == (archive.name, archive.read_bytes())
+    assert call["fields"]["caption"] == "📦 Backup: NL-AMS"
+
+
+def test_retries_honor_retry_after_and_server_errors(bot_api, archive):
+    waits = []
+    bot_api.script = [(429, {"retry_after": 7}), (502, None)]
+
+    make_delivery(bot_api, sleep=waits.append).deliver(str(archive), "caption")
+
+    assert waits[0] == 7, "flood control wait must come from Telegram"
+    assert len(waits) == 2
+    assert len(bot_api.ok_calls()) == 1
+    assert len({c["connection"] for c in bot_api.calls}) == 1, "one keep-alive connection for all attempts"
+
+
+def test_last_flood_control_answer_fails_without_waiting(bot_api, archive):
+    waits = []
+    bot_api.script = [(429, {"retry_after": 30})] * 3
+
+    with pytest.raises(TelegramError, match="after 3 attempts"):
+        make_delivery(bot_api, sleep=waits.append, max_retries=2).deliver(str(archive), "caption")
+
+    assert waits == [30, 30], "no sleep after the final attempt"
+
+
+def test_client_errors_are_not_retried(bot_api, archive):
+    bot_api.script = [(400, None)]
+    with pytest.raises(TelegramError, match="400"):
+        make_delivery(bot_api).deliver(str(archive), "caption")
+    assert len(bot_api.calls) == 1
+
+
+def test_big_archive_is_split_and_resumed(bot_api, archive):
+    """3 parts + manifest; the run breaks on part 2 and the next run starts from part 2."""
+    bot_api.script = [(200, None), (400, None)]
+    delivery = make_delivery(bot_api, part_size=1000)
+    with pytest.raises(TelegramError):
+        delivery.deliver(str(archive), "caption")
+    assert os.path.exists(f"{archive}.tg.json")
+
+    sent = delivery.deliver(str(archive), "caption")
+
+    assert sent == 3, "part 1 must not be re-sent"
+    names = [c["files"]["document"][0] for c in bot_api.ok_calls("sendDocument")]
+    assert names == [f"{archive.name}.part001", f"{archive.name}.part002",
+                     f"{archive.name}.part003", f"{archive.name}.manifest.json"]
+
+    parts = b"".join(c["files"]["document"][1] for c in bot_api.ok_calls("sendDocument")[:3])
+    manifest = json.loads(bot_api.ok_calls("sendDocument")[3]["files"]["document"][1])
+    assert parts == archive.read_bytes()
+    assert manifest["sha256"] == hashlib.sha256(parts).hexdigest()
+    assert not os.path.exists(f"{archive}.tg.json")
@@ -0,0 +1,167 @@
+import time
+import shutil
+import threading
+import subprocess
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from scripts.backup import RateLimiter
+from scripts.throughput import (ThroughputEstimator, probe_url, probe_remote, build_remote_probe_cmd,
+                                describe, t_critical)
+
+BLOB_SIZE = 100 * 1024 * 1024
+FAST = dict(interval=0.1, warmup=0.2, min_samples=4)
+
+
+class RateLimitedBlob(BaseHTTPRequestHandler):
+    """GET /<mbps> streams a 100 MB body at that rate (like a CDN test file on a slow link)."""
+
+    def do_GET(self):
+        limiter = RateLimiter.from_mbps(float(self.path.strip("/")))
+        chunk = b"\0" * 16384
+        self.send_response(200)
+        self.send_header("Content-Length", str(BLOB_SIZE))
+        self.end_headers()
+        sent = 0
+        try:
+            while sent < BLOB_SIZE:
+                limiter.consume(len(chunk))
+                self.wfile.write(chunk)
+                sent += len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.aborted += 1
+        self.server.sent.append(sent)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def blob_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RateLimitedBlob)
+    server.daemon_threads = True
+    server.aborted = 0
+    server.sent = []
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def feed(estimator, rates, interval=1.0, start=0.0):
+    """Feeds a byte counter growing at the given Mbit/s per interval. Returns the first decision."""
+    t, total = start, 0
+    estimator.add(t, 1)
+    for rate in rates:
+        t += interval
+        total += rate * 1e6 / 8 * interval
+        decision = estimator.add(t, int(total))
+        if decision:
+            return decision
+    return None
+
+
+def test_t_critical():
+    assert t_critical(1) == 12.71
+    assert t_critical(11) == 2.23
+    assert t_critical(1000) == pytest.approx(1.96, abs=0.01)
+
+
+def test_clear_pass_stops_early():
+    estimator = ThroughputEstimator(threshold_mbps=30, warmup=1.0)
+    assert feed(estimator, [5] + [200, 210, 190, 205] * 10) == "pass"
+    result = estimator.result()
+    assert result["samples"] == 4
+    assert result["mbps"] == pytest.approx(201, abs=5)
+    assert result["error"] < 20
+
+
+def test_clear_fail_stops_early():
+    estimator = ThroughputEstimator(threshold_mbps=30, warmup=1.0)
+    assert feed(estimator, [1] + [10, 12, 9, 11] * 10) == "fail"
+
+
+def test_noisy_link_near_threshold_needs_more_samples():
+    estimator = ThroughputEstimator(threshold_mbps=30, warmup=1.0)
+    rates = [0] + [25, 38, 27, 36, 24, 39] * 3
+    assert feed(estimator, rates) is None, "35 +- noise vs 30 Mbps must not be decided on 4 samples"
+    assert estimator.result("timeout")["stopped"] == "timeout"
+    assert estimator.result()["error"] > 2
+
+
+def test_converges_without_threshold():
+    estimator = ThroughputEstimator(warmup=1.0, rel_tolerance=0.05)
+    assert feed(estimator, [0] + [100, 101, 99, 100, 100]) == "converged"
+
+
+def test_short_transfer_uses_whole_average():
+    estimator = ThroughputEstimator(threshold_mbps=30, warmup=1.0)
+    estimator.add(0.0, 100)
+    estimator.add(0.5, 4_000_000)
+    result = estimator.result("complete")
+    assert result["samples"] == 0
+    assert result["mbps"] == pytest.approx(64, abs=1)
+    assert result["error"] is None
+    assert "64.0 Mbps" in describe(result)
+
+
+def test_probe_url_passes_fast_link_early(blob_server):
+    server, url = blob_server
+    started = time.monotonic()
+    result = probe_url(f"{url}/200", threshold_mbps=30, max_time=10, **FAST)
+    elapsed = time.monotonic() - started
+
+    assert result["stopped"] in ("pass", "converged")
+    assert result["mbps"] == pytest.approx(200, rel=0.25)
+    assert elapsed < 3, "must not download the whole 100 MB"
+    assert result["bytes"] < BLOB_SIZE / 4
+    print(f"\n{describe(result)}")
+
+
+def test_probe_url_fails_slow_link_early(blob_server):
+    _, url = blob_server
+    result = probe_url(f"{url}/8", threshold_mbps=30, max_time=10, **FAST)
+    assert result["stopped"] == "fail"
+    assert result["mbps"] == pytest.approx(8, rel=0.25)
+    assert result["mbps"] + result["error"] < 30
+
+
+def test_probe_url_timeout(blob_server):
+    _, url = blob_server
+    result = probe_url(f"{url}/40", threshold_mbps=40, max_time=1.0, interval=0.1, warmup=0.2,
+                       min_samples=50)
+    assert result["stopped"] == "timeout"
+    assert result["mbps"] == pytest.approx(40, rel=0.3)
+
+
+class LocalNode:
+    """exec_command on this machine: the remote probe script runs as on a VPN node."""
+
+    def __init__(self):
+        self.commands = []
+
+    def exec_command(self, cmd):
+        self.commands.append(cmd)
+        proc = subprocess.Popen(["sh", "-c", cmd], stdout=subprocess.PIPE, text=True)
+        return None, proc.stdout, None
+
+
+def test_remote_probe_cmd_quotes_url():
+    cmd = build_remote_probe_cmd("http://x/a b';rm -rf /", max_time=5)
+    assert "'http://x/a b'\"'\"';rm -rf /'" in cmd
+    assert "--max-time 5" in cmd
+
+
+@pytest.mark.skipif(shutil.which("curl") is None, reason="curl is not installed")
+def test_probe_remote_stops_the_download(blob_server):
+    server, url = blob_server
+    node = LocalNode()
+    result = probe_remote(node, f"{url}/120", threshold_mbps=30, max_time=10, **FAST)
+
+    assert result["stopped"] in ("pass", "converged")
+    assert result["mbps"] == pytest.approx(120, rel=0.3)
+    assert node.commands[-1].startswith("kill "), "curl must be killed after the decision"
+    deadline = time.monotonic() + 5
+    while not server.aborted and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert server.aborted == 1
+    assert server.sent[0] < BLOB_SIZE / 4
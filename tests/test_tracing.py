@@ -0,0 +1,65 @@
+import json
+import pytest
+from scripts import monitor
+from scripts.fleet_sim import FleetSimulator
+from scripts.iperf_mesh import SSHShell
+from scripts.ssh_pool import SSHPool
+from scripts.tracing import TRACER, PHASES, Tracer, span
+
+
+@pytest.fixture
+def tracing(monkeypatch):
+    monkeypatch.setattr(TRACER, "enabled", True)
+    monkeypatch.setattr(TRACER, "spans", [])
+    return TRACER
+
+
+def test_disabled_spans_record_nothing():
+    tracer = Tracer()
+    with tracer.span("exec", "NL-AMS") as first, tracer.span("tcp", "RU-MOW") as second:
+        pass
+    assert first is second, "one shared no-op object"
+    assert tracer.spans == [] and tracer.format_summary() == "No spans recorded."
+
+
+def test_summary_and_chrome_trace():
+    tracer = Tracer()
+    tracer.record("node", "RU-MOW", 0.0, 10.0)
+    tracer.record("ssh_auth", "RU-MOW", 0.5, 4.5)
+    tracer.record("exec", "RU-MOW", 5.0, 7.0, {"cmd": "df"})
+    tracer.record("node", "NL-AMS", 0.0, 2.0)
+    tracer.record("transfer", "NL-AMS", 0.2, 1.9)
+
+    summary = tracer.summary()
+    assert summary["RU-MOW"] == {"total": 10.0, "ssh_auth": 4.0, "exec": 2.0, "other": 4.0}
+    text = tracer.format_summary({"RU-MOW": "RU", "NL-AMS": "NL"})
+    assert any(line.startswith("RU ") and "ssh_auth" in line for line in text.splitlines())
+    assert any(line.startswith("NL ") and "transfer" in line for line in text.splitlines())
+
+    events = json.loads(json.dumps(tracer.chrome_trace()))["traceEvents"]
+    rows = {e["args"]["name"]: e["tid"] for e in events if e["ph"] == "M"}
+    assert set(rows) == {"RU-MOW", "NL-AMS"}
+    exec_event = next(e for e in events if e["name"] == "exec")
+    assert (exec_event["ts"], exec_event["dur"], exec_event["tid"]) == (5e6, 2e6, rows["RU-MOW"])
+
+
+def test_failed_span_keeps_the_error(tracing):
+    with pytest.raises(TimeoutError):
+        with span("exec", "AT-VIE"):
+            raise TimeoutError
+    assert tracing.spans[0][0] == "exec" and tracing.spans[0][5] == {"error": "TimeoutError"}
+
+
+def test_ssh_phases_of_a_node(tracing):
+    with FleetSimulator(2, latency=(0.05, 0.05)) as fleet, SSHPool(timeout=5) as pool:
+        node = fleet.nodes[0]
+        pool.register(node.name, "127.0.0.1", "root", node.password, node.port)
+        with span("node", node.name, task="scan"):
+            monitor.collect_node_metrics(pool.get(node.name), node.backup_paths)
+            SSHShell(pool).run(node.name, "hostname")
+
+    phases = tracing.summary()[node.name]
+    assert set(phases) == {*PHASES[:5], "total", "other"}
+    assert phases["ssh_auth"] >= 0.1, "the simulated auth takes two round trips"
+    assert phases["exec"] >= 0.1, "two commands, one round trip each"
+    assert [s[0] for s in tracing.spans if s[0] != "exec"][:4] == ["dns", "tcp", "ssh_kex", "ssh_auth"]
@@ -0,0 +1,131 @@
+import os
+import pytest
+from array import array
+from scripts import tsdb
+from scripts.tsdb import TimeSeriesStore, TSDBSink, encode_block, decode_block, weighted_percentile
+from scripts.reachability import summarize
+
+DAY = 86400
+NOW = 1_800_000_000  # fixed "now", aligned to the hour
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / "metrics.db"), block_points=64)
+    yield store
+    store.close()
+
+
+def test_block_roundtrip():
+    ts = array("q", [1000, 31000, 61000, 61500])
+    values = array("d", [1.5, 2.0, -3.25, 0.0])
+    decoded_ts, (decoded_values,) = decode_block(encode_block(ts, [values]))
+    assert decoded_ts == ts
+    assert decoded_values == values
+
+
+def test_weighted_percentile():
+    assert weighted_percentile([], 50) is None
+    points = [(v, 1) for v in range(1, 101)]
+    assert weighted_percentile(points, 50) == 50
+    assert weighted_percentile(points, 95) == 95
+    # One rollup point standing for 100 samples outweighs a few raw ones
+    assert weighted_percentile([(10, 100), (500, 3)], 95) == 10
+
+
+def test_percentiles_include_unflushed_points(store):
+    for i in range(100):
+        store.append("Node-1", "rtt", i + 1, NOW + i)
+    # 100 points with block size 64: one block on disk, the rest still in memory
+    assert store.percentiles("Node-1", "rtt", (50, 95)) == {50: 50, 95: 95}
+    assert store.percentiles("Node-1", "rtt", (50,), start=NOW + 90) == {50: 95}
+    assert store.percentiles("Node-2", "rtt") == {50: None, 95: None}
+
+
+def test_none_values_are_skipped(store):
+    store.append("Node-1", "rtt", None, NOW)
+    assert list(store.points("Node-1", "rtt")) == []
+
+
+def test_compact_downsamples_and_keeps_statistics(store):
+    # 10 days of samples every 30s: a 40 -> 50% disk climb plus a sawtooth
+    start = NOW - 10 * DAY
+    for i in range(10 * DAY // 30):
+        t = start + i * 30
+        store.append("Node-1", "disk_used", 40 + 10 * (i * 30) / (10 * DAY) + (i % 4), t)
+    raw_p50 = store.percentiles("Node-1", "disk_used", (50,))[50]
+    raw_rate = store.rate("Node-1", "disk_used")
+
+    moved = store.compact(now=NOW)
+    assert moved > 0
+    counts = dict(store.db.execute("SELECT resolution, SUM(points) FROM blocks GROUP BY resolution").fetchall())
+    # 2 days stay raw, the rest is rolled up into 1-minute points
+    assert counts[0] == pytest.approx(2 * DAY / 30, abs=2)
+    assert counts[60] == pytest.approx(8 * DAY / 60, abs=2)
+
+    # Nothing is lost: the weight of rollups equals the number of raw samples
+    total_weight = sum(w for *_, w in store.points("Node-1", "disk_used"))
+    assert total_weight == 10 * DAY // 30
+    assert store.percentiles("Node-1", "disk_used", (50,))[50] == pytest.approx(raw_p50, abs=1.5)
+    assert store.rate("Node-1", "disk_used") == pytest.approx(raw_rate, rel=0.01)
+    assert store.rate("Node-1", "disk_used") == pytest.approx(1.0, rel=0.02)  # +1% per day
+
+    # Rollups keep the real extremes of their bucket (two samples per minute: +0 and +1)
+    _, _, lo, hi, _ = next(p for p in store.points("Node-1", "disk_used") if p[4] > 1)
+    assert (lo, hi) == (pytest.approx(40, abs=0.1), pytest.approx(41, abs=0.1))
+
+    # A second pass with the same clock has nothing left to do
+    assert store.compact(now=NOW) == 0
+
+
+def test_compact_rolls_minutes_into_hours_and_drops_expired(store, monkeypatch):
+    monkeypatch.setattr(tsdb, "RETENTION", {0: 3600, 60: 6 * 3600, 3600: 2 * DAY})
+    start = NOW - 3 * DAY
+    for i in range(3 * DAY // 60):
+        store.append("Node-1", "load1", 1.0, start + i * 60)
+    store.compact(now=NOW)
+    resolutions = {r for (r,) in store.db.execute("SELECT DISTINCT resolution FROM blocks")}
+    assert resolutions == {0, 60, 3600}
+    oldest = min(t for t, *_ in store.points("Node-1", "load1"))
+    assert oldest >= NOW - 2 * DAY - 3600
+
+
+def test_store_survives_reopen(tmp_path):
+    path = str(tmp_path / "metrics.db")
+    first = TimeSeriesStore(path)
+    first.append("Node-1", "rtt", 12.5, NOW)
+    first.close()
+    second = TimeSeriesStore(path)
+    assert [p[:2] for p in second.points("Node-1", "rtt")] == [(NOW, 12.5)]
+    assert second.series() == [("Node-1", "rtt")]
+    second.close()
+
+
+def test_storage_is_compact(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / "metrics.db"))
+    for i in range(20_000):
+        store.append("Node-1", "mem_used", 55.0 + (i % 7), NOW + i * 30)
+    store.close()
+    # 20k points x (8 byte timestamp + 8 byte value) = 320 KB uncompressed
+    assert os.path.getsize(str(tmp_path / "metrics.db")) < 120_000
+
+
+def test_sink_records_daemon_results(store):
+    sink = TSDBSink(store)
+    sink.handle("Node-1", "reachability", summarize("10.0.0.1", "tcp", [(NOW, 20.0), (NOW, 30.0)]), [], NOW)
+    sink.handle("Node-1", "ports", [{"name": "vless", "port": 443, "status": "open",
+                                     "connect_ms": 12.0, "tls_ms": 40.0}], [], NOW)
+    sink.handle("Node-1", "metrics", {"disk_used": 61, "mem_used": 70.5, "load1": 0.3,
+                                      "services": [("X-UI Panel", False)]}, [], NOW)
+    sink.handle("Node-2", "metrics", {"error": "Auth failed"}, [], NOW)
+
+    def value(node, metric):
+        return [p[1] for p in store.points(node, metric)]
+
+    assert value("Node-1", "rtt_avg") == [25.0]
+    assert value("Node-1", "reachable") == [1.0]
+    assert value("Node-1", "port.vless.tls_ms") == [40.0]
+    assert value("Node-1", "disk_used") == [61.0]
+    assert value("Node-1", "service.X-UI Panel") == [0.0]
+    assert value("Node-2", "ssh_ok") == [0.0]
+    assert value("Node-2", "disk_used") == []
@@ -0,0 +1,104 @@
+import os
+import shutil
+import hashlib
+import threading
+import subprocess
+import pytest
+from scripts.catalog import BackupCatalog
+from scripts.verify import verify_archive, verify_catalog
+
+FLAGS = {".tar.gz": ["-czf"], ".tar": ["-cf"], ".tar.zst": ["-I", "zstd -q", "-cf"]}
+
+
+@pytest.fixture
+def make_archive(tmp_path):
+    """Builds an archive of etc/x-ui + opt/outline the way the node does (paths without the leading /)."""
+    root = tmp_path / "node"
+    for folder, size in (("etc/x-ui", 200_000), ("opt/outline", 50_000)):
+        (root / folder).mkdir(parents=True)
+        (root / folder / "data.db").write_bytes(os.urandom(size))
+
+    def build(name, extension=".tar.gz"):
+        path = tmp_path / f"{name}{extension}"
+        subprocess.run(["tar", *FLAGS[extension], str(path), "-C", str(root), "etc/x-ui", "opt/outline"], check=True)
+        return str(path)
+    return build
+
+
+@pytest.mark.parametrize("extension", [".tar.gz", ".tar", ".tar.zst"])
+def test_good_archive_passes(make_archive, extension):
+    if extension == ".tar.zst" and not shutil.which("zstd"):
+        pytest.skip("zstd is not installed")
+    path = make_archive("backup", extension)
+    sha = hashlib.sha256(open(path, "rb").read()).hexdigest()
+
+    result = verify_archive(path, ["/etc/x-ui", "/opt/outline"], expected_sha256=sha)
+
+    assert result["ok"], result["error"]
+    assert result["sha256"] == sha and result["members"] == 4 and result["size"] == os.path.getsize(path)
+
+
+@pytest.mark.parametrize("extension", [".tar.gz", ".tar", ".tar.zst"])
+def test_truncated_archive_fails(make_archive, extension):
+    if extension == ".tar.zst" and not shutil.which("zstd"):
+        pytest.skip("zstd is not installed")
+    path = make_archive("backup", extension)
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) // 2)
+
+    result = verify_archive(path, ["/etc/x-ui"])
+
+    assert not result["ok"] and result["error"]
+    assert result["sha256"] is None or len(result["sha256"]) == 64
+
+
+def test_corruption_and_mismatches_fail(make_archive):
+    path = make_archive("backup")
+    assert "no members for /srv/missing" in verify_archive(path, ["/etc/x-ui", "/srv/missing"])["error"]
+    assert "sha256 mismatch" in verify_archive(path, expected_sha256="0" * 64)["error"]
+
+    with open(path, "r+b") as f:
+        f.seek(os.path.getsize(path) - 6)   # gzip trailer: CRC32 + size
+        f.write(b"\x00\x00")
+    assert not verify_archive(path)["ok"]
+    assert "No such file" in verify_archive(path + ".gone")["error"]
+
+
+@pytest.mark.skipif(not shutil.which("zstd"), reason="zstd is not installed")
+def test_zstd_stream_without_a_tar_fails_instead_of_hanging(tmp_path):
+    raw = tmp_path / "noise"
+    raw.write_bytes(os.urandom(4 * 1024 * 1024))
+    path = tmp_path / "backup.tar.zst"
+    subprocess.run(["zstd", "-q", "-1", str(raw), "-o", str(path)], check=True)
+    results = []
+
+    worker = threading.Thread(target=lambda: results.append(verify_archive(str(path))), daemon=True)
+    worker.start()
+    worker.join(20)
+
+    assert results, "verify_archive() hung on a zstd stream that is not a tar"
+    assert not results[0]["ok"] and results[0]["error"]
+    assert results[0]["sha256"] is None or len(results[0]["sha256"]) == 64
+
+
+def test_catalog_verification_is_incremental(make_archive, tmp_path):
+    catalog = BackupCatalog(str(tmp_path / "catalog.db"))
+    good = make_archive("backup_NL-AMS_1")
+    bad = make_archive("backup_NL-AMS_2")
+    with open(bad, "r+b") as f:
+        f.truncate(1000)
+    catalog.record("NL-AMS", good, created_at=1.0, paths=["/etc/x-ui"])
+    catalog.record("NL-AMS", bad, created_at=2.0, paths=["/etc/x-ui"])
+
+    results = verify_catalog(catalog, workers=2)
+
+    assert sorted(r["path"] for r, _ in results) == sorted([good, bad])
+    latest = catalog.latest("NL-AMS")
+    assert latest["path"] == good and latest["members"] == 4 and len(latest["sha256"]) == 64
+    assert catalog.latest("NL-AMS", verified=False)["verify_error"]
+
+    assert verify_catalog(catalog) == []                  # nothing changed
+    os.utime(good, (1, 1))
+    assert [r["path"] for r, _ in verify_catalog(catalog)] == [good]
+    assert len(verify_catalog(catalog, force=True)) == 2
+    assert verify_catalog(catalog, nodes={"RU-MOW"}, force=True) == []